@@ -1,76 +1,270 @@
+import argparse
+import bisect
+import math
 import os
 import sys
+import threading
+import time
+STARTUP_TIME = time.perf_counter()  # 启动报告的起点（导入 numpy 和 Qt 之前）
+import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QFileSystemModel, QTreeView, QLabel, QPushButton, 
                              QScrollArea, QSplitter, QToolBar, QSizePolicy, QLineEdit,
-                             QComboBox, QGridLayout)
-from PyQt5.QtGui import QPixmap, QImage, QPalette, QTransform, QMouseEvent
-from PyQt5.QtCore import Qt, QDir, QSize
+                             QComboBox, QGridLayout, QStackedWidget, QFileDialog, QDialog,
+                             QPlainTextEdit, QSpinBox, QRubberBand, QShortcut, QInputDialog,
+                             QMenu, QAction, QSlider, QCheckBox, QMessageBox)
+from PyQt5.QtGui import (QPixmap, QImage, QPalette, QTransform, QMouseEvent, QPainter, QColor,
+                         QKeySequence)
+from PyQt5.QtCore import Qt, QDir, QSize, QPointF, QRect, QRectF, QTimer, pyqtSignal
+
+from annotation import (BAD, ORIENTATION, PID, AnnotationStore, corrections_path, load_corrections,
+                        orientation_labels_path)
+from dataset_index import parse_query
+from dataset_registry import DatasetRegistry
+from dataset_stats import StatsCache, compute_stats, format_summary, summarize
+from dedup import find_duplicates
+from folder_scanner import FolderScanner, scan_image_files
+from folder_watcher import FolderWatcher, is_image
+from gallery import GalleryView
+from image_loader import ImageLoader
+from inspector import PixelInspector, format_pixel, format_region
+from profiling import PROFILER, StartupReport, format_histograms, format_stats, profiled
+from playback import TrackletPlayer, tracklets
+from overlay import LAYERS, OverlayCache
+from orientation import BitmapIndex, LabelKeys, UNLABELED, load_orientations
+from render import MipPyramid, view_transform
+from retrieval import FeatureSet, evaluate, rank_gallery
+from session import load_listing, load_session, save_listing, save_session
+from tree_model import IMAGE, SPLIT, IdentityTreeModel
+import vfs
+
+
+STARTUP_IMAGE_BUDGET_MS = 1000  # 恢复会话时上次的图片应在此时间内显示
 
 
 class ImageLabel(QLabel):
-    def __init__(self, parent=None):
+    """图片面板：按缩放比例从 mip 金字塔中取合适的级别，只绘制控件可见区域
+
+    交互中（fast=True）使用快速变换，停止交互后由窗口切回平滑变换重绘。
+    """
+    page_requested = pyqtSignal(int, int)  # 面板序号, 翻页步长（对比模式下滚轮翻页）
+    region_selected = pyqtSignal(int, object)  # 面板序号, 框选区域的统计
+    
+    def __init__(self, panel_index=0, parent=None):
         super().__init__(parent)
         self.setMouseTracking(True)  # 启用鼠标追踪
+        self.panel_index = panel_index
         self.original_pixmap = None
+        self.pyramid = None
+        self.source_path = None
         self.scale_factor = 1.0
         self.rotation_angle = 0
+        self.fast = False
+        self.drag_origin = None
+        self.rubber_band = None
+    
+    def set_source(self, pixmap, pyramid, path=None):
+        """设置原图及其金字塔（多个面板显示同一图片时共享金字塔），金字塔的源图可以是叠加层合成图"""
+        self.original_pixmap = pixmap
+        self.pyramid = pyramid
+        self.source_path = path
+        self.clear()
+        self.update()
+    
+    def set_view(self, scale_factor, rotation_angle, fast=False):
+        """设置缩放、旋转和是否使用快速变换"""
+        self.scale_factor = scale_factor
+        self.rotation_angle = rotation_angle
+        self.fast = fast
+        self.update()
+    
+    def image_transform(self):
+        """原图坐标 -> 控件坐标的变换"""
+        return view_transform(self.original_pixmap.size(), self.rect(),
+                              self.scale_factor, self.rotation_angle)
+    
+    @profiled('paint')
+    def paintEvent(self, event):
+        if self.pyramid is None or self.original_pixmap.isNull():
+            super().paintEvent(event)
+            return
         
+        level, level_scale = self.pyramid.level_for(self.scale_factor)
+        painter = QPainter(self)
+        painter.setClipRect(event.rect())
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, not self.fast)
+        transform = QTransform.fromScale(1.0 / level_scale, 1.0 / level_scale) * self.image_transform()
+        painter.setTransform(transform)
+        painter.drawPixmap(0, 0, level)
+        painter.end()
+    
+    def wheelEvent(self, event):
+        if getattr(self.window(), 'compare_mode', False):
+            self.page_requested.emit(self.panel_index, -1 if event.angleDelta().y() > 0 else 1)
+            event.accept()
+        else:
+            super().wheelEvent(event)
+        
+    def image_point(self, pos):
+        """控件坐标 -> 原图像素坐标（逆变换已包含缩放、旋转方向和居中），不在图片内时返回 None"""
+        if self.pyramid is None or self.original_pixmap.isNull():
+            return None
+        inverted, invertible = self.image_transform().inverted()
+        if not invertible:
+            return None
+        point = inverted.map(QPointF(pos))
+        x, y = int(math.floor(point.x())), int(math.floor(point.y()))
+        if 0 <= x < self.original_pixmap.width() and 0 <= y < self.original_pixmap.height():
+            return x, y
+        return None
+    
+    def inspector(self):
+        return PixelInspector.for_pixmap(self.original_pixmap)
+    
+    def show_pixel(self, pos, prefix):
+        point = self.image_point(pos)
+        if point is not None:
+            value = self.inspector().pixel(*point)
+            self.window().statusBar().showMessage(f"{prefix}: {format_pixel(*point, value)}")
+    
     def mousePressEvent(self, event: QMouseEvent):
-        if event.button() == Qt.LeftButton and self.original_pixmap:
-            # 获取点击位置相对于图片的坐标
-            pos = event.pos()
-            
-            # 获取图片在标签中的实际显示区域
-            pixmap_rect = self.rect()
-            pixmap_size = self.pixmap().size()
-            
-            # 计算图片在标签中的实际位置（居中显示）
-            x_offset = (pixmap_rect.width() - pixmap_size.width()) // 2
-            y_offset = (pixmap_rect.height() - pixmap_size.height()) // 2
-            
-            # 计算相对于图片的坐标
-            x = pos.x() - x_offset
-            y = pos.y() - y_offset
-            
-            # 检查点击是否在图片范围内
-            if 0 <= x < pixmap_size.width() and 0 <= y < pixmap_size.height():
-                # 计算原始图片中的坐标
-                original_x = int(x / self.scale_factor)
-                original_y = int(y / self.scale_factor)
-                
-                # 考虑旋转
-                if self.rotation_angle % 180 == 90:
-                    original_x, original_y = original_y, original_x
-                
-                # 确保坐标在原始图片范围内
-                if 0 <= original_x < self.original_pixmap.width() and 0 <= original_y < self.original_pixmap.height():
-                    # 获取父窗口的状态栏
-                    main_window = self.window()
-                    if main_window:
-                        # 获取点击位置的颜色
-                        color = self.original_pixmap.toImage().pixelColor(original_x, original_y)
-                        main_window.statusBar().showMessage(
-                            f"点击位置: ({original_x}, {original_y}), 颜色: RGB({color.red()}, {color.green()}, {color.blue()})")
+        if event.button() == Qt.LeftButton and self.image_point(event.pos()) is not None:
+            self.show_pixel(event.pos(), "点击位置")
+            # 拖动框选区域
+            self.drag_origin = event.pos()
+            if self.rubber_band is None:
+                self.rubber_band = QRubberBand(QRubberBand.Rectangle, self)
+            self.rubber_band.setGeometry(QRect(event.pos(), QSize()))
+            self.rubber_band.show()
+    
+    def mouseMoveEvent(self, event: QMouseEvent):
+        if self.drag_origin is not None:
+            self.rubber_band.setGeometry(QRect(self.drag_origin, event.pos()).normalized())
+        else:
+            self.show_pixel(event.pos(), "像素")
+        super().mouseMoveEvent(event)
+    
+    def mouseReleaseEvent(self, event: QMouseEvent):
+        if self.drag_origin is None or event.button() != Qt.LeftButton:
+            return
+        rect = QRect(self.drag_origin, event.pos()).normalized()
+        self.drag_origin = None
+        self.rubber_band.hide()
+        if rect.width() < 3 or rect.height() < 3 or self.pyramid is None:
+            return
+        # 框选区域映射回原图，取四个角的外接矩形（旋转后仍为轴对齐的像素区域）
+        inverted, invertible = self.image_transform().inverted()
+        if not invertible:
+            return
+        area = inverted.mapRect(QRectF(rect))
+        stats = self.inspector().region_stats(int(math.floor(area.left())), int(math.floor(area.top())),
+                                              int(math.ceil(area.right())), int(math.ceil(area.bottom())))
+        if stats is not None:
+            self.region_selected.emit(self.panel_index, stats)
 
 
 class ImageViewer(QMainWindow):
+    evaluation_finished = pyqtSignal(str)  # 后台评估完成，参数为结果摘要
+    duplicates_found = pyqtSignal(object)   # 后台查重完成，参数为 [(路径列表, 划分列表)]
+    stats_ready = pyqtSignal(str)           # 后台统计完成，参数为文字报告
+    indexes_built = pyqtSignal(str)         # 后台并行建立索引完成，参数为结果摘要
+    annotation_error = pyqtSignal(str)      # 标注写线程写入失败，参数为错误信息
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle('ReID Viewer')
         self.setGeometry(100, 100, 1200, 800)
         
-        # 设置默认路径
-        self.default_path = '/Users/curarpikt/Documents/datasets/ReID/Market-1501-v15.09.15'
+        # 启动计时：窗口先绘制，文件树挂载、扫描和会话恢复在事件循环开始后进行
+        self.startup = StartupReport(STARTUP_TIME)
+        self.startup.mark('导入')
+        self.startup_expected = None  # 启动完成前需要等待的阶段，None 表示还未开始打开
+        self.startup_report = False   # 完成后是否把报告打印到标准错误
+        self.pending_start = None     # 第一次绘制后再执行的 start() 参数
+        
+        # 登记的数据集，默认打开第一个；索引按根目录缓存在内存中，切换数据集不重新扫描
+        self.registry = DatasetRegistry()
+        self.registry.load()
+        names = self.registry.names()
+        self.default_path = self.registry.root(names[0]) if names else os.path.expanduser('~')
+        self.index_build_running = False
         
         # 初始化所有变量
         self.current_folder = None
         self.current_image_path = None
+        self.displayed_image_path = None  # 面板中实际已显示的图片（后台解码完成前与当前图片不同）
         self.rotation_angle = 0
         self.image_labels = []  # 存储所有图像标签
         self.image_files = []
+        self.image_index = {}  # 图片路径 -> 在 image_files 中的位置
+        self.pending_select_path = None  # 扫描完成前点击的图片，扫描到后再确定位置
         self.current_image_index = -1
         self.scale_factor = 1.0
+        self.dataset_index = None  # 当前根路径的数据集索引，首次检索时加载
+        self.bitmap_index = None   # 朝向/摄像头/pid 位图索引，随数据集索引重建
+        self.bitmap_index_mtime = None  # 建立位图索引时各标注文件的 (路径, mtime)
+        self.annotations = None    # 标注模式的标注存储，第一次进入标注模式时打开
+        
+        # 叠加层（人体解析掩码、注意力图、关键点）：合成结果作为面板金字塔的源图
+        self.overlays = OverlayCache()
+        self.overlay_layers = set()
+        self.overlay_opacity = 60
+        
+        # 跨摄像头对比模式：每个面板显示同一行人的不同摄像头图片，可独立翻页
+        self.compare_mode = False
+        self.compare_title = None
+        self.compare_groups = []     # 每个面板的图片路径列表
+        self.compare_positions = []  # 每个面板当前的位置
+        
+        # 检索排序：query/gallery 特征（memmap 加载，按文件名与索引对齐）
+        self.query_features = None
+        self.gallery_features = None
+        self.rank_k = 50
+        
+        # 近重复/泄漏检测的结果簇
+        self.duplicate_clusters = []
+        self.stats_dialog = None
+        self.region_dialog = None
+        self.prefetch_radius = 4  # 前后各预取的图片数量
+        
+        # 后台解码和图片缓存
+        self.image_loader = ImageLoader(max_bytes=256 * 1024 * 1024, parent=self)
+        self.image_loader.image_ready.connect(self.on_image_ready)
+        
+        # 缩放/旋转停止一段时间后再做平滑重绘
+        self.smooth_timer = QTimer(self)
+        self.smooth_timer.setSingleShot(True)
+        self.smooth_timer.setInterval(150)
+        self.smooth_timer.timeout.connect(self.render_smooth)
+        
+        # 拖动不透明度滑块时合并重新合成的请求
+        self.overlay_timer = QTimer(self)
+        self.overlay_timer.setSingleShot(True)
+        self.overlay_timer.setInterval(30)
+        self.overlay_timer.timeout.connect(self.refresh_overlays)
+        
+        # 后台流式扫描文件夹
+        self.folder_scanner = FolderScanner(parent=self)
+        self.folder_scanner.batch_ready.connect(self.on_scan_batch)
+        self.folder_scanner.finished.connect(self.on_scan_finished)
+        
+        # 监视当前文件夹，把新增/删除的图片作为增量应用到浏览列表（不重新扫描）
+        self.folder_watcher = FolderWatcher(parent=self)
+        self.folder_watcher.changed.connect(self.on_folder_changed)
+        self.folder_watcher.overflow.connect(self.on_folder_overflow)
+        self.index_save_timer = QTimer(self)  # 增量更新后延迟写回索引缓存，合并连续的写入
+        self.index_save_timer.setSingleShot(True)
+        self.index_save_timer.setInterval(2000)
+        self.index_save_timer.timeout.connect(self.save_dataset_index)
+        
+        # 轨迹播放：定时器驱动，通过 image_loader 预取之后的帧
+        self.player = TrackletPlayer(self.image_loader, parent=self)
+        self.player.frame_ready.connect(self.on_playback_frame)
+        self.player.progress.connect(self.status_bar_message)
+        self.player.finished.connect(self.on_playback_finished)
+        
+        # 按身份分组的树模型（切换到身份视图时才建立）
+        self.identity_model = None
         
         # 初始化UI
         self.initUI()
@@ -84,22 +278,17 @@ class ImageViewer(QMainWindow):
         splitter = QSplitter(Qt.Horizontal)
         
         # 左侧文件夹树形视图
+        # setRootPath 会启动目录监视和后台列目录，到 start() 中才挂到视图上
         self.file_model = QFileSystemModel()
-        self.file_model.setRootPath(self.default_path)
         self.file_model.setFilter(QDir.AllDirs | QDir.NoDotAndDotDot | QDir.Files)
-        self.file_model.setNameFilters(["*.jpg", "*.jpeg", "*.png", "*.bmp", "*.gif"])
+        self.file_model.setNameFilters(["*.jpg", "*.jpeg", "*.png", "*.bmp", "*.gif",
+                                        "*.zip", "*.tar", "*.tar.gz", "*.tgz"])
         self.file_model.setNameFilterDisables(False)
         
         self.tree_view = QTreeView()
-        self.tree_view.setModel(self.file_model)
-        self.tree_view.setRootIndex(self.file_model.index(self.default_path))
         self.tree_view.setHeaderHidden(True)
-        self.tree_view.hideColumn(1)  # 隐藏大小列
-        self.tree_view.hideColumn(2)  # 隐藏类型列
-        self.tree_view.hideColumn(3)  # 隐藏修改日期列
         self.tree_view.setAnimated(False)
         self.tree_view.setIndentation(20)
-        self.tree_view.setSortingEnabled(True)
         
         # 连接点击事件
         self.tree_view.clicked.connect(self.on_tree_view_clicked)
@@ -114,6 +303,17 @@ class ImageViewer(QMainWindow):
         search_layout = QHBoxLayout(search_widget)
         search_layout.setContentsMargins(5, 5, 5, 5)
         
+        # 数据集切换
+        self.dataset_combo = QComboBox()
+        self.dataset_combo.setMinimumContentsLength(16)
+        self.dataset_combo.activated.connect(self.on_dataset_selected)
+        self.btn_add_dataset = QPushButton("添加数据集")
+        self.btn_add_dataset.clicked.connect(self.add_dataset)
+        self.search_all_check = QCheckBox("全部数据集")
+        self.search_all_check.setToolTip("在所有登记的数据集中检索")
+        self.indexes_built.connect(self.on_indexes_built)
+        self.refresh_dataset_combo()
+        
         # 行人ID搜索
         self.id_label = QLabel("行人ID:")
         self.id_input = QLineEdit()
@@ -123,17 +323,38 @@ class ImageViewer(QMainWindow):
         self.orientation_label = QLabel("朝向:")
         self.orientation_combo = QComboBox()
         self.orientation_combo.addItems(["全部", "正面", "背面", "左侧", "右侧"])
+        self.orientation_combo.currentIndexChanged.connect(self.on_search)
         
         # 搜索按钮
         self.search_btn = QPushButton("搜索")
         self.search_btn.clicked.connect(self.on_search)
         
+        # 近重复检测，结果簇在对比面板中并排查看
+        self.btn_dedup = QPushButton("查重")
+        self.btn_dedup.clicked.connect(self.detect_duplicates)
+        self.duplicate_combo = QComboBox()
+        self.duplicate_combo.setMinimumContentsLength(24)
+        self.duplicate_combo.setVisible(False)
+        self.duplicate_combo.activated.connect(self.show_duplicate_cluster)
+        self.duplicates_found.connect(self.on_duplicates_found)
+        
+        # 数据集统计面板
+        self.btn_stats = QPushButton("统计")
+        self.btn_stats.clicked.connect(self.show_dataset_stats)
+        self.stats_ready.connect(self.on_stats_ready)
+        
         # 添加到检索栏布局
+        search_layout.addWidget(self.dataset_combo)
+        search_layout.addWidget(self.btn_add_dataset)
         search_layout.addWidget(self.id_label)
         search_layout.addWidget(self.id_input)
         search_layout.addWidget(self.orientation_label)
         search_layout.addWidget(self.orientation_combo)
+        search_layout.addWidget(self.search_all_check)
         search_layout.addWidget(self.search_btn)
+        search_layout.addWidget(self.btn_dedup)
+        search_layout.addWidget(self.duplicate_combo)
+        search_layout.addWidget(self.btn_stats)
         search_layout.addStretch()
         
         # 顶部工具栏
@@ -147,6 +368,44 @@ class ImageViewer(QMainWindow):
         self.btn_zoom_out = QPushButton("缩小")
         self.btn_rotate = QPushButton("旋转")
         self.btn_fit = QPushButton("适应窗口")
+        self.btn_gallery = QPushButton("画廊")
+        self.btn_gallery.setCheckable(True)
+        self.btn_compare = QPushButton("跨摄像头对比")
+        self.btn_compare.setCheckable(True)
+        self.btn_play = QPushButton("播放轨迹")
+        self.btn_play.setCheckable(True)
+        self.fps_spin = QSpinBox()
+        self.fps_spin.setRange(1, 60)
+        self.fps_spin.setValue(10)
+        self.fps_spin.setSuffix(" fps")
+        self.btn_annotate = QPushButton("标注")
+        self.btn_annotate.setCheckable(True)
+        self.btn_annotate.setToolTip("1-4: 正面/背面/左侧/右侧, 0: 清除朝向, X: 坏图, P: 修改pid, Ctrl+Z: 撤销")
+        self.btn_overlay = QPushButton("叠加层")
+        overlay_menu = QMenu(self.btn_overlay)
+        self.overlay_actions = {}
+        for layer, (title, suffix, extension) in LAYERS.items():
+            action = QAction(title, overlay_menu)
+            action.setCheckable(True)
+            action.setToolTip(f"<划分>{suffix}/<文件名>{extension}")
+            action.toggled.connect(lambda checked, layer=layer: self.set_overlay_layer(layer, checked))
+            self.overlay_actions[layer] = action
+            overlay_menu.addAction(action)
+        self.btn_overlay.setMenu(overlay_menu)
+        self.opacity_slider = QSlider(Qt.Horizontal)
+        self.opacity_slider.setRange(0, 100)
+        self.opacity_slider.setValue(self.overlay_opacity)
+        self.opacity_slider.setFixedWidth(80)
+        self.opacity_slider.setToolTip("叠加层不透明度")
+        self.btn_identity_tree = QPushButton("身份树")
+        self.btn_identity_tree.setCheckable(True)
+        self.btn_load_features = QPushButton("加载特征")
+        self.btn_rank = QPushButton("检索排序")
+        self.btn_evaluate = QPushButton("评估")
+        self.btn_profile = QPushButton("性能")
+        self.btn_profile.setCheckable(True)
+        self.btn_profile.setChecked(PROFILER.enabled)
+        self.btn_export_trace = QPushButton("导出跟踪")
         
         self.toolbar.addWidget(self.btn_prev)
         self.toolbar.addWidget(self.btn_next)
@@ -156,6 +415,23 @@ class ImageViewer(QMainWindow):
         self.toolbar.addWidget(self.btn_rotate)
         self.toolbar.addSeparator()
         self.toolbar.addWidget(self.btn_fit)
+        self.toolbar.addSeparator()
+        self.toolbar.addWidget(self.btn_overlay)
+        self.toolbar.addWidget(self.opacity_slider)
+        self.toolbar.addSeparator()
+        self.toolbar.addWidget(self.btn_gallery)
+        self.toolbar.addWidget(self.btn_compare)
+        self.toolbar.addWidget(self.btn_play)
+        self.toolbar.addWidget(self.fps_spin)
+        self.toolbar.addWidget(self.btn_identity_tree)
+        self.toolbar.addWidget(self.btn_annotate)
+        self.toolbar.addSeparator()
+        self.toolbar.addWidget(self.btn_load_features)
+        self.toolbar.addWidget(self.btn_rank)
+        self.toolbar.addWidget(self.btn_evaluate)
+        self.toolbar.addSeparator()
+        self.toolbar.addWidget(self.btn_profile)
+        self.toolbar.addWidget(self.btn_export_trace)
         
         # 连接按钮信号
         self.btn_prev.clicked.connect(self.show_previous_image)
@@ -164,6 +440,30 @@ class ImageViewer(QMainWindow):
         self.btn_zoom_out.clicked.connect(self.zoom_out)
         self.btn_rotate.clicked.connect(self.rotate_image)
         self.btn_fit.clicked.connect(self.fit_to_window)
+        self.opacity_slider.valueChanged.connect(self.set_overlay_opacity)
+        self.btn_gallery.toggled.connect(self.set_gallery_mode)
+        self.btn_compare.toggled.connect(self.set_compare_mode)
+        self.btn_play.toggled.connect(self.set_playback)
+        self.fps_spin.valueChanged.connect(self.player.set_fps)
+        self.btn_identity_tree.toggled.connect(self.set_identity_tree_mode)
+        self.btn_annotate.toggled.connect(self.set_annotation_mode)
+        self.annotation_error.connect(self.status_bar_message)
+        
+        # 标注模式的快捷键，只在标注模式下启用
+        self.annotation_shortcuts = []
+        bindings = [(str(code), lambda code=code: self.annotate(ORIENTATION, code)) for code in range(5)]
+        bindings += [("X", self.toggle_bad_crop), ("P", self.correct_pid), ("Ctrl+Z", self.undo_annotation)]
+        for key, action in bindings:
+            shortcut = QShortcut(QKeySequence(key), self)
+            shortcut.activated.connect(action)
+            shortcut.setEnabled(False)
+            self.annotation_shortcuts.append(shortcut)
+        self.btn_load_features.clicked.connect(self.on_load_features)
+        self.btn_rank.clicked.connect(self.rank_current_image)
+        self.btn_evaluate.clicked.connect(self.evaluate_features)
+        self.evaluation_finished.connect(self.status_bar_message)
+        self.btn_profile.toggled.connect(self.set_profiling)
+        self.btn_export_trace.clicked.connect(self.export_trace)
         
         # 图片显示区域
         self.scroll_area = QScrollArea()
@@ -177,7 +477,9 @@ class ImageViewer(QMainWindow):
         
         # 创建四个图像标签
         for i in range(4):
-            image_label = ImageLabel()
+            image_label = ImageLabel(i)
+            image_label.page_requested.connect(self.page_compare_panel)
+            image_label.region_selected.connect(self.on_region_selected)
             image_label.setAlignment(Qt.AlignCenter)
             image_label.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
             image_label.setScaledContents(False)
@@ -186,13 +488,33 @@ class ImageViewer(QMainWindow):
         
         self.scroll_area.setWidget(self.grid_widget)
         
+        # 缩略图画廊（与四宫格切换显示）
+        self.gallery_view = GalleryView()
+        self.gallery_view.set_paths(self.image_files)
+        self.gallery_view.clicked.connect(self.on_gallery_clicked)
+        self.gallery_view.activated.connect(self.on_gallery_activated)
+        
+        self.view_stack = QStackedWidget()
+        self.view_stack.addWidget(self.scroll_area)
+        self.view_stack.addWidget(self.gallery_view)
+        
         # 状态栏
         self.status_bar = self.statusBar()
         
+        # 性能面板：状态栏右侧显示各阶段 p50/p95，悬停显示直方图
+        self.profile_label = QLabel()
+        self.profile_label.setVisible(PROFILER.enabled)
+        self.status_bar.addPermanentWidget(self.profile_label)
+        self.profile_timer = QTimer(self)
+        self.profile_timer.setInterval(500)
+        self.profile_timer.timeout.connect(self.update_profile_panel)
+        if PROFILER.enabled:
+            self.profile_timer.start()
+        
         # 添加到右侧布局
         right_layout.addWidget(search_widget)
         right_layout.addWidget(self.toolbar)
-        right_layout.addWidget(self.scroll_area)
+        right_layout.addWidget(self.view_stack)
         
         # 添加左右部件到分割器
         splitter.addWidget(self.tree_view)
@@ -206,69 +528,937 @@ class ImageViewer(QMainWindow):
         main_layout.addWidget(splitter)
         self.setCentralWidget(main_widget)
     
+    def get_dataset_index(self):
+        """获取当前根路径的数据集索引（已加载过的直接取自登记表，否则加载缓存并按目录 mtime 增量刷新）"""
+        root = os.path.abspath(self.default_path)
+        if self.dataset_index is None or self.dataset_index.root != root:
+            if root not in self.registry.indexes:
+                self.status_bar.showMessage(f"正在建立索引: {self.default_path}")
+                QApplication.processEvents()
+            self.dataset_index = self.registry.index(root)
+        return self.dataset_index
+    
+    def refresh_dataset_combo(self):
+        """数据集下拉框与登记表和当前根路径同步"""
+        self.dataset_combo.blockSignals(True)
+        self.dataset_combo.clear()
+        for name in self.registry.names():
+            root, format_name = self.registry.datasets[name]
+            self.dataset_combo.addItem(name)
+            self.dataset_combo.setItemData(self.dataset_combo.count() - 1, f"{root} [{format_name}]", Qt.ToolTipRole)
+        self.dataset_combo.setCurrentIndex(self.dataset_combo.findText(self.registry.name_of(self.default_path) or ''))
+        self.dataset_combo.blockSignals(False)
+    
+    def on_dataset_selected(self, position):
+        self.set_root_path(self.registry.root(self.dataset_combo.itemText(position)))
+    
+    def add_dataset(self):
+        """登记新的数据集根目录并切换过去"""
+        folder = QFileDialog.getExistingDirectory(self, "选择数据集根目录", os.path.dirname(self.default_path))
+        if folder:
+            self.set_root_path(folder)
+    
+    def register_dataset(self, root):
+        """登记根目录（已登记时不变），写回登记文件"""
+        if self.registry.name_of(root) is None:
+            self.registry.add(root)
+            try:
+                self.registry.save()
+            except OSError as e:
+                self.status_bar.showMessage(f"无法保存数据集登记: {e}")
+        self.refresh_dataset_combo()
+    
+    def search_all_datasets(self, pid, camera, text):
+        """在所有登记的数据集中检索；缺少索引时先在后台多进程并行建立，完成后重新检索"""
+        if self.index_build_running:
+            self.status_bar.showMessage("正在建立索引，请稍候")
+            return
+        missing = self.registry.missing()
+        if missing:
+            self.index_build_running = True
+            registry = self.registry
+            
+            def run():
+                try:
+                    elapsed = registry.build()
+                except Exception as e:
+                    self.indexes_built.emit(f"建立索引失败: {e}")
+                    return
+                self.indexes_built.emit(f"已建立 {len(missing)} 个数据集的索引 ({elapsed:.1f}s)")
+            
+            self.status_bar.showMessage(f"正在并行建立 {len(missing)} 个数据集的索引: {', '.join(missing)}")
+            threading.Thread(target=run, daemon=True).start()
+            return
+        
+        start = time.perf_counter()
+        results = self.registry.search(pid=pid, camera=camera)
+        elapsed = (time.perf_counter() - start) * 1000
+        if not results:
+            self.status_bar.showMessage(f"所有数据集中都未找到匹配的图片: {text}")
+            return
+        self.folder_scanner.cancel()
+        self.current_folder = None
+        self.set_image_files([path for _, index, rows in results for path in index.paths(rows)])
+        self.current_image_index = 0
+        self.current_image_path = self.image_files[0]
+        self.load_image(self.current_image_path)
+        counts = ', '.join(f"{name}: {len(rows)}" for name, _, rows in results)
+        self.status_bar.showMessage(f"全部数据集: {text}, 共 {len(self.image_files)} 张 ({counts}; {elapsed:.3f} ms)")
+    
+    def on_indexes_built(self, message):
+        self.index_build_running = False
+        self.status_bar.showMessage(message)
+        if self.search_all_check.isChecked() and not message.startswith("建立索引失败"):
+            self.on_search()
+    
+    def get_bitmap_index(self):
+        """获取位图索引：朝向标注、pid 修正和坏图标记来自标注模式合并出的 orientation.txt 和
+        corrections.txt（没有时为数据集根目录下的）"""
+        index = self.get_dataset_index()
+        paths = (orientation_labels_path(index.root), corrections_path(index.root))
+        stamps = []
+        for path in paths:
+            try:
+                stamps.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                stamps.append(None)
+        if self.bitmap_index is None or self.bitmap_index.index is not index or stamps != self.bitmap_index_mtime:
+            # 标注合并后标注文件变化，重建位图索引
+            self.bitmap_index_mtime = stamps
+            keys = LabelKeys(index) if any(stamps) else None
+            orientations = load_orientations(index, paths[0], keys)
+            corrections = load_corrections(index, paths[1], keys)
+            pids, bad = corrections if corrections is not None else (None, None)
+            self.bitmap_index = BitmapIndex(index, orientations, pids, bad)
+        return self.bitmap_index
+    
     def on_search(self):
-        """处理搜索按钮点击事件"""
+        """处理搜索按钮点击事件（朝向变化时也会重新过滤）"""
+        self.stop_playback()
         person_id = self.id_input.text()
         orientation = self.orientation_combo.currentText()
+        orientation_code = self.orientation_combo.currentIndex()
+        
+        try:
+            pid, camera = parse_query(person_id)
+        except ValueError as e:
+            self.status_bar.showMessage(str(e))
+            return
+        if pid is None and camera is None and orientation_code == UNLABELED:
+            self.status_bar.showMessage("请输入行人ID（如 0001 或 0001 c3）或选择朝向")
+            return
+        
+        if self.compare_mode and pid is not None:
+            self.show_identity(pid)
+            return
+        
+        if self.search_all_check.isChecked():
+            if orientation_code != UNLABELED:
+                self.status_bar.showMessage("跨数据集检索不支持朝向过滤")
+            elif pid is not None or camera is not None:
+                self.search_all_datasets(pid, camera, person_id)
+            return
+        
+        index = self.get_dataset_index()
+        bitmap_index = self.get_bitmap_index()
+        if orientation_code != UNLABELED and bitmap_index.orientations is None:
+            self.status_bar.showMessage(f"未找到朝向标注文件: {orientation_labels_path(index.root)}")
+            return
+        if orientation_code != UNLABELED or bitmap_index.has_corrections:
+            # 有 pid 修正或坏图标记时按修正后的 pid 检索并排除坏图
+            start = time.perf_counter()
+            rows = bitmap_index.select(pid=pid, camera=camera, orientation=orientation_code)
+        else:
+            start = time.perf_counter()
+            rows = index.query(pid=pid, camera=camera)
+        elapsed = (time.perf_counter() - start) * 1000
+        if len(rows) == 0:
+            self.status_bar.showMessage(f"未找到匹配的图片: ID={person_id}, 朝向={orientation}")
+            return
+        
+        # 检索结果作为新的浏览列表
+        self.folder_scanner.cancel()
+        self.current_folder = None
+        self.set_image_files(index.paths(rows))
+        self.current_image_index = 0
+        self.current_image_path = self.image_files[0]
+        self.load_image(self.current_image_path)
+        self.status_bar.showMessage(
+            f"搜索条件: ID={person_id}, 朝向={orientation}, 共 {len(rows)} 张 ({elapsed:.3f} ms)")
+    
+    def status_bar_message(self, message):
+        self.status_bar.showMessage(message)
+    
+    def set_profiling(self, enabled):
+        """打开/关闭热点路径计时"""
+        PROFILER.set_enabled(enabled)
+        self.profile_label.setVisible(enabled)
+        if enabled:
+            PROFILER.clear()
+            self.profile_timer.start()
+        else:
+            self.profile_timer.stop()
+    
+    def update_profile_panel(self):
+        self.profile_label.setText(format_stats(PROFILER.stats()))
+        self.profile_label.setToolTip(format_histograms(PROFILER))
+    
+    def export_trace(self):
+        """导出本次会话的 Chrome trace-event JSON"""
+        path, _ = QFileDialog.getSaveFileName(self, "导出跟踪", "reid_viewer_trace.json", "JSON (*.json)")
+        if path:
+            count = PROFILER.export_chrome_trace(path)
+            self.status_bar.showMessage(f"已导出 {count} 个事件: {path}")
+    
+    def on_load_features(self):
+        """选择特征目录：需包含 query.npy、gallery.npy 及对应的 *_names.txt"""
+        folder = QFileDialog.getExistingDirectory(self, "选择特征目录", self.default_path)
+        if folder:
+            self.load_features(folder)
+    
+    def load_features(self, folder):
+        """以 memmap 方式加载 query/gallery 特征，并按文件名与数据集索引对齐"""
+        index = self.get_dataset_index()
+        try:
+            self.query_features = FeatureSet.load(os.path.join(folder, 'query.npy'), index)
+            self.gallery_features = FeatureSet.load(os.path.join(folder, 'gallery.npy'), index)
+        except (OSError, ValueError) as e:
+            self.query_features = self.gallery_features = None
+            self.status_bar.showMessage(f"加载特征失败: {e}")
+            return
+        self.status_bar.showMessage(
+            f"已加载特征: query {len(self.query_features)} 张, gallery {len(self.gallery_features)} 张")
+    
+    def rank_current_image(self):
+        """以当前图片为 query 计算 top-k 排序，在画廊中显示（绿色为正确匹配，红色为错误匹配）"""
+        if self.query_features is None:
+            self.status_bar.showMessage("请先加载特征")
+            return
+        query_path = self.current_image_path
+        query_row = self.query_features.row_of(query_path) if query_path else None
+        if query_row is None:
+            self.status_bar.showMessage("当前图片不在 query 特征中")
+            return
+        
+        start = time.perf_counter()
+        rows, _, matches = rank_gallery(self.query_features, query_row, self.gallery_features, self.rank_k)
+        elapsed = (time.perf_counter() - start) * 1000
+        
+        ranked, marks = [query_path], {query_path: QColor(70, 110, 200)}
+        for row, match in zip(rows, matches):
+            path = self.gallery_features.paths[row]
+            if path is not None:
+                ranked.append(path)
+                marks[path] = QColor(60, 160, 60) if match else QColor(190, 50, 50)
+        
+        self.folder_scanner.cancel()
+        self.current_folder = None
+        self.set_image_files(ranked, marks)
+        self.current_image_index = 0
+        self.btn_gallery.setChecked(True)
+        self.status_bar.showMessage(
+            f"{os.path.basename(query_path)} 的前 {len(rows)} 名: 正确匹配 {int(matches.sum())} 张 ({elapsed:.1f} ms)")
+    
+    def evaluate_features(self):
+        """在后台线程中分块计算整个 query 集的 CMC 和 mAP"""
+        if self.query_features is None:
+            self.status_bar.showMessage("请先加载特征")
+            return
+        query_set, gallery_set = self.query_features, self.gallery_features
+        
+        def run():
+            start = time.perf_counter()
+            cmc, mean_ap, valid = evaluate(query_set, gallery_set)
+            self.evaluation_finished.emit(
+                f"mAP: {mean_ap:.2%}, Rank-1: {cmc[0]:.2%}, Rank-5: {cmc[4]:.2%}, Rank-10: {cmc[9]:.2%} "
+                f"({valid} 个有效 query, {time.perf_counter() - start:.1f}s)")
         
-        # 这里可以添加搜索逻辑
-        self.status_bar.showMessage(f"搜索条件: ID={person_id}, 朝向={orientation}")
+        self.status_bar.showMessage("正在评估...")
+        threading.Thread(target=run, daemon=True).start()
+    
+    def detect_duplicates(self):
+        """在后台计算感知哈希（多进程，按 路径 + mtime 缓存）并查找近重复簇"""
+        root = self.default_path
+        
+        def run():
+            start = time.perf_counter()
+            try:
+                clusters = find_duplicates(root)
+            except Exception as e:
+                self.duplicates_found.emit((None, f"查重失败: {e}"))
+                return
+            self.duplicates_found.emit((clusters, time.perf_counter() - start))
+        
+        self.btn_dedup.setEnabled(False)
+        self.status_bar.showMessage("正在查找近重复图片...")
+        threading.Thread(target=run, daemon=True).start()
+    
+    def on_duplicates_found(self, result):
+        clusters, elapsed = result
+        self.btn_dedup.setEnabled(True)
+        if clusters is None:
+            self.status_bar.showMessage(elapsed)
+            return
+        self.duplicate_clusters = clusters
+        self.duplicate_combo.clear()
+        for i, (paths, splits) in enumerate(clusters):
+            leak = " 跨划分" if len(splits) > 1 else ""
+            self.duplicate_combo.addItem(f"簇 {i + 1}: {len(paths)} 张{leak} [{', '.join(splits) or '.'}]")
+        self.duplicate_combo.setVisible(bool(clusters))
+        cross = sum(len(splits) > 1 for _, splits in clusters)
+        self.status_bar.showMessage(f"找到 {len(clusters)} 个近重复簇，其中 {cross} 个跨划分 ({elapsed:.1f}s)")
+        if clusters:
+            self.show_duplicate_cluster(0)
+    
+    def show_duplicate_cluster(self, index):
+        """在对比面板中并排显示一个近重复簇，面板 i 从第 i 张开始，可独立翻页"""
+        if not 0 <= index < len(self.duplicate_clusters):
+            return
+        paths, splits = self.duplicate_clusters[index]
+        self.btn_compare.blockSignals(True)
+        self.btn_compare.setChecked(True)
+        self.btn_compare.blockSignals(False)
+        self.compare_mode = True
+        self.compare_title = f"簇 {index + 1} [{', '.join(splits) or '.'}]"
+        panel_count = len(self.image_labels)
+        self.compare_groups = [paths] * panel_count
+        self.compare_positions = [min(panel, len(paths) - 1) for panel in range(panel_count)]
+        self.load_compare_panels(range(panel_count))
+    
+    def show_dataset_stats(self):
+        """统计面板：先用缓存立即显示，再在后台增量更新（多进程，只读取新增或变化的图片）"""
+        root = self.default_path
+        if self.stats_dialog is None:
+            self.stats_dialog = QDialog(self)
+            self.stats_dialog.resize(640, 720)
+            layout = QVBoxLayout(self.stats_dialog)
+            self.stats_text = QPlainTextEdit()
+            self.stats_text.setReadOnly(True)
+            self.stats_text.setStyleSheet("font-family: monospace;")
+            layout.addWidget(self.stats_text)
+        self.stats_dialog.setWindowTitle(f"数据集统计: {root}")
+        cache = StatsCache(root)
+        if cache.load():
+            self.stats_text.setPlainText(format_summary(summarize(cache)) + "\n\n正在检查更新...")
+        else:
+            self.stats_text.setPlainText("正在统计...")
+        self.stats_dialog.show()
+        self.stats_dialog.raise_()
+        
+        def run():
+            start = time.perf_counter()
+            try:
+                report = format_summary(compute_stats(root))
+            except Exception as e:
+                report = f"统计失败: {e}"
+            self.stats_ready.emit(f"{report}\n\n用时 {time.perf_counter() - start:.1f}s")
+        
+        self.btn_stats.setEnabled(False)
+        threading.Thread(target=run, daemon=True).start()
+    
+    def on_stats_ready(self, report):
+        self.btn_stats.setEnabled(True)
+        self.stats_text.setPlainText(report)
+    
+    def on_region_selected(self, panel, stats):
+        """显示框选区域的各通道均值、标准差和直方图"""
+        if self.region_dialog is None:
+            self.region_dialog = QDialog(self)
+            self.region_dialog.setWindowTitle("区域统计")
+            self.region_dialog.resize(420, 260)
+            layout = QVBoxLayout(self.region_dialog)
+            self.region_text = QPlainTextEdit()
+            self.region_text.setReadOnly(True)
+            self.region_text.setStyleSheet("font-family: monospace;")
+            layout.addWidget(self.region_text)
+        self.region_text.setPlainText(f"面板 {panel + 1}\n" + format_region(stats))
+        self.region_dialog.show()
+        mean = stats['mean']
+        self.status_bar.showMessage(
+            f"区域 {stats['rect'][2]}x{stats['rect'][3]}: 均值 RGB({mean[0]:.1f}, {mean[1]:.1f}, {mean[2]:.1f})")
+    
+    def set_annotation_mode(self, enabled):
+        """标注模式：快捷键为当前图片打标注并自动前进，修改写入追加日志，后台合并到标注文件"""
+        if enabled:
+            root = os.path.abspath(self.default_path)
+            if vfs.is_container(root) or vfs.split_path(root)[0] is not None:
+                self.status_bar.showMessage("打包数据集和压缩包不支持标注")
+                self.btn_annotate.setChecked(False)
+                return
+            if self.annotations is None or self.annotations.root != root:
+                self.close_annotations()
+                try:
+                    # open() 找不到可写的标注目录（数据集旁和用户缓存目录都不可写）时抛出 OSError
+                    store = AnnotationStore(root, on_error=self.annotation_error.emit)
+                    replayed = store.open()
+                except OSError as e:
+                    self.status_bar.showMessage(f"无法打开标注: {e}")
+                    self.btn_annotate.setChecked(False)
+                    return
+                self.annotations = store
+                if replayed:
+                    self.status_bar.showMessage(f"已从日志恢复 {replayed} 条标注")
+        elif self.annotations is not None:
+            self.annotations.compact()
+        for shortcut in self.annotation_shortcuts:
+            shortcut.setEnabled(enabled)
     
+    def close_annotations(self):
+        if self.annotations is not None:
+            if not self.annotations.close():
+                self.status_bar.showMessage(f"标注未能全部写入: {self.annotations.error}")
+            self.annotations = None
+    
+    def annotation_key(self, path):
+        """标注键：相对数据集根目录的路径，不同划分中的同名文件分别标注；
+        图片不在标注的数据集中（如跨数据集检索、回放或排序列表中的图片）时返回 None"""
+        name = os.path.relpath(path, self.annotations.root)
+        if name == os.pardir or name.startswith(os.pardir + os.sep):
+            return None
+        return name
+    
+    def current_annotation_key(self):
+        """当前图片的标注键，不能标注时返回 None（图片不在标注的数据集中时在状态栏提示）"""
+        if self.annotations is None or not self.current_image_path:
+            return None
+        name = self.annotation_key(self.current_image_path)
+        if name is None:
+            self.status_bar.showMessage(f"当前图片不在标注的数据集 {self.annotations.root} 中，不能标注")
+        return name
+    
+    def annotate(self, field, value, advance=True):
+        """为当前图片设置标注，然后前进到下一张"""
+        name = self.current_annotation_key()
+        if name is None:
+            return
+        self.annotations.set(name, field, value)
+        self.status_bar.showMessage(f"{name}: {self.annotations.summary(name)}")
+        if advance:
+            self.show_next_image()
+    
+    def toggle_bad_crop(self):
+        name = self.current_annotation_key()
+        if name is not None:
+            self.annotate(BAD, '' if self.annotations.get(name, BAD) else '1')
+    
+    def correct_pid(self):
+        name = self.current_annotation_key()
+        if name is None:
+            return
+        parsed = self.registry.index(self.annotations.root).parse(os.path.basename(self.current_image_path))
+        current = int(self.annotations.get(name, PID) or (parsed[0] if parsed else 0))
+        pid, ok = QInputDialog.getInt(self, "修改行人ID", "新的行人ID:", current, -1, 999999)
+        if ok:
+            self.annotate(PID, pid if parsed is None or pid != parsed[0] else '')
+    
+    def undo_annotation(self):
+        """撤销最近一次标注，并回到被撤销的图片"""
+        if self.annotations is None:
+            return
+        name = self.annotations.undo()
+        if name is None:
+            self.status_bar.showMessage("没有可撤销的标注")
+            return
+        if self.current_image_path and self.annotation_key(self.current_image_path) != name:
+            index = self.image_index.get(os.path.join(self.annotations.root, name))
+            if index is not None:
+                self.current_image_index = index
+                self.current_image_path = self.image_files[index]
+                self.load_image(self.current_image_path)
+        self.status_bar.showMessage(f"已撤销: {name} ({self.annotations.summary(name)})")
+    
+    def closeEvent(self, event):
+        if self.annotations is not None and not self.annotations.flush():
+            answer = QMessageBox.question(
+                self, "标注未保存",
+                f"标注无法写入磁盘（{self.annotations.error}），退出将丢失未写入的修改。仍要退出吗？")
+            if answer != QMessageBox.Yes:
+                event.ignore()
+                return
+        self.save_last_session()
+        self.close_annotations()
+        self.folder_watcher.close()
+        self.save_dataset_index()
+        self.gallery_view.save_thumbnails()
+        super().closeEvent(event)
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.startup_expected is not False:
+            self.startup_mark('首次绘制')
+        if self.pending_start is not None:
+            QTimer.singleShot(0, self.run_pending_start)  # 让本次绘制先送到屏幕
+    
+    def set_identity_tree_mode(self, enabled):
+        """左侧切换为按 划分 -> pid -> 摄像头 分组的身份树，或切回文件系统树"""
+        if enabled:
+            index = self.get_dataset_index()
+            if self.identity_model is None or self.identity_model.index_data is not index:
+                self.identity_model = IdentityTreeModel(index, self)
+            self.tree_view.setSortingEnabled(False)  # 分组已按预先计算的键排好序
+            self.tree_view.setModel(self.identity_model)
+            self.status_bar.showMessage(f"身份树: {len(index)} 张, {len(index.pids())} 个ID")
+        else:
+            self.tree_view.setModel(self.file_model)
+            self.tree_view.setRootIndex(self.file_model.index(self.default_path))
+            for column in (1, 2, 3):
+                self.tree_view.hideColumn(column)
+            self.tree_view.setSortingEnabled(True)
+    
+    def on_identity_tree_clicked(self, index):
+        """身份树节点：图片显示该图片并以所在摄像头分组为浏览列表，pid/摄像头节点浏览整组，划分节点打开目录"""
+        model = self.identity_model
+        kind = model.node_kind(index)
+        if kind == SPLIT:
+            self.open_folder(model.filePath(index))
+            return
+        rows = model.node_rows(index)
+        self.folder_scanner.cancel()
+        self.current_folder = None
+        self.set_image_files(model.index_data.paths(rows))
+        path = model.filePath(index) if kind == IMAGE else self.image_files[0]
+        self.current_image_index = self.image_index[path]
+        self.current_image_path = path
+        self.load_image(path)
+    
+    @profiled('tree_click')
     def on_tree_view_clicked(self, index):
+        self.stop_playback()
+        if self.tree_view.model() is self.identity_model:
+            self.on_identity_tree_clicked(index)
+            return
         path = self.file_model.filePath(index)
         
-        if os.path.isfile(path):
-            # 如果是文件，显示图片
+        if vfs.is_container(path):
+            # 打包数据集或压缩包：按文件夹浏览其中的图片
+            self.open_folder(path)
+        elif os.path.isfile(path):
+            # 如果是文件，先显示图片，再在后台获取当前文件夹中的所有图片文件
             self.current_image_path = path
-            self.load_image(path)
-            # 获取当前文件夹中的所有图片文件
             folder = os.path.dirname(path)
             if folder != self.current_folder:
-                self.current_folder = folder
-                self.image_files = self.get_image_files(folder)
-                self.current_image_index = self.image_files.index(path)
+                self.open_folder(folder, select_path=path)
+            else:
+                self.current_image_index = self.image_index.get(path, -1)
+                if self.current_image_index < 0:
+                    self.pending_select_path = path
+            self.load_image(path)
         elif os.path.isdir(path):
             # 如果是文件夹，更新当前文件夹
-            self.current_folder = path
-            self.image_files = self.get_image_files(path)
-            if self.image_files:
-                self.current_image_index = 0
-                self.current_image_path = self.image_files[0]
-                self.load_image(self.current_image_path)
+            self.open_folder(path)
     
+    def open_folder(self, folder, select_path=None):
+        """打开文件夹：有效的缓存列表直接使用，否则后台流式扫描（取消上一次扫描）"""
+        self.current_folder = folder
+        self.pending_select_path = select_path
+        self.current_image_index = -1
+        self.folder_watcher.stop()
+        self.set_image_files([])
+        
+        cached = self.folder_scanner.cached_listing(folder)
+        if cached is not None:
+            self.folder_scanner.cancel()
+            self.on_scan_batch(folder, list(cached))
+            self.on_scan_finished(folder)
+        else:
+            self.folder_scanner.scan(folder)
+    
+    def set_image_files(self, files, marks=None):
+        """替换浏览列表并重建路径索引，marks 为画廊中的 路径 -> 背景色"""
+        self.image_files = files
+        self.image_index = {path: i for i, path in enumerate(files)}
+        self.gallery_view.set_paths(files, marks)
+    
+    def on_scan_batch(self, folder, batch):
+        """接收一批扫描结果，第一批到达时即可显示第一张图片"""
+        if folder != self.current_folder:
+            return
+        start = len(self.image_files)
+        self.gallery_view.extend(batch)  # 画廊模型与 image_files 共享同一列表
+        self.image_index.update(zip(batch, range(start, start + len(batch))))
+        
+        if self.pending_select_path is not None:
+            index = self.image_index.get(self.pending_select_path)
+            if index is not None:
+                self.current_image_index = index
+                self.pending_select_path = None
+                self.prefetch_neighbors()
+        elif self.current_image_index < 0 and self.image_files:
+            self.current_image_index = 0
+            self.current_image_path = self.image_files[0]
+            self.load_image(self.current_image_path)
+        elif start <= self.current_image_index + self.prefetch_radius:
+            self.prefetch_neighbors()
+    
+    def on_scan_finished(self, folder):
+        """扫描完成"""
+        if folder != self.current_folder:
+            return
+        self.pending_select_path = None
+        dirs = self.folder_scanner.cached_dirs(folder)
+        if dirs and vfs.split_path(folder)[0] is None:
+            self.folder_watcher.watch(folder, dirs)
+        if not self.image_files:
+            self.status_bar.showMessage(f"文件夹中没有图片: {folder}")
+        if self.startup_expected:
+            if not self.image_files:
+                self.startup_expected.discard('图片')
+            self.startup_mark('列表')
+    
+    def on_folder_changed(self, folder, added, removed):
+        """把文件监视得到的增删应用到浏览列表、画廊、扫描缓存和数据集索引，保持当前图片不变
+
+        列表按扫描顺序（路径分量逐级按名称排序）保持有序，新增的图片二分查找插入位置，
+        删除的目录对应一段连续的行；只有变化位置之后的行需要重新编号。
+        """
+        if folder != self.current_folder:
+            self.folder_watcher.stop()
+            return
+        start_time = time.perf_counter()
+        files = self.image_files
+        key = lambda path: os.path.relpath(path, folder).split(os.sep)
+        new_dirs = [path for path in added if not is_image(path)]   # 新建的目录只影响扫描缓存和数据集索引
+        images = [path for path in added if is_image(path)]
+        first = len(files)  # 需要重新编号的第一行
+        
+        # 删除：文件直接查位置，目录按排序键找到其下连续的行
+        spans = []
+        for path in removed:
+            row = self.image_index.get(path)
+            if row is not None:
+                spans.append((row, row + 1))
+                continue
+            prefix = key(path)
+            low = bisect.bisect_left(files, prefix, key=key)
+            high = low
+            while high < len(files) and key(files[high])[:len(prefix)] == prefix:
+                high += 1
+            if high > low:
+                spans.append((low, high))
+        merged = []  # 合并重叠的范围（目录及其中的文件可能同时被报告删除）
+        for low, high in sorted(spans):
+            if merged and low <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], high)
+            else:
+                merged.append([low, high])
+        removed_count = 0
+        for low, high in reversed(merged):
+            for path in files[low:high]:
+                del self.image_index[path]
+            self.gallery_view.remove(low, high - low)  # 画廊模型与 image_files 共享同一列表
+            removed_count += high - low
+            first = min(first, low)
+        
+        # 新增：已在列表中的是被修改的文件，其余按插入位置分组后从后往前插入
+        modified = [path for path in images if path in self.image_index]
+        new_paths = sorted({path for path in images if path not in self.image_index}, key=key)
+        groups = {}
+        for path in new_paths:
+            groups.setdefault(bisect.bisect_left(files, key(path), key=key), []).append(path)
+        for row in sorted(groups, reverse=True):
+            self.gallery_view.insert(row, groups[row])
+            first = min(first, row)
+        self.image_index.update(zip(files[first:], range(first, len(files))))
+        self.gallery_view.renumber(first)
+        if modified:
+            self.image_loader.invalidate(modified)
+            self.gallery_view.invalidate(modified)
+        
+        self.folder_scanner.update_listing(
+            folder, files, {os.path.dirname(path) for path in added + removed}.union(new_dirs))
+        index = self.dataset_index
+        if index is not None and os.path.commonpath([index.root, os.path.abspath(folder)]) == index.root:
+            if index.apply_changes(added, removed):
+                self.bitmap_index = None
+                if self.identity_model is not None:
+                    self.identity_model = None
+                    if self.btn_identity_tree.isChecked():
+                        self.set_identity_tree_mode(True)
+                self.index_save_timer.start()
+        
+        # 保持当前图片；当前图片被删除时显示原位置的下一张
+        current = self.current_image_path
+        if current in self.image_index:
+            self.current_image_index = self.image_index[current]
+            if current in modified:
+                self.load_image(current)
+        elif files and (self.current_image_index >= 0 or current is None):
+            row = bisect.bisect_left(files, key(current), key=key) if current is not None else 0
+            self.current_image_index = min(row, len(files) - 1)
+            self.current_image_path = files[self.current_image_index]
+            self.load_image(self.current_image_path)
+        elif not files:
+            self.current_image_index = -1
+        elapsed = (time.perf_counter() - start_time) * 1000
+        self.status_bar.showMessage(
+            f"文件变化: 新增 {len(new_paths)}, 删除 {removed_count}, 修改 {len(modified)}, "
+            f"共 {len(files)} 张 ({elapsed:.1f} ms)")
+    
+    def on_folder_overflow(self, folder):
+        """文件事件丢失（事件队列溢出），重新扫描当前文件夹"""
+        if folder == self.current_folder:
+            self.open_folder(folder, select_path=self.current_image_path)
+    
+    def save_dataset_index(self):
+        """写回增量更新过的索引缓存"""
+        self.index_save_timer.stop()
+        if self.dataset_index is not None and self.dataset_index.changed:
+            self.dataset_index.save()
+    
+    def set_gallery_mode(self, enabled):
+        """切换缩略图画廊和四宫格显示"""
+        self.view_stack.setCurrentWidget(self.gallery_view if enabled else self.scroll_area)
+        if enabled:
+            self.gallery_view.select_row(self.current_image_index)
+    
+    def on_gallery_clicked(self, index):
+        """单击缩略图：设为当前图片"""
+        self.current_image_index = index.row()
+        self.current_image_path = self.image_files[self.current_image_index]
+        self.load_image(self.current_image_path)
+    
+    def on_gallery_activated(self, index):
+        """双击缩略图：回到四宫格查看该图片"""
+        self.on_gallery_clicked(index)
+        self.btn_gallery.setChecked(False)
+    
+    @profiled('get_image_files')
     def get_image_files(self, folder):
-        """获取文件夹中的所有图片文件"""
-        extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+        """获取文件夹中的所有图片文件（同步扫描）"""
         image_files = []
-        for root, dirs, files in os.walk(folder):
-            for file in files:
-                if file.lower().endswith(extensions):
-                    image_files.append(os.path.join(root, file))
-        return sorted(image_files)
+        for batch in scan_image_files(folder):
+            image_files.extend(batch)
+        return image_files
     
+    @profiled('load_image')
     def load_image(self, path):
-        """加载并显示图片"""
-        self.original_pixmap = QPixmap(path)  # 保存原始图片
-        if self.original_pixmap.isNull():
-            for label in self.image_labels:
-                label.setText("无法加载图片")
+        """加载并显示图片（命中缓存时立即显示，否则交给后台解码）"""
+        if self.player.is_playing():
+            return  # 播放中面板由定时器更新，切换图片的操作会先停止播放
+        pixmap = self.image_loader.get(path)
+        if pixmap is not None:
+            self.show_pixmap(path, pixmap)
+        else:
+            self.status_bar.showMessage(f"正在加载: {os.path.basename(path)}")
+            self.image_loader.request(path)
+        self.prefetch_neighbors()
+    
+    def on_image_ready(self, path, pixmap):
+        """后台解码完成，只显示仍是当前图片的结果"""
+        if self.player.is_playing():
+            return  # 播放中的帧由定时器按拍显示
+        if self.compare_mode:
+            pyramid = self.make_pyramid(path, pixmap)
+            for panel, label in enumerate(self.image_labels):
+                if self.compare_path(panel) == path:
+                    self.set_label_pixmap(label, pixmap, pyramid, path)
+        elif path == self.current_image_path:
+            self.show_pixmap(path, pixmap)
+    
+    def prefetch_neighbors(self):
+        """预取当前图片前后 prefetch_radius 张，优先预取前进方向"""
+        if self.current_image_index < 0 or not self.image_files:
             return
+        paths = []
+        for distance in range(1, self.prefetch_radius + 1):
+            for index in (self.current_image_index + distance, self.current_image_index - distance):
+                if 0 <= index < len(self.image_files):
+                    paths.append(self.image_files[index])
+        self.image_loader.prefetch(paths, keep=[self.current_image_path])
+    
+    def show_pixmap(self, path, pixmap):
+        """显示已解码的图片"""
+        self.original_pixmap = pixmap  # 保存原始图片
+        self.displayed_image_path = path
+        pyramid = self.make_pyramid(path, pixmap)
         
-        self.display_pixmap = self.original_pixmap  # 显示用的图片
-        
-        # 在所有标签中显示相同的图片
+        # 在所有标签中显示相同的图片（共享同一个金字塔）
         for label in self.image_labels:
-            label.original_pixmap = self.original_pixmap
-            label.setPixmap(self.display_pixmap)
-            label.scale_factor = self.scale_factor
-            label.rotation_angle = self.rotation_angle
-            label.adjustSize()
+            self.set_label_pixmap(label, pixmap, pyramid, path)
+        if pixmap.isNull():
+            self.status_bar.showMessage(f"无法加载图片: {os.path.basename(path)}")
+        else:
+            # 更新状态栏
+            self.status_bar.showMessage(f"{os.path.basename(path)} ({self.current_image_index + 1}/{len(self.image_files)})")
+        if self.startup_expected is not False:
+            self.startup_mark('图片')
+    
+    def set_label_pixmap(self, label, pixmap, pyramid, path=None):
+        """设置面板的原图和金字塔，沿用当前的缩放和旋转"""
+        if pixmap.isNull():
+            label.set_source(pixmap, None, path)
+            label.setText("无法加载图片")
+            return
+        label.set_source(pixmap, pyramid, path)
+        label.set_view(self.scale_factor, self.rotation_angle)
+    
+    def make_pyramid(self, path, pixmap):
+        """面板的金字塔：开启叠加层时以合成图为源图（像素检查仍读取原图）"""
+        if self.overlay_layers and not pixmap.isNull():
+            pixmap = self.overlays.composite(path, pixmap, self.overlay_layers, self.overlay_opacity)
+        return MipPyramid(pixmap)
+    
+    def set_overlay_layer(self, layer, enabled):
+        if enabled:
+            self.overlay_layers.add(layer)
+        else:
+            self.overlay_layers.discard(layer)
+        self.refresh_overlays()
+    
+    def set_overlay_opacity(self, value):
+        self.overlay_opacity = value
+        self.overlay_timer.start()
+    
+    def refresh_overlays(self):
+        """图层或不透明度变化：用各面板已解码的原图重新合成，不重新读取文件或解码图片"""
+        pyramids = {}
+        for label in self.image_labels:
+            path, pixmap = label.source_path, label.original_pixmap
+            if path is None or label.pyramid is None or pixmap is None or pixmap.isNull():
+                continue
+            if (path, pixmap.cacheKey()) not in pyramids:
+                pyramids[path, pixmap.cacheKey()] = self.make_pyramid(path, pixmap)
+            label.set_source(pixmap, pyramids[path, pixmap.cacheKey()], path)
+        path = self.displayed_image_path
+        if self.overlay_layers and path:
+            available = self.overlays.available(path)
+            missing = [LAYERS[layer][0] for layer in LAYERS if layer in self.overlay_layers and layer not in available]
+            shown = [LAYERS[layer][0] for layer in LAYERS if layer in self.overlay_layers and layer in available]
+            self.status_bar.showMessage(
+                f"叠加层: {', '.join(shown) or '无'} (不透明度 {self.overlay_opacity}%)"
+                + (f", 缺少: {', '.join(missing)}" if missing else ""))
+    
+    def set_compare_mode(self, enabled):
+        """切换跨摄像头对比模式，行人ID取自检索栏，未填写时取当前图片的 pid"""
+        if not enabled:
+            self.compare_mode = False
+            self.image_loader.cancel()
+            if self.current_image_path:
+                self.load_image(self.current_image_path)
+            return
+        
+        pid = self.selected_pid()
+        if pid is None:
+            self.status_bar.showMessage("请先输入行人ID或选择一张图片")
+            self.btn_compare.setChecked(False)
+            return
+        self.stop_playback()
+        self.compare_mode = True
+        self.show_identity(pid)
+    
+    def selected_pid(self):
+        """检索栏中的行人ID，未填写时取当前图片的 pid，都没有时返回 None"""
+        try:
+            pid, _ = parse_query(self.id_input.text())
+        except ValueError:
+            pid = None
+        if pid is None and self.current_image_path:
+            parsed = self.get_dataset_index().parse(os.path.basename(self.current_image_path))
+            pid = parsed[0] if parsed else None
+        return pid
+    
+    def set_playback(self, enabled):
+        """按 (摄像头, 序列, 帧) 播放行人的轨迹，面板 i 依次播放第 i, i+N, ... 条轨迹"""
+        if not enabled:
+            self.player.stop()
+            if self.current_image_path:
+                self.load_image(self.current_image_path)
+            return
+        pid = self.selected_pid()
+        groups = tracklets(self.get_dataset_index(), pid) if pid is not None else []
+        if not groups:
+            self.status_bar.showMessage("请先输入行人ID或选择一张图片" if pid is None else f"未找到行人ID: {pid}")
+            self.stop_playback()
+            return
+        if self.compare_mode:
+            self.btn_compare.setChecked(False)
+        index = self.dataset_index
+        panel_count = len(self.image_labels)
+        sequences = [index.paths(np.concatenate(groups[panel::panel_count])) if groups[panel::panel_count] else []
+                     for panel in range(panel_count)]
+        self.player.start(sequences, self.fps_spin.value(), f"ID={pid} ({len(groups)} 条轨迹)")
+    
+    def stop_playback(self):
+        """停止播放并复位按钮（不重新加载当前图片）"""
+        if not self.player.is_playing() and not self.btn_play.isChecked():
+            return
+        self.player.stop()
+        self.btn_play.blockSignals(True)
+        self.btn_play.setChecked(False)
+        self.btn_play.blockSignals(False)
+    
+    def on_playback_frame(self, panel, path, pixmap):
+        if panel < len(self.image_labels):
+            self.set_label_pixmap(self.image_labels[panel], pixmap, self.make_pyramid(path, pixmap), path)
+    
+    def on_playback_finished(self):
+        """播放结束时保留最后一帧"""
+        self.stop_playback()
+        self.status_bar.showMessage(f"播放结束: {self.player.title}, 共显示 {self.player.shown} 帧, 丢帧 {self.player.dropped}")
+    
+    def show_identity(self, pid):
+        """对比模式：把行人的图片按摄像头分给四个面板，四个面板同时解码"""
+        index = self.get_dataset_index()
+        rows = self.get_bitmap_index().select(pid=pid)   # 按修正后的 pid，排除坏图
+        if len(rows) == 0:
+            self.status_bar.showMessage(f"未找到行人ID: {pid}")
+            return
         
-        # 更新状态栏
-        self.status_bar.showMessage(f"{os.path.basename(path)} ({self.current_image_index + 1}/{len(self.image_files)})")
+        cameras = index.camera[rows]
+        groups = [index.paths(rows[cameras == camera]) for camera in np.unique(cameras)]
+        panel_count = len(self.image_labels)
+        self.compare_title = f"ID={pid}"
+        self.compare_groups = []
+        self.compare_positions = []
+        for panel in range(panel_count):
+            # 摄像头少于面板数时，同一摄像头的多个面板从不同帧开始
+            group = groups[panel % len(groups)]
+            share = -(-panel_count // len(groups))
+            self.compare_groups.append(group)
+            self.compare_positions.append((panel // len(groups)) * len(group) // share)
+        self.load_compare_panels(range(panel_count))
+    
+    def compare_path(self, panel):
+        if panel >= len(self.compare_groups):
+            return None
+        return self.compare_groups[panel][self.compare_positions[panel]]
+    
+    def load_compare_panels(self, panels):
+        """为指定面板提交解码（已缓存的立即显示），并预取各面板的下一张"""
+        current = []
+        for panel in panels:
+            path = self.compare_path(panel)
+            current.append(path)
+            self.image_loader.request(path)
+        
+        upcoming = []
+        for panel, group in enumerate(self.compare_groups):
+            position = self.compare_positions[panel]
+            upcoming.extend(group[position + 1:position + 2] + group[max(0, position - 1):position])
+        visible = [self.compare_path(panel) for panel in range(len(self.compare_groups))]
+        self.image_loader.prefetch(upcoming, keep=visible)
+        
+        summary = ", ".join(
+            f"{os.path.basename(self.compare_path(panel))} {self.compare_positions[panel] + 1}/{len(group)}"
+            for panel, group in enumerate(self.compare_groups))
+        self.status_bar.showMessage(f"{self.compare_title}: {summary}")
+    
+    def page_compare_panel(self, panel, step):
+        """对比模式下单独翻动一个面板"""
+        if not self.compare_mode or panel >= len(self.compare_groups):
+            return
+        position = self.compare_positions[panel] + step
+        if 0 <= position < len(self.compare_groups[panel]):
+            self.compare_positions[panel] = position
+            self.load_compare_panels([panel])
     
     def show_previous_image(self):
         """显示上一张图片"""
+        self.stop_playback()
+        if self.compare_mode:
+            for panel in range(len(self.compare_groups)):
+                self.page_compare_panel(panel, -1)
+            return
         if not self.image_files or self.current_image_index <= 0:
             return
         
@@ -278,6 +1468,11 @@ class ImageViewer(QMainWindow):
     
     def show_next_image(self):
         """显示下一张图片"""
+        self.stop_playback()
+        if self.compare_mode:
+            for panel in range(len(self.compare_groups)):
+                self.page_compare_panel(panel, 1)
+            return
         if not self.image_files or self.current_image_index >= len(self.image_files) - 1:
             return
         
@@ -295,52 +1490,60 @@ class ImageViewer(QMainWindow):
     
     def scale_image(self, factor):
         """缩放图片"""
-        if not hasattr(self, 'original_pixmap') or self.original_pixmap.isNull():
+        if self.reference_pixmap() is None:
             return
             
         self.scale_factor *= factor
         self.update_display_image()
     
+    def reference_pixmap(self):
+        """缩放/旋转/适应窗口所参照的原图：对比模式下取第一个已加载的面板"""
+        if self.compare_mode:
+            for label in self.image_labels:
+                if label.original_pixmap is not None and not label.original_pixmap.isNull():
+                    return label.original_pixmap
+            return None
+        pixmap = getattr(self, 'original_pixmap', None)
+        return pixmap if pixmap is not None and not pixmap.isNull() else None
+    
+    @profiled('update_display_image')
     def update_display_image(self):
-        """更新显示的图片（应用缩放和旋转）"""
-        transform = QTransform()
-        transform.scale(self.scale_factor, self.scale_factor)
-        transform.rotate(self.rotation_angle)
-        
-        self.display_pixmap = self.original_pixmap.transformed(
-            transform, Qt.SmoothTransformation)
-        
-        # 更新所有标签的显示
+        """更新显示（应用缩放和旋转）：先快速变换重绘，停止操作后再平滑重绘"""
         for label in self.image_labels:
-            label.setPixmap(self.display_pixmap)
-            label.scale_factor = self.scale_factor
-            label.rotation_angle = self.rotation_angle
-            label.adjustSize()
+            label.set_view(self.scale_factor, self.rotation_angle, fast=True)
+        self.smooth_timer.start()
         
         # 调整滚动条位置
         self.adjust_scroll_bar(self.scroll_area.horizontalScrollBar(), 1.0)
         self.adjust_scroll_bar(self.scroll_area.verticalScrollBar(), 1.0)
     
+    def render_smooth(self):
+        """缩放/旋转停止后以平滑变换重绘"""
+        for label in self.image_labels:
+            label.set_view(self.scale_factor, self.rotation_angle)
+    
     def adjust_scroll_bar(self, scroll_bar, factor):
         """调整滚动条位置"""
         scroll_bar.setValue(int(factor * scroll_bar.value() + ((factor - 1) * scroll_bar.pageStep() / 2)))
     
     def rotate_image(self):
         """旋转图片90度"""
-        if not hasattr(self, 'original_pixmap') or self.original_pixmap.isNull():
+        if self.reference_pixmap() is None:
             return
         
         self.rotation_angle = (self.rotation_angle + 90) % 360
         self.update_display_image()
     
+    @profiled('fit_to_window')
     def fit_to_window(self):
         """适应窗口大小"""
-        if not hasattr(self, 'original_pixmap') or self.original_pixmap.isNull():
+        pixmap = self.reference_pixmap()
+        if pixmap is None:
             return
         
         # 计算缩放比例
         viewport_size = self.scroll_area.viewport().size()
-        pixmap_size = self.original_pixmap.size()
+        pixmap_size = pixmap.size()
         
         # 考虑旋转后的尺寸
         if self.rotation_angle % 180 == 90:
@@ -356,25 +1559,149 @@ class ImageViewer(QMainWindow):
         """设置文件浏览器的根路径"""
         if os.path.exists(path):
             self.default_path = path
-            self.file_model.setRootPath(path)
-            self.tree_view.setRootIndex(self.file_model.index(path))
-            self.current_folder = path
-            self.image_files = self.get_image_files(path)
-            if self.image_files:
-                self.current_image_index = 0
-                self.current_image_path = self.image_files[0]
-                self.load_image(self.current_image_path)
+            self.register_dataset(path)
+            self.btn_identity_tree.setChecked(False)
+            self.btn_annotate.setChecked(False)
+            self.mount_file_tree(path)
+            self.gallery_view.set_dataset_root(path)
+            self.open_folder(path)
+            if vfs.is_container(path):
+                # 打包数据集和压缩包在文件树中没有可浏览的内容，改用身份树按目录和ID浏览
+                self.btn_identity_tree.setChecked(True)
         else:
             self.status_bar.showMessage(f"路径不存在: {path}")
+    
+    def mount_file_tree(self, path):
+        """把文件树挂到根路径（第一次挂载前视图没有模型）"""
+        self.file_model.setRootPath(path)
+        if self.tree_view.model() is not self.file_model:
+            self.set_identity_tree_mode(False)
+        else:
+            self.tree_view.setRootIndex(self.file_model.index(path))
+    
+    def start_after_paint(self, path=None, restore=True, timeout=500):
+        """窗口第一次绘制后再 start()；窗口一直没有绘制（如最小化）时超时后执行"""
+        self.pending_start = (path, restore)
+        QTimer.singleShot(timeout, self.run_pending_start)
+    
+    def run_pending_start(self):
+        if self.pending_start is not None:
+            args, self.pending_start = self.pending_start, None
+            self.start(*args)
+    
+    def start(self, path=None, restore=True):
+        """事件循环开始后（窗口已绘制）再打开命令行指定的路径或恢复上次会话"""
+        self.startup.mark('事件循环')
+        state = load_session() if restore and path is None else {}
+        if path is not None:
+            self.startup_expected = {'图片', '列表'}
+            self.set_root_path(path)
+        elif state.get('root') and os.path.exists(state['root']):
+            self.startup_expected = {'图片', '列表'}
+            self.restore_session(state)
+        else:
+            self.startup_expected = set()
+            self.mount_file_tree(self.default_path)
+        self.startup_mark('文件树')
+    
+    def restore_session(self, state):
+        """恢复上次的根路径、文件夹、图片、缩放、旋转和过滤条件
+
+        上次的图片直接提交解码，不等待文件夹列表：保存的列表在目录未变化时直接使用，
+        否则后台扫描，扫描到该图片后再确定位置。文件树最后挂载，不占用显示图片的时间。
+        """
+        root = state['root']
+        self.default_path = root
+        self.register_dataset(root)
+        self.gallery_view.set_dataset_root(root)
+        
+        self.id_input.setText(state.get('query', ''))
+        self.orientation_combo.blockSignals(True)  # 不触发检索
+        self.orientation_combo.setCurrentIndex(state.get('orientation', UNLABELED))
+        self.orientation_combo.blockSignals(False)
+        self.search_all_check.setChecked(state.get('search_all', False))
+        self.scale_factor = state.get('scale', 1.0)
+        self.rotation_angle = state.get('rotation', 0) % 360
+        self.opacity_slider.setValue(state.get('opacity', self.overlay_opacity))
+        for layer in state.get('overlays', []):
+            if layer in self.overlay_actions:
+                self.overlay_actions[layer].setChecked(True)
+        self.btn_gallery.setChecked(state.get('gallery', False))
+        
+        image = state.get('image')
+        folder = state.get('folder') or (os.path.dirname(image) if image else root)
+        try:
+            vfs.file_stamp(image)
+        except (OSError, TypeError):
+            image = None
+        listing = load_listing(folder)
+        if listing is not None:
+            self.folder_scanner.seed(folder, *listing)
+        if image is not None:
+            self.current_image_path = image
+            self.load_image(image)
+            self.open_folder(folder, select_path=image)
+        else:
+            # 图片已被删除：列表已就绪时显示原位置的图片，否则显示第一张
+            self.open_folder(folder)
+            index = min(state.get('index', 0), len(self.image_files) - 1)
+            if index > 0 and not self.folder_scanner.is_scanning():
+                self.current_image_index = index
+                self.current_image_path = self.image_files[index]
+                self.load_image(self.current_image_path)
+        self.mount_file_tree(root)
+    
+    def save_last_session(self):
+        """退出时保存会话状态和当前文件夹的列表"""
+        state = {
+            'root': self.default_path,
+            'folder': self.current_folder,
+            'image': self.current_image_path,
+            'index': self.current_image_index,
+            'scale': self.scale_factor,
+            'rotation': self.rotation_angle,
+            'query': self.id_input.text(),
+            'orientation': self.orientation_combo.currentIndex(),
+            'search_all': self.search_all_check.isChecked(),
+            'overlays': sorted(self.overlay_layers),
+            'opacity': self.overlay_opacity,
+            'gallery': self.btn_gallery.isChecked(),
+        }
+        try:
+            save_session(state)
+            listing = self.folder_scanner.listing(self.current_folder) if self.current_folder else None
+            if listing is not None:
+                save_listing(self.current_folder, *listing)
+        except OSError as e:
+            print(f"无法保存会话: {e}", file=sys.stderr)
+    
+    def startup_mark(self, name):
+        """记录启动阶段，等待的阶段都完成后在状态栏（和标准错误）给出启动报告"""
+        self.startup.mark(name)
+        if self.startup_expected is None or not self.startup.has(self.startup_expected):
+            return
+        self.startup_expected = False
+        report = f"启动: {self.startup.format()}"
+        image_ms = self.startup.times.get('图片')
+        if image_ms is not None and image_ms > STARTUP_IMAGE_BUDGET_MS:
+            report += f" (图片超出 {STARTUP_IMAGE_BUDGET_MS}ms 预算)"
+        self.status_bar.showMessage(report, 5000)
+        if self.startup_report:
+            print(report, file=sys.stderr)
 
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
-    viewer = ImageViewer()
-    
-    # 如果命令行参数提供了路径，则使用该路径
-    if len(sys.argv) > 1:
-        viewer.set_root_path(sys.argv[1])
+    parser = argparse.ArgumentParser(description='ReID 数据集图片浏览器')
+    parser.add_argument('path', nargs='?', help='数据集根目录（不指定时恢复上次会话）')
+    parser.add_argument('--no-restore', action='store_true', help='不恢复上次会话')
+    parser.add_argument('--startup-report', action='store_true', help='把启动各阶段的用时打印到标准错误')
+    args = parser.parse_args(app.arguments()[1:])
     
+    viewer = ImageViewer()
+    viewer.startup_report = args.startup_report
+    viewer.startup.mark('界面')
+    # 窗口先绘制，之后再挂载文件树、扫描和恢复会话
+    viewer.start_after_paint(args.path, restore=not args.no_restore)
     viewer.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,368 @@
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from orientation import ORIENTATION_FILENAME, ORIENTATIONS, UNLABELED, LabelKeys, parse_orientation
+
+
+CORRECTIONS_FILENAME = 'corrections.txt'
+JOURNAL_FILENAME = 'annotations.journal'
+
+ORIENTATION, PID, BAD = 'orientation', 'pid', 'bad'
+
+
+def annotation_dirs(root):
+    """标注目录的候选：与数据集目录同级（和索引缓存一样，避免写入数据集目录改变其 mtime），
+    以及数据集所在目录不可写时的用户缓存目录"""
+    root = os.path.abspath(root)
+    parent, name = os.path.split(root.rstrip(os.sep))
+    digest = hashlib.md5(root.encode('utf-8')).hexdigest()[:8]
+    return [os.path.join(parent, f'.{name}.reid_annotations'),
+            os.path.join(os.path.expanduser('~'), '.cache', 'reid_viewer', f'{name}-{digest}.annotations')]
+
+
+def find_annotation_dir(root, writable=False):
+    """已存在的标注目录，没有时返回 None"""
+    for path in annotation_dirs(root):
+        if os.path.isdir(path) and (not writable or os.access(path, os.W_OK)):
+            return path
+    return None
+
+
+def annotation_dir(root):
+    """可写的标注目录（不存在时创建），都无法创建时抛出 OSError"""
+    path = find_annotation_dir(root, writable=True)
+    if path is not None:
+        return path
+    error = None
+    for path in annotation_dirs(root):
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError as e:
+            error = error or e
+            continue
+        if os.access(path, os.W_OK):
+            return path
+    raise error or PermissionError(f"标注目录不可写: {annotation_dirs(root)[0]}")
+
+
+def labels_path(root, filename):
+    """检索和标注存储读取的标注文件
+
+    可写的标注目录（标注模式写入的位置）优先，其次是只读的标注目录（如他人建立的），
+    都没有该文件时为数据集根目录下的同名文件。
+    """
+    directories = [path for path in annotation_dirs(root) if os.path.isdir(path)]
+    directories.sort(key=lambda path: not os.access(path, os.W_OK))
+    for directory in directories:
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            return path
+    return os.path.join(root, filename)
+
+
+def orientation_labels_path(root):
+    return labels_path(root, ORIENTATION_FILENAME)
+
+
+def corrections_path(root):
+    """pid 修正和坏图标记文件：每行 "<相对路径> pid <新pid>" 或 "<相对路径> bad" """
+    return labels_path(root, CORRECTIONS_FILENAME)
+
+
+def load_corrections(index, path=None, keys=None):
+    """读取 pid 修正和坏图标记，返回 (修正后的 pid 列, 坏图掩码)，均与索引行对齐；文件不存在时返回 None"""
+    path = path or corrections_path(index.root)
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+
+    keys = keys or LabelKeys(index)
+    pids = index.pid.copy()
+    bad = np.zeros(len(index), dtype=bool)
+    for line in lines:
+        parts = line.split()
+        row = keys.row(parts[0]) if len(parts) >= 2 else None
+        if row is None:
+            continue
+        if parts[1] == PID and len(parts) >= 3 and parts[2].lstrip('-').isdigit():
+            pids[row] = int(parts[2])
+        elif parts[1] == BAD:
+            bad[row] = True
+    return pids, bad
+
+
+def _write_atomic(path, lines):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(''.join(line + '\n' for line in lines))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class AnnotationStore:
+    """标注存储：追加写日志 + 后台合并
+
+    每次修改只在内存中更新状态并把一行记录交给写线程，写线程把一段时间内的记录合并为一次
+    write + fsync（group commit），标注时界面不会等待磁盘。记录是 "设置为某值" 的幂等操作，
+    撤销也是追加一条恢复旧值的记录。
+
+    合并时把当前日志改名为 .compacting、新记录写入新日志，后台把状态写成 orientation.txt
+    和 corrections.txt（检索过滤读取的文件），写完后删除 .compacting。
+    启动时读取合并文件后依次重放 .compacting 和日志，崩溃后也能恢复全部已提交的修改。
+
+    日志和合并文件放在与数据集目录同级的标注目录中（不可写时放在用户缓存目录），
+    第一次合并前以数据集根目录下已有的 orientation.txt / corrections.txt 为初始状态。
+
+    写入失败（如磁盘已满、目录变为只读）时记录留在队列中，间隔 retry_interval 重试，
+    并通过 on_error(消息) 报告（在写线程或合并线程中调用）；close() 返回是否全部写入。
+    """
+
+    def __init__(self, root, commit_interval=0.2, compact_every=500, retry_interval=2.0, on_error=None):
+        self.root = os.path.abspath(root)
+        self.commit_interval = commit_interval
+        self.compact_every = compact_every
+        self.retry_interval = retry_interval
+        self.on_error = on_error
+        self.error = None       # 最近一次写入失败的异常，写入成功后清除
+        self.directory = None   # 标注目录，open() 时确定
+        self.journal = None
+        self.orientations = {}   # 相对根目录的路径 -> 朝向编码
+        self.pids = {}           # 相对根目录的路径 -> 修正后的 pid
+        self.bad = set()         # 坏图的相对路径
+        self.undo_stack = []     # (相对路径, 字段, 旧值)
+        self.edits_since_compact = 0
+        self.compactions = 0
+        self._queue = []
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._compact_lock = threading.Lock()
+        self._closed = False
+        self._writer = None
+
+    # 读取与恢复
+    def open(self):
+        """读取合并文件并重放日志，启动写线程；返回重放的记录数，无法创建标注目录时抛出 OSError"""
+        self.directory = annotation_dir(self.root)
+        self.journal = os.path.join(self.directory, JOURNAL_FILENAME)
+        try:
+            with open(orientation_labels_path(self.root), encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    code = parse_orientation(parts[1]) if len(parts) >= 2 else None
+                    if code:
+                        self.orientations[os.path.normpath(parts[0])] = code
+        except OSError:
+            pass
+        try:
+            with open(corrections_path(self.root), encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 3 and parts[1] == PID:
+                        self.pids[parts[0]] = int(parts[2])
+                    elif len(parts) >= 2 and parts[1] == BAD:
+                        self.bad.add(parts[0])
+        except (OSError, ValueError):
+            pass
+        replayed = self._replay(self.journal + '.compacting') + self._replay(self.journal)
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        if os.path.exists(self.journal + '.compacting'):
+            # 上次合并未完成，重新合并
+            self.compact(wait=True)
+        return replayed
+
+    def _replay(self, path):
+        count = 0
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) != 4:
+                        continue   # 崩溃时写了一半的最后一行
+                    _, name, field, value = parts
+                    self._apply(name, field, value)
+                    count += 1
+        except OSError:
+            pass
+        return count
+
+    def _apply(self, name, field, value):
+        """把一条记录应用到内存状态，value 为空字符串表示清除"""
+        if field == ORIENTATION:
+            if value and int(value) != UNLABELED:
+                self.orientations[name] = int(value)
+            else:
+                self.orientations.pop(name, None)
+        elif field == PID:
+            if value:
+                self.pids[name] = int(value)
+            else:
+                self.pids.pop(name, None)
+        elif field == BAD:
+            if value == '1':
+                self.bad.add(name)
+            else:
+                self.bad.discard(name)
+
+    def get(self, name, field):
+        if field == ORIENTATION:
+            return str(self.orientations.get(name, ''))
+        if field == PID:
+            return str(self.pids.get(name, ''))
+        return '1' if name in self.bad else ''
+
+    # 修改
+    def set(self, name, field, value):
+        """设置标注（value 为字符串，空字符串表示清除），立即返回，不等待写盘"""
+        value = str(value)
+        old = self.get(name, field)
+        if old == value:
+            return
+        self.undo_stack.append((name, field, old))
+        self._record(name, field, value)
+
+    def undo(self):
+        """撤销最近一次修改，返回被撤销的图片（相对路径），没有可撤销的修改时返回 None"""
+        if not self.undo_stack:
+            return None
+        name, field, old = self.undo_stack.pop()
+        self._record(name, field, old)
+        return name
+
+    def _record(self, name, field, value):
+        self._apply(name, field, value)
+        with self._lock:
+            self._queue.append(f'{time.time():.3f}\t{name}\t{field}\t{value}\n')
+            self._wake.notify()
+        self.edits_since_compact += 1
+        if self.edits_since_compact >= self.compact_every:
+            self.compact()
+
+    # 写日志
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed:
+                    self._wake.wait()
+                if not self._queue and self._closed:
+                    return
+            # 等待一小段时间，把这段时间内的记录合并为一次提交；写入失败后放慢重试
+            if not self._closed:
+                time.sleep(self.commit_interval if self.error is None else self.retry_interval)
+            if not self._commit() and self._closed:
+                return   # 关闭时仍无法写入，由 close() 的返回值和 on_error 报告
+
+    def _append_queued(self):
+        """在持有 _lock 时把排队的记录追加到日志，失败时把记录放回队列并抛出 OSError"""
+        lines, self._queue = self._queue, []
+        if not lines:
+            return
+        try:
+            with open(self.journal, 'a', encoding='utf-8') as f:
+                f.write(''.join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError:
+            self._queue[:0] = lines
+            raise
+
+    def _failed(self, error):
+        """记录写入失败，同一错误只报告一次"""
+        repeated = self.error is not None and str(self.error) == str(error)
+        self.error = error
+        if not repeated and self.on_error is not None:
+            self.on_error(f"标注写入失败，修改暂存在内存中: {error}")
+
+    def _commit(self):
+        """提交排队的记录，返回是否成功"""
+        try:
+            with self._lock:
+                # 在持有锁时写入，保证合并时改名前的记录都已落在旧日志中
+                self._append_queued()
+        except OSError as e:
+            self._failed(e)
+            return False
+        self.error = None
+        return True
+
+    def flush(self):
+        """立即提交所有排队的记录，返回是否成功"""
+        return self._commit()
+
+    # 合并
+    def compact(self, wait=False):
+        """把日志合并进 orientation.txt 和 corrections.txt（默认在后台线程中进行），
+        wait 为 True 时返回是否成功"""
+        self.edits_since_compact = 0
+        if wait:
+            return self._compact()
+        threading.Thread(target=self._compact, daemon=True).start()
+        return None
+
+    def _compact(self):
+        try:
+            self._compact_files()
+        except OSError as e:
+            # 日志或 .compacting 仍在，下次合并或启动时重放；排队的记录已放回队列
+            self._failed(e)
+            return False
+        return True
+
+    def _compact_files(self):
+        with self._compact_lock:
+            compacting = self.journal + '.compacting'
+            if not (self._queue or os.path.exists(self.journal) or os.path.exists(compacting)):
+                return   # 没有新的修改
+            with self._lock:
+                # 先提交排队的记录，再在锁内轮换日志并取状态快照
+                self._append_queued()
+                if os.path.exists(self.journal):
+                    if os.path.exists(compacting):
+                        # 上次合并未完成：把新日志追加到未完成的日志后面
+                        with open(self.journal, encoding='utf-8') as src, open(compacting, 'a', encoding='utf-8') as dst:
+                            dst.write(src.read())
+                            dst.flush()
+                            os.fsync(dst.fileno())
+                        os.remove(self.journal)
+                    else:
+                        os.replace(self.journal, compacting)
+                orientations = dict(self.orientations)
+                pids = dict(self.pids)
+                bad = set(self.bad)
+            _write_atomic(os.path.join(self.directory, ORIENTATION_FILENAME),
+                          [f'{name} {code}' for name, code in sorted(orientations.items())])
+            _write_atomic(os.path.join(self.directory, CORRECTIONS_FILENAME),
+                          [f'{name} {PID} {pid}' for name, pid in sorted(pids.items())]
+                          + [f'{name} {BAD}' for name in sorted(bad)])
+            if os.path.exists(compacting):
+                os.remove(compacting)
+            self.compactions += 1
+
+    def close(self):
+        """提交剩余记录并合并，停止写线程；返回是否全部写入"""
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        return self._compact()
+
+    def summary(self, name):
+        """文件的当前标注摘要（状态栏显示）"""
+        parts = []
+        code = self.orientations.get(name)
+        if code:
+            parts.append(ORIENTATIONS[code])
+        if name in self.pids:
+            parts.append(f'pid→{self.pids[name]}')
+        if name in self.bad:
+            parts.append('坏图')
+        return ', '.join(parts) or '未标注'
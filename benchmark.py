@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 默认在无界面平台上运行，必须在创建 QApplication 之前设置
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+SPLITS = (('bounding_box_train', 0.4), ('bounding_box_test', 0.5), ('query', 0.1))
+
+
+def _generate_chunk(args):
+    """生成一批图片（在进程池中运行），返回生成的数量"""
+    folder, names, size, seed = args
+    from PyQt5.QtGui import QImage
+    rng = np.random.default_rng(seed)
+    width, height = size
+    for name in names:
+        # 上下两块颜色加噪声，近似行人裁剪图的 JPEG 大小
+        pixels = np.empty((height, width, 3), dtype=np.uint8)
+        pixels[:height // 2] = rng.integers(0, 256, 3)
+        pixels[height // 2:] = rng.integers(0, 256, 3)
+        pixels += rng.integers(0, 24, pixels.shape, dtype=np.uint8)
+        image = QImage(pixels.tobytes(), width, height, width * 3, QImage.Format_RGB888)
+        image.save(os.path.join(folder, name), 'JPEG', 90)
+    return len(names)
+
+
+def generate_dataset(root, count, pids=None, cameras=6, size=(64, 128), workers=None, seed=0):
+    """生成 Market-1501 风格的合成数据集（bounding_box_train / bounding_box_test / query）"""
+    rng = np.random.default_rng(seed)
+    pids = pids or max(1, count // 20)
+    jobs = []
+    for split, share in SPLITS:
+        folder = os.path.join(root, split)
+        os.makedirs(folder, exist_ok=True)
+        split_count = max(1, int(count * share))
+        pid = rng.integers(0, pids, split_count)
+        camera = rng.integers(1, cameras + 1, split_count)
+        names = [f'{p:04d}_c{c}s1_{i:06d}_00.jpg' for i, (p, c) in enumerate(zip(pid, camera))]
+        for start in range(0, len(names), 500):
+            jobs.append((folder, names[start:start + 500], size, seed + len(jobs)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(_generate_chunk, jobs))
+
+
+def percentiles(samples):
+    """毫秒单位的延迟统计"""
+    if not samples:
+        return {}
+    values = sorted(samples)
+    pick = lambda q: values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+    return {'count': len(values), 'mean': statistics.fmean(values), 'p50': pick(0.5),
+            'p90': pick(0.9), 'p99': pick(0.99), 'max': values[-1]}
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 if sys.platform != 'darwin' else rss / (1024 * 1024)
+
+
+class Benchmark:
+    """在真实的 ImageViewer 上计时各条路径（单位毫秒）"""
+
+    def __init__(self, dataset_root, folder, steps=200, zoom_steps=10):
+        self.dataset_root = dataset_root
+        self.folder = folder
+        self.steps = steps
+        self.zoom_steps = zoom_steps
+        self.results = {}
+
+    def wait_until(self, predicate, timeout=30.0):
+        """处理事件直到条件成立，返回是否在超时前成立"""
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            if time.perf_counter() > deadline:
+                return False
+            self.app.processEvents()
+        return True
+
+    def run(self):
+        """在临时的 HOME 下运行
+
+        数据集登记、会话和用户缓存都写在 ~/.cache/reid_viewer 下，计时不能在用户目录中
+        留下指向（随后被删除的）临时数据集的登记和会话。
+        """
+        home = tempfile.mkdtemp(prefix='reid_bench_home_')
+        saved_home = os.environ.get('HOME')
+        os.environ['HOME'] = home
+        try:
+            return self._run()
+        finally:
+            if saved_home is None:
+                os.environ.pop('HOME', None)
+            else:
+                os.environ['HOME'] = saved_home
+            shutil.rmtree(home, ignore_errors=True)
+
+    def _run(self):
+        from PyQt5.QtWidgets import QApplication
+        from PyQt5.QtCore import QObject, QEvent
+
+        start = time.perf_counter()
+        self.app = QApplication.instance() or QApplication([sys.argv[0]])
+        import ReID_viewer
+
+        class PaintWatcher(QObject):
+            painted = False
+
+            def eventFilter(self, obj, event):
+                if event.type() == QEvent.Paint:
+                    PaintWatcher.painted = True
+                return False
+
+        watcher = PaintWatcher()
+        viewer = ReID_viewer.ImageViewer()
+        viewer.default_path = self.dataset_root
+        viewer.installEventFilter(watcher)
+        viewer.show()
+        self.wait_until(lambda: PaintWatcher.painted)
+        self.results['startup_to_first_paint_ms'] = (time.perf_counter() - start) * 1000
+        self.viewer = viewer
+
+        self.bench_get_image_files()
+        self.bench_set_root_path()
+        self.bench_load_image()
+        self.bench_next_image()
+        self.bench_zoom_chain()
+        self.results['peak_rss_mb'] = peak_rss_mb()
+        viewer.close()
+        return self.results
+
+    def bench_get_image_files(self):
+        start = time.perf_counter()
+        files = self.viewer.get_image_files(self.folder)
+        self.results['get_image_files_ms'] = (time.perf_counter() - start) * 1000
+        self.results['folder_images'] = len(files)
+
+    def bench_set_root_path(self):
+        viewer = self.viewer
+        finished = []
+        viewer.folder_scanner.finished.connect(finished.append)
+        start = time.perf_counter()
+        viewer.set_root_path(self.folder)
+        self.results['set_root_path_call_ms'] = (time.perf_counter() - start) * 1000
+        self.wait_until(lambda: viewer.displayed_image_path is not None)
+        self.results['set_root_path_to_first_image_ms'] = (time.perf_counter() - start) * 1000
+        self.wait_until(lambda: finished)
+        self.results['set_root_path_to_scan_finished_ms'] = (time.perf_counter() - start) * 1000
+        viewer.folder_scanner.finished.disconnect(finished.append)
+
+    def bench_load_image(self):
+        """冷加载：清空缓存后加载一张不在预取范围内的图片"""
+        viewer = self.viewer
+        samples = []
+        count = len(viewer.image_files)
+        for index in np.linspace(0, count - 1, num=min(20, count), dtype=int):
+            viewer.image_loader.cancel()
+            viewer.image_loader.cache.clear()
+            viewer.current_image_index = int(index)
+            viewer.current_image_path = path = viewer.image_files[index]
+            start = time.perf_counter()
+            viewer.load_image(path)
+            self.wait_until(lambda: viewer.displayed_image_path == path)
+            samples.append((time.perf_counter() - start) * 1000)
+        self.results['load_image_cold_ms'] = percentiles(samples)
+
+    def bench_next_image(self):
+        """连续下一张：每次等到图片实际显示并重绘"""
+        viewer = self.viewer
+        viewer.current_image_index = 0
+        viewer.current_image_path = viewer.image_files[0]
+        viewer.load_image(viewer.current_image_path)
+        self.wait_until(lambda: viewer.displayed_image_path == viewer.image_files[0])
+        samples = []
+        for _ in range(min(self.steps, len(viewer.image_files) - 1)):
+            start = time.perf_counter()
+            viewer.show_next_image()
+            path = viewer.current_image_path
+            self.wait_until(lambda: viewer.displayed_image_path == path)
+            viewer.grid_widget.repaint()
+            samples.append((time.perf_counter() - start) * 1000)
+        self.results['next_image_ms'] = percentiles(samples)
+
+    def bench_zoom_chain(self):
+        """连续放大（快速变换重绘）以及停止后的平滑重绘"""
+        viewer = self.viewer
+        samples = []
+        for _ in range(self.zoom_steps):
+            start = time.perf_counter()
+            viewer.zoom_in()
+            viewer.grid_widget.repaint()
+            samples.append((time.perf_counter() - start) * 1000)
+        self.results['update_display_image_zoom_ms'] = percentiles(samples)
+        start = time.perf_counter()
+        viewer.render_smooth()
+        viewer.grid_widget.repaint()
+        self.results['smooth_render_ms'] = (time.perf_counter() - start) * 1000
+
+
+def compare(old_path, new_results):
+    """与之前保存的结果对比，打印各项的比值（>1 表示变慢）"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)['results']
+    for key, value in new_results.items():
+        before = old.get(key)
+        if isinstance(value, dict):
+            value, before = value.get('p50'), (before or {}).get('p50')
+            key += '.p50'
+        if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+            print(f'{key:45s} {before:10.2f} -> {value:10.2f}  x{value / before:.2f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='在无界面平台上对 ImageViewer 的主要路径计时')
+    parser.add_argument('--size', type=int, default=1000, help='合成数据集的图片数量')
+    parser.add_argument('--dataset', help='使用已有（或在此生成）的数据集目录，默认生成到临时目录')
+    parser.add_argument('--folder', default='bounding_box_test', help='用于计时的子文件夹')
+    parser.add_argument('--steps', type=int, default=200, help='连续下一张的次数')
+    parser.add_argument('-o', '--out', default='bench_output.json', help='结果 JSON 路径')
+    parser.add_argument('--compare', help='与之前的结果 JSON 对比')
+    args = parser.parse_args(argv)
+
+    temporary = args.dataset is None
+    root = args.dataset or tempfile.mkdtemp(prefix='reid_bench_')
+    try:
+        if not os.path.isdir(os.path.join(root, args.folder)):
+            start = time.perf_counter()
+            count = generate_dataset(root, args.size)
+            print(f'生成 {count} 张合成图片，用时 {time.perf_counter() - start:.1f}s: {root}')
+
+        from PyQt5.QtCore import QT_VERSION_STR, PYQT_VERSION_STR
+        results = Benchmark(root, os.path.join(root, args.folder), args.steps).run()
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'dataset_size': args.size if temporary else None,
+            'python': platform.python_version(), 'qt': QT_VERSION_STR, 'pyqt': PYQT_VERSION_STR,
+            'platform': os.environ.get('QT_QPA_PLATFORM'),
+            'results': results,
+        }
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        if args.compare:
+            compare(args.compare, results)
+    finally:
+        if temporary:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dataset_index import DatasetIndex
+
+
+MANIFEST_FILENAME = '.contact_sheets.json'
+
+_app = None
+
+
+def _init_worker():
+    """工作进程初始化：无界面平台上创建 QGuiApplication（绘制文字需要字体）"""
+    global _app
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtGui import QGuiApplication
+    _app = QGuiApplication.instance() or QGuiApplication(['contact_sheet'])
+
+
+def render_sheet(job):
+    """绘制一张联系表并原子写入（先写临时文件再替换），返回输出路径"""
+    from PyQt5.QtGui import QImage, QImageReader, QPainter, QColor, QFont
+    from PyQt5.QtCore import Qt, QRect, QSize
+
+    out_path, title, items, columns, cell_width, cell_height = job
+    caption_height = 14
+    header_height = 28
+    padding = 4
+    rows = max(1, -(-len(items) // columns))
+    width = columns * (cell_width + padding) + padding
+    height = header_height + rows * (cell_height + caption_height + padding) + padding
+
+    sheet = QImage(width, height, QImage.Format_RGB32)
+    sheet.fill(QColor(40, 40, 40))
+    painter = QPainter(sheet)
+    painter.setRenderHint(QPainter.SmoothPixmapTransform)
+    painter.setPen(QColor(230, 230, 230))
+    font = QFont()
+    font.setPixelSize(16)
+    painter.setFont(font)
+    painter.drawText(QRect(padding, 0, width - 2 * padding, header_height), Qt.AlignVCenter | Qt.AlignLeft, title)
+    font.setPixelSize(10)
+    painter.setFont(font)
+
+    for i, (path, caption) in enumerate(items):
+        x = padding + (i % columns) * (cell_width + padding)
+        y = header_height + (i // columns) * (cell_height + caption_height + padding)
+        reader = QImageReader(path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid():
+            reader.setScaledSize(size.scaled(QSize(cell_width, cell_height), Qt.KeepAspectRatio))
+        image = reader.read()
+        if not image.isNull():
+            painter.drawImage(x + (cell_width - image.width()) // 2, y + (cell_height - image.height()) // 2, image)
+        painter.drawText(QRect(x, y + cell_height, cell_width, caption_height), Qt.AlignCenter, caption)
+    painter.end()
+
+    tmp_path = out_path + '.tmp.png'
+    if not sheet.save(tmp_path, 'PNG'):
+        raise OSError(f"无法写入: {tmp_path}")
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def build_jobs(index, out_dir, by_camera=False, columns=10, cell_size=(64, 128), max_images=200):
+    """按 pid（或 pid + 摄像头）分组，返回 [(输出路径, 指纹, 最新源文件 mtime, 绘制参数)]"""
+    jobs = []
+    for pid in index.pids():
+        rows = index.query(pid=pid)
+        groups = [(f'{pid:04d}', rows)]
+        if by_camera:
+            cameras = index.camera[rows]
+            groups = [(f'{pid:04d}_c{camera}', rows[cameras == camera]) for camera in sorted(set(cameras.tolist()))]
+        for name, group in groups:
+            paths = index.paths(group)
+            shown = paths[:max_images]
+            items = [(path, f'c{index.camera[row]} s{index.sequence[row]} {index.frame[row]}')
+                     for path, row in zip(shown, group)]
+            title = f'ID {pid:04d}' + (f' c{index.camera[group[0]]}' if by_camera else '') + f'  ({len(paths)} 张'
+            title += f', 显示前 {len(shown)} 张)' if len(shown) < len(paths) else ')'
+            digest = hashlib.sha1('\n'.join(shown + [title, str(columns), str(cell_size)]).encode('utf-8')).hexdigest()
+            newest = 0
+            for path in shown:
+                try:
+                    newest = max(newest, os.stat(path).st_mtime_ns)
+                except OSError:
+                    pass
+            out_path = os.path.join(out_dir, f'{name}.png')
+            jobs.append((out_path, digest, newest, (out_path, title, items, columns) + tuple(cell_size)))
+    return jobs
+
+
+def is_up_to_date(out_path, digest, newest, manifest):
+    """联系表已存在、内容指纹相同且不早于所有源图片时视为最新"""
+    if manifest.get(os.path.basename(out_path)) != digest:
+        return False
+    try:
+        return os.stat(out_path).st_mtime_ns >= newest
+    except OSError:
+        return False
+
+
+def print_progress(done, total, start):
+    width = 30
+    filled = width * done // max(total, 1)
+    elapsed = time.perf_counter() - start
+    sys.stderr.write(f'\r[{"#" * filled}{"." * (width - filled)}] {done}/{total} {elapsed:.0f}s')
+    sys.stderr.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按行人ID（可按摄像头细分）批量生成联系表，可中断后继续')
+    parser.add_argument('root', help='数据集根目录')
+    parser.add_argument('-o', '--out', required=True, help='输出目录')
+    parser.add_argument('--by-camera', action='store_true', help='每个 pid 的每个摄像头单独一张')
+    parser.add_argument('--columns', type=int, default=10)
+    parser.add_argument('--cell', default='64x128', help='单元格尺寸，如 64x128')
+    parser.add_argument('--max-images', type=int, default=200, help='每张联系表最多显示的图片数')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认为 CPU 核数）')
+    args = parser.parse_args(argv)
+
+    cell_size = tuple(int(v) for v in args.cell.lower().split('x'))
+    os.makedirs(args.out, exist_ok=True)
+    manifest_path = os.path.join(args.out, MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    index = DatasetIndex.open(args.root)
+    jobs = build_jobs(index, args.out, args.by_camera, args.columns, cell_size, args.max_images)
+    todo = [job for job in jobs if not is_up_to_date(job[0], job[1], job[2], manifest)]
+    print(f'{len(jobs)} 张联系表，其中 {len(jobs) - len(todo)} 张已是最新，需要生成 {len(todo)} 张')
+    if not todo:
+        return
+
+    def save_manifest():
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+    start = time.perf_counter()
+    done = 0
+    failed = []
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as executor:
+            futures = {executor.submit(render_sheet, job[3]): job for job in todo}
+            for future in as_completed(futures):
+                out_path, digest = futures[future][:2]
+                done += 1
+                try:
+                    future.result()
+                except Exception as e:
+                    # 单张失败不影响其余联系表；不写入清单，下次运行重新生成
+                    failed.append(out_path)
+                    sys.stderr.write(f'\r{os.path.basename(out_path)} 生成失败: {e}\n')
+                else:
+                    manifest[os.path.basename(out_path)] = digest
+                print_progress(done, len(todo), start)
+                if done % 50 == 0:
+                    save_manifest()
+    finally:
+        # 中断时保留已完成的记录，下次运行跳过这些联系表
+        save_manifest()
+        sys.stderr.write('\n')
+    print(f'完成 {done - len(failed)} 张，用时 {time.perf_counter() - start:.1f}s，输出目录 {args.out}')
+    if failed:
+        print(f'{len(failed)} 张生成失败，重新运行时会再次尝试')
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,555 @@
+import hashlib
+import os
+import re
+import threading
+import numpy as np
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+
+# 缓存文件格式版本，格式变化时递增以使旧缓存失效
+INDEX_VERSION = 2
+
+# Market-1501 文件名: 0001_c1s1_001051_00.jpg -> pid, 摄像头, 序列, 帧号, 检测框序号
+MARKET_PATTERN = re.compile(r'^(-?\d+)_c(\d+)s(\d+)_(\d+)_(\d+)')
+
+# MARS 文件名: 0065C1T0002F0016.jpg -> pid, 摄像头, 轨迹, 帧号（干扰图片的 pid 为 00-1）
+MARS_PATTERN = re.compile(r'^(\d+|00-1)C(\d+)T(\d+)F(\d+)')
+
+# DukeMTMC-reID 文件名: 0005_c2_f0046985.jpg -> pid, 摄像头, 帧号
+DUKE_PATTERN = re.compile(r'^(-?\d+)_c(\d+)_f(\d+)')
+
+# MSMT17 文件名: 0000_000_01_0303morning_0015_0.jpg -> pid, 序号, 摄像头, 日期和时段, 帧号, 检测框序号
+MSMT_PATTERN = re.compile(r'^(\d+)_(\d+)_(\d+)_(\d{4})(morning|noon|afternoon)_(\d+)_(\d+)')
+MSMT_PERIODS = {'morning': 0, 'noon': 1, 'afternoon': 2}
+
+# CUHK03-NP 文件名: 0001_c1_1.png -> pid, 摄像头, 序号
+CUHK03_PATTERN = re.compile(r'^(\d+)_c(\d+)_(\d+)')
+
+# 检索条件: "0001", "c3", "0001 c3", "0001_c3"
+QUERY_PATTERN = re.compile(r'^(?:(-?\d+))?[\s_,]*(?:c(\d+))?$', re.IGNORECASE)
+
+
+def parse_market_name(name):
+    """解析 Market-1501 风格的文件名，返回 (pid, camera, sequence, frame, bbox)，无法解析时返回 None
+
+    也接受 MARS 风格的文件名，轨迹编号作为 sequence，bbox 为 0。
+    """
+    match = MARKET_PATTERN.match(name)
+    if match is not None:
+        return tuple(int(group) for group in match.groups())
+    match = MARS_PATTERN.match(name)
+    if match is None:
+        return None
+    pid, camera, tracklet, frame = match.groups()
+    return (-1 if pid == '00-1' else int(pid)), int(camera), int(tracklet), int(frame), 0
+
+
+def parse_duke_name(name):
+    """DukeMTMC-reID 文件名，帧号存放在 frame 字段，sequence 和 bbox 为 0"""
+    match = DUKE_PATTERN.match(name)
+    if match is None:
+        return None
+    pid, camera, frame = (int(group) for group in match.groups())
+    return pid, camera, 0, frame, 0
+
+
+def parse_msmt_name(name):
+    """MSMT17 文件名，拍摄日期和时段合成 sequence（MMDD * 3 + 时段）"""
+    match = MSMT_PATTERN.match(name)
+    if match is None:
+        return None
+    pid, _, camera, date, period, frame, bbox = match.groups()
+    return int(pid), int(camera), int(date) * 3 + MSMT_PERIODS[period], int(frame), int(bbox)
+
+
+def parse_cuhk03_name(name):
+    """CUHK03-NP 文件名，图片序号存放在 frame 字段"""
+    match = CUHK03_PATTERN.match(name)
+    if match is None:
+        return None
+    pid, camera, number = (int(group) for group in match.groups())
+    return pid, camera, 0, number, 0
+
+
+class DatasetFormat:
+    """数据集格式：文件名解析函数，以及可选的列表文件
+
+    列表文件每行为 "<相对路径> <pid> [<摄像头>]"（如 MSMT17 的 list_train.txt），
+    存在时其中的 pid（和摄像头）优先于文件名中解析出的值。
+    keywords 在按文件名识别不出格式时（得分相同）用根目录名判断。
+    """
+
+    def __init__(self, name, parse, keywords=(), list_files=()):
+        self.name = name
+        self.parse = parse
+        self.keywords = keywords
+        self.list_files = list_files
+
+    def parser(self, root):
+        """该根目录使用的 文件名 -> (pid, camera, sequence, frame, bbox) 函数"""
+        labels = {}
+        for filename in self.list_files:
+            try:
+                with open(os.path.join(root, filename), encoding='utf-8') as f:
+                    for line in f:
+                        parts = line.split()
+                        if len(parts) >= 2:
+                            labels[os.path.basename(parts[0])] = tuple(int(part) for part in parts[1:3])
+            except (OSError, ValueError):
+                continue
+        if not labels:
+            return self.parse
+
+        def parse(name):
+            fields = self.parse(name)
+            label = labels.get(name)
+            if label is None:
+                return fields
+            fields = fields or (0, 0, 0, 0, 0)
+            return label + fields[len(label):]
+        return parse
+
+
+FORMATS = {}
+
+
+def register_format(dataset_format):
+    """登记数据集格式（同名时替换），返回该格式"""
+    FORMATS[dataset_format.name] = dataset_format
+    return dataset_format
+
+
+MARKET = register_format(DatasetFormat('market', parse_market_name, ('market', 'mars')))
+register_format(DatasetFormat('duke', parse_duke_name, ('duke',)))
+register_format(DatasetFormat('msmt17', parse_msmt_name, ('msmt',),
+                              ('list_train.txt', 'list_val.txt', 'list_query.txt', 'list_gallery.txt')))
+register_format(DatasetFormat('cuhk03', parse_cuhk03_name, ('cuhk03', 'cuhk-03')))
+
+
+def _sample_names(root, sample_size):
+    """根目录下前 sample_size 个图片文件名（容器按成员列表取）"""
+    import vfs
+    try:
+        container, inner = vfs.find(root)
+    except (OSError, ValueError):
+        return []
+    if container is not None:
+        return [os.path.basename(rel) for rel in container.list_images(inner)[:sample_size]]
+    names = []
+    for folder, subdirs, files in os.walk(root):
+        subdirs.sort()
+        names.extend(name for name in sorted(files) if name.lower().endswith(IMAGE_EXTENSIONS))
+        if len(names) >= sample_size:
+            break
+    return names[:sample_size]
+
+
+def detect_format(root, sample_size=200):
+    """取能解析最多样本文件名的格式
+
+    得分相同时（包括都解析不了时）取根目录名中含关键字的格式，仍相同时取先登记的（Market）。
+    关键字只和根目录名比较，上级目录名（如 /data/market_duke/）不参与识别。
+    """
+    name = os.path.basename(os.path.abspath(root).rstrip(os.sep)).lower()
+    names = _sample_names(root, sample_size)
+
+    def score(dataset_format):
+        parsed = sum(dataset_format.parse(sample) is not None for sample in names)
+        return parsed, any(keyword in name for keyword in dataset_format.keywords)
+    return max(FORMATS.values(), key=score)
+
+
+def parse_query(text):
+    """解析检索栏输入，返回 (pid, camera)，未指定的部分为 None"""
+    match = QUERY_PATTERN.match(text.strip())
+    if match is None:
+        raise ValueError(f"无效的检索条件: {text}")
+    pid, camera = match.groups()
+    return (int(pid) if pid is not None else None,
+            int(camera) if camera is not None else None)
+
+
+def split_of(root, path):
+    """图片所在的划分（相对根目录的第一级目录），直接位于根目录下时为空字符串"""
+    rel = os.path.relpath(path, root)
+    return rel.split(os.sep, 1)[0] if os.sep in rel else ''
+
+
+def index_cache_path(root):
+    """索引缓存文件路径（与数据集目录同级，避免写入数据集目录改变其 mtime）"""
+    root = os.path.abspath(root)
+    parent, name = os.path.split(root.rstrip(os.sep))
+    return os.path.join(parent, f'.{name}.reid_index.npz')
+
+
+def fallback_cache_path(root):
+    """数据集所在目录不可写时使用的用户缓存路径"""
+    root = os.path.abspath(root)
+    name = os.path.basename(root.rstrip(os.sep))
+    digest = hashlib.md5(root.encode('utf-8')).hexdigest()[:8]
+    cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'reid_viewer')
+    return os.path.join(cache_dir, f'{name}-{digest}.reid_index.npz')
+
+
+class DatasetIndex:
+    """数据集元数据索引
+
+    按列存储每张图片的 pid、摄像头、序列、帧号和检测框序号，
+    以目录 mtime 为单位增量刷新，并按 pid / 摄像头建立哈希索引。
+    行按目录深度优先排列：每个目录先是自身的图片（按名称排序），再是各子目录。
+    这与 FolderScanner 按名称交错文件和子目录的浏览顺序不同，行号不能当作浏览位置使用。
+    """
+
+    def __init__(self, root, dataset_format=None):
+        self.root = os.path.abspath(root)
+        self.format = dataset_format or detect_format(self.root)
+        self.parse = self.format.parser(self.root)    # 文件名 -> 字段
+        self.dirs = []                                  # 相对根目录的目录路径
+        self.dir_parent = np.zeros(0, dtype=np.int32)   # 父目录序号，根目录为 -1
+        self.dir_mtime = np.zeros(0, dtype=np.int64)    # 目录 mtime (ns)
+        self.dir_start = np.zeros(0, dtype=np.int64)    # 目录在行数组中的起始位置
+        self.dir_count = np.zeros(0, dtype=np.int64)    # 目录内的图片数量
+        self.names = np.zeros(0, dtype='U1')
+        self.pid = np.zeros(0, dtype=np.int32)
+        self.camera = np.zeros(0, dtype=np.int16)
+        self.sequence = np.zeros(0, dtype=np.int16)
+        self.frame = np.zeros(0, dtype=np.int32)
+        self.bbox = np.zeros(0, dtype=np.int16)
+        self.dir_id = np.zeros(0, dtype=np.int32)
+        self.changed = False
+        self._pid_rows = {}
+        self._camera_rows = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def open(cls, root, dataset_format=None):
+        """加载缓存并按目录 mtime 增量刷新，有变化时写回缓存；打包数据集直接使用其中的元数据
+
+        dataset_format 为空时按根目录识别格式。
+        """
+        import vfs
+        container, inner = vfs.find(root, check=True)
+        if container is not None:
+            index = cls(root, dataset_format)
+            index.load_container(container, inner)
+            return index
+        index = cls(root, dataset_format)
+        index.load()
+        index.refresh()
+        if index.changed:
+            index.save()
+        return index
+
+    def load(self):
+        """从缓存文件加载索引，缓存不存在或已失效时返回 False"""
+        for path in (index_cache_path(self.root), fallback_cache_path(self.root)):
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    if (int(data['version']) != INDEX_VERSION or str(data['root']) != self.root
+                            or str(data['format']) != self.format.name):
+                        continue
+                    self.dirs = [str(d) for d in data['dirs']]
+                    self.dir_parent = data['dir_parent']
+                    self.dir_mtime = data['dir_mtime']
+                    self.dir_start = data['dir_start']
+                    self.dir_count = data['dir_count']
+                    self.names = data['names']
+                    self.pid = data['pid']
+                    self.camera = data['camera']
+                    self.sequence = data['sequence']
+                    self.frame = data['frame']
+                    self.bbox = data['bbox']
+                    self.dir_id = data['dir_id']
+            except (OSError, KeyError, ValueError):
+                continue
+            self._build_hash_index()
+            return True
+        return False
+
+    def save(self):
+        """写入缓存文件（先写临时文件再替换，避免中断时留下损坏的缓存）"""
+        arrays = dict(
+            version=np.array(INDEX_VERSION), root=np.array(self.root), format=np.array(self.format.name),
+            dirs=np.array(self.dirs, dtype=str), dir_parent=self.dir_parent,
+            dir_mtime=self.dir_mtime, dir_start=self.dir_start, dir_count=self.dir_count,
+            names=self.names, pid=self.pid, camera=self.camera, sequence=self.sequence,
+            frame=self.frame, bbox=self.bbox, dir_id=self.dir_id)
+        for path in (index_cache_path(self.root), fallback_cache_path(self.root)):
+            # 临时文件按进程和线程区分：并行建立索引的子进程和界面线程可能同时保存同一数据集
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, 'wb') as f:
+                    np.savez(f, **arrays)
+                os.replace(tmp_path, path)
+            except OSError:
+                try:
+                    os.remove(tmp_path)   # 不留下按进程命名的残缺临时文件
+                except OSError:
+                    pass
+                continue
+            self.changed = False
+            return path
+        return None
+
+    def refresh(self):
+        """按目录 mtime 增量刷新索引，只重新列出 mtime 变化的目录"""
+        old_dirs = {rel: i for i, rel in enumerate(self.dirs)}
+        old_children = {}
+        for i, parent in enumerate(self.dir_parent):
+            if parent >= 0:
+                old_children.setdefault(int(parent), []).append(self.dirs[i])
+
+        dirs, parents, mtimes = [], [], []
+        chunks = []  # 每个目录的 (names, pid, camera, sequence, frame, bbox)
+        changed = False
+
+        stack = [('', -1)]
+        while stack:
+            rel, parent = stack.pop()
+            try:
+                mtime = os.stat(os.path.join(self.root, rel)).st_mtime_ns
+            except OSError:
+                changed = True
+                continue
+
+            old = old_dirs.get(rel)
+            if old is not None and int(self.dir_mtime[old]) == mtime:
+                # 目录未变化，直接复用缓存的行和子目录
+                start = int(self.dir_start[old])
+                stop = start + int(self.dir_count[old])
+                chunk = (self.names[start:stop], self.pid[start:stop], self.camera[start:stop],
+                         self.sequence[start:stop], self.frame[start:stop], self.bbox[start:stop])
+                subdirs = old_children.get(old, [])
+            else:
+                changed = True
+                chunk, subdirs = self._list_dir(rel)
+
+            dir_id = len(dirs)
+            dirs.append(rel)
+            parents.append(parent)
+            mtimes.append(mtime)
+            chunks.append(chunk)
+            for sub in sorted(subdirs, reverse=True):
+                stack.append((sub, dir_id))
+
+        if not changed and len(dirs) == len(self.dirs):
+            return False
+
+        self.dirs = dirs
+        self.dir_parent = np.array(parents, dtype=np.int32)
+        self.dir_mtime = np.array(mtimes, dtype=np.int64)
+        self.dir_count = np.array([len(chunk[0]) for chunk in chunks], dtype=np.int64)
+        self.dir_start = np.cumsum(self.dir_count) - self.dir_count
+        self.dir_id = np.repeat(np.arange(len(dirs), dtype=np.int32), self.dir_count)
+        columns = list(zip(*chunks))
+        self.names = np.concatenate(columns[0]) if chunks else np.zeros(0, dtype='U1')
+        self.pid = np.concatenate(columns[1]).astype(np.int32) if chunks else self.pid[:0]
+        self.camera = np.concatenate(columns[2]).astype(np.int16) if chunks else self.camera[:0]
+        self.sequence = np.concatenate(columns[3]).astype(np.int16) if chunks else self.sequence[:0]
+        self.frame = np.concatenate(columns[4]).astype(np.int32) if chunks else self.frame[:0]
+        self.bbox = np.concatenate(columns[5]).astype(np.int16) if chunks else self.bbox[:0]
+        self.changed = True
+        self._build_hash_index()
+        return True
+
+    def apply_changes(self, added, removed):
+        """把文件监视得到的增删（完整路径）直接应用到受影响目录的行，返回索引是否变化
+
+        只解析新增的文件名并拼接受影响目录的行，不重新列出任何目录；
+        涉及新建或删除目录时目录结构变化，改为重新列出其最近的已索引上级目录并按 mtime 增量刷新。
+        """
+        dir_ids = {rel: i for i, rel in enumerate(self.dirs)}
+        changes = {}   # 目录序号 -> (新增的 {文件名: 字段}, 删除的文件名集合)
+        for path, is_added in [(path, True) for path in added] + [(path, False) for path in removed]:
+            rel = os.path.relpath(path, self.root)
+            if rel == '.' or rel.startswith(os.pardir + os.sep) or rel == os.pardir:
+                continue
+            folder, name = os.path.split(rel)
+            is_image = name.lower().endswith(IMAGE_EXTENSIONS)
+            if rel in dir_ids or folder not in dir_ids or (is_added and not is_image and os.path.isdir(path)):
+                return self._refresh_above(rel, dir_ids)
+            if is_added:
+                fields = self.parse(name) if is_image else None
+                if fields is not None:
+                    add, remove = changes.setdefault(dir_ids[folder], ({}, set()))
+                    add[name] = fields
+                    remove.discard(name)
+            else:
+                add, remove = changes.setdefault(dir_ids[folder], ({}, set()))
+                add.pop(name, None)
+                remove.add(name)
+        if not changes:
+            return False
+
+        columns = [self.names, self.pid, self.camera, self.sequence, self.frame, self.bbox]
+        pieces = [[] for _ in columns]
+        counts = self.dir_count.copy()
+        position = 0
+        spliced = False
+        for dir_id in sorted(changes):
+            add, remove = changes[dir_id]
+            start = int(self.dir_start[dir_id])
+            stop = start + int(self.dir_count[dir_id])
+            names = self.names[start:stop]
+            keep = ~np.isin(names, list(remove | set(add)))
+            new_names = list(add)
+            if keep.all() and not new_names:
+                continue   # 删除的不是已索引的图片，该目录的行和 mtime 都不变
+            spliced = True
+            table = np.array([add[name] for name in new_names], dtype=np.int64).reshape(-1, 5)
+            merged = [np.concatenate([names[keep], np.array(new_names, dtype=str)])]
+            for c, column in enumerate(columns[1:]):
+                merged.append(np.concatenate([column[start:stop][keep], table[:, c].astype(column.dtype)]))
+            order = np.argsort(merged[0], kind='stable')
+            for piece, column, chunk in zip(pieces, columns, merged):
+                piece.append(column[position:start])
+                piece.append(chunk[order])
+            position = stop
+            counts[dir_id] = len(order)
+            try:
+                self.dir_mtime[dir_id] = os.stat(os.path.join(self.root, self.dirs[dir_id])).st_mtime_ns
+            except OSError:
+                pass
+        if not spliced:
+            return False
+        for piece, column in zip(pieces, columns):
+            piece.append(column[position:])
+
+        self.names = np.concatenate(pieces[0])
+        self.pid, self.camera, self.sequence, self.frame, self.bbox = (
+            np.concatenate(piece).astype(column.dtype) for piece, column in zip(pieces[1:], columns[1:]))
+        self.dir_count = counts
+        self.dir_start = np.cumsum(counts) - counts
+        self.dir_id = np.repeat(np.arange(len(self.dirs), dtype=np.int32), counts)
+        self.changed = True
+        self._pid_rows = self._camera_rows = None   # 连续的增量更新之间不重建，下次检索时再建立
+        return True
+
+    def _refresh_above(self, rel, dir_ids):
+        """目录结构变化时按 mtime 增量刷新，并强制重新列出 rel 最近的已索引上级目录
+
+        该目录的 mtime 可能已在之前的增量更新中记录（包含了这次新建或删除子目录的变化），
+        只按 mtime 判断会沿用旧的子目录列表。
+        """
+        folder = os.path.dirname(rel)
+        while folder and folder not in dir_ids:
+            folder = os.path.dirname(folder)
+        if folder in dir_ids:
+            self.dir_mtime[dir_ids[folder]] = -1
+        return self.refresh()
+
+    def load_container(self, container, inner=''):
+        """从容器（打包数据集）的成员列表建立索引，容器提供解析好的元数据时不再解析文件名"""
+        metadata = container.metadata() if hasattr(container, 'metadata') else None
+        members = container.members()
+        prefix = inner.rstrip(os.sep) + os.sep if inner else ''
+        dir_ids, rows = {}, []  # 目录 -> 序号, [(目录序号, 名称, 字段)]
+        for i, rel in enumerate(members):
+            if not rel.startswith(prefix):
+                continue
+            folder, name = os.path.split(rel[len(prefix):])
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if metadata is not None:
+                fields = tuple(metadata[0][i]) if metadata[1][i] else None
+            else:
+                fields = self.parse(name)
+            if fields is None:
+                continue
+            if folder not in dir_ids:
+                dir_ids[folder] = len(dir_ids)
+            rows.append((dir_ids[folder], name, fields))
+
+        # 目录按路径分量排序（父目录在子目录之前），同一目录的行连续
+        dirs = sorted(dir_ids, key=lambda rel: rel.split(os.sep) if rel else [])
+        order = {dir_ids[rel]: i for i, rel in enumerate(dirs)}
+        rows.sort(key=lambda row: (order[row[0]], row[1]))
+        self.dirs = dirs
+        position = {rel: i for i, rel in enumerate(dirs)}
+        self.dir_parent = np.array([position.get(os.path.dirname(rel), -1) if rel else -1 for rel in dirs],
+                                   dtype=np.int32)
+        self.dir_mtime = np.full(len(dirs), container.stamp, dtype=np.int64)
+        self.dir_id = np.array([order[row[0]] for row in rows], dtype=np.int32)
+        self.dir_count = np.bincount(self.dir_id, minlength=len(dirs)).astype(np.int64)
+        self.dir_start = np.cumsum(self.dir_count) - self.dir_count
+        self.names = np.array([row[1] for row in rows], dtype=str) if rows else np.zeros(0, dtype='U1')
+        table = np.array([row[2] for row in rows], dtype=np.int64).reshape(-1, 5)
+        self.pid = table[:, 0].astype(np.int32)
+        self.camera = table[:, 1].astype(np.int16)
+        self.sequence = table[:, 2].astype(np.int16)
+        self.frame = table[:, 3].astype(np.int32)
+        self.bbox = table[:, 4].astype(np.int16)
+        self._build_hash_index()
+
+    def _list_dir(self, rel):
+        """列出单个目录，解析其中的图片文件名，返回 (列数据, 子目录列表)"""
+        names, fields, subdirs = [], [], []
+        try:
+            with os.scandir(os.path.join(self.root, rel)) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(os.path.join(rel, entry.name) if rel else entry.name)
+                    elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        parsed = self.parse(entry.name)
+                        if parsed is not None:
+                            names.append(entry.name)
+                            fields.append(parsed)
+        except OSError:
+            pass
+
+        order = sorted(range(len(names)), key=names.__getitem__)
+        table = np.array([fields[i] for i in order], dtype=np.int64).reshape(-1, 5)
+        chunk = (np.array([names[i] for i in order], dtype=str),
+                 table[:, 0], table[:, 1], table[:, 2], table[:, 3], table[:, 4])
+        return chunk, subdirs
+
+    def _build_hash_index(self):
+        """按 pid 和摄像头建立 值 -> 行号数组 的哈希索引"""
+        self._pid_rows = self._group_rows(self.pid)
+        self._camera_rows = self._group_rows(self.camera)
+
+    def _hash_index(self):
+        if self._pid_rows is None:
+            self._build_hash_index()
+        return self._pid_rows, self._camera_rows
+
+    @staticmethod
+    def _group_rows(column):
+        order = np.argsort(column, kind='stable')
+        values, starts = np.unique(column[order], return_index=True)
+        groups = np.split(order.astype(np.int64), starts[1:])
+        return {int(value): rows for value, rows in zip(values, groups)}
+
+    def pids(self):
+        """所有 pid（升序）"""
+        return sorted(self._hash_index()[0])
+
+    def cameras(self):
+        """所有摄像头编号（升序）"""
+        return sorted(self._hash_index()[1])
+
+    def query(self, pid=None, camera=None):
+        """按 pid 和/或摄像头检索，返回升序的行号数组"""
+        pid_rows, camera_rows = self._hash_index()
+        if pid is not None:
+            rows = pid_rows.get(pid, np.zeros(0, dtype=np.int64))
+            if camera is not None:
+                rows = rows[self.camera[rows] == camera]
+            return rows
+        if camera is not None:
+            return camera_rows.get(camera, np.zeros(0, dtype=np.int64))
+        return np.arange(len(self.names), dtype=np.int64)
+
+    def path(self, row):
+        """行号对应的图片完整路径"""
+        return os.path.join(self.root, self.dirs[self.dir_id[row]], self.names[row])
+
+    def paths(self, rows):
+        """多个行号对应的图片完整路径列表"""
+        dir_paths = [os.path.join(self.root, rel) for rel in self.dirs]
+        dir_id, names = self.dir_id, self.names
+        return [os.path.join(dir_paths[dir_id[row]], names[row]) for row in rows]
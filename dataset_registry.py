@@ -0,0 +1,196 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from dataset_index import FORMATS, DatasetIndex, detect_format, fallback_cache_path, index_cache_path, parse_query
+
+
+def registry_path():
+    """数据集登记文件（与索引的用户缓存放在同一目录）"""
+    return os.path.join(os.path.expanduser('~'), '.cache', 'reid_viewer', 'datasets.json')
+
+
+def _build_index(root, format_name):
+    """在子进程中建立（或增量刷新）索引并写入缓存，返回图片数"""
+    return len(DatasetIndex.open(root, FORMATS[format_name]))
+
+
+class DatasetRegistry:
+    """登记的数据集：名称 -> (根目录, 格式)
+
+    索引在第一次使用时建立：多个数据集缺少索引时每个数据集一个子进程并行建立并写入各自的缓存，
+    主进程再从缓存加载。加载过的索引保存在内存中，切换数据集只是一次字典查找。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or registry_path()
+        self.datasets = {}   # 名称 -> (根目录, 格式名)，按登记顺序
+        self.indexes = {}    # 根目录 -> DatasetIndex
+        self._lock = threading.Lock()
+        self._root_locks = {}   # 根目录 -> 加载该索引时持有的锁，同一根目录只加载一次
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return False
+        for entry in entries:
+            if entry.get('format') in FORMATS:
+                self.datasets[entry['name']] = (entry['root'], entry['format'])
+        return True
+
+    def save(self):
+        """写入登记文件（先写临时文件再替换）"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([{'name': name, 'root': root, 'format': format_name}
+                       for name, (root, format_name) in self.datasets.items()], f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def names(self):
+        return list(self.datasets)
+
+    def root(self, name):
+        return self.datasets[name][0]
+
+    def name_of(self, root):
+        """根目录对应的登记名称，未登记时返回 None"""
+        root = os.path.abspath(root)
+        for name, (registered, _) in self.datasets.items():
+            if registered == root:
+                return name
+        return None
+
+    def add(self, root, format_name=None, name=None):
+        """登记数据集（已登记时直接返回其名称），格式未指定时自动识别"""
+        root = os.path.abspath(root)
+        existing = self.name_of(root)
+        if existing is not None:
+            return existing
+        format_name = format_name or detect_format(root).name
+        name = name or os.path.basename(root.rstrip(os.sep)) or root
+        base, number = name, 2
+        while name in self.datasets:
+            name = f'{base} ({number})'
+            number += 1
+        self.datasets[name] = (root, format_name)
+        return name
+
+    def remove(self, name):
+        root, _ = self.datasets.pop(name)
+        with self._lock:
+            self.indexes.pop(root, None)
+
+    def format_of(self, root):
+        name = self.name_of(root)
+        return FORMATS[self.datasets[name][1]] if name is not None else None
+
+    def index(self, root):
+        """根目录的索引（已加载时直接返回，否则加载缓存并增量刷新）
+
+        后台 build() 和界面线程可能同时请求同一根目录：按根目录加锁，只加载一次，
+        所有调用者得到同一个对象（文件监视的增量只应用到这一个对象上）。
+        """
+        root = os.path.abspath(root)
+        with self._lock:
+            index = self.indexes.get(root)
+            if index is not None:
+                return index
+            root_lock = self._root_locks.setdefault(root, threading.Lock())
+        with root_lock:
+            with self._lock:
+                index = self.indexes.get(root)   # 等待期间另一个线程已加载完成
+            if index is None:
+                index = DatasetIndex.open(root, self.format_of(root))
+                with self._lock:
+                    self.indexes[root] = index
+        return index
+
+    def missing(self, names=None):
+        """尚未加载索引的数据集名称"""
+        with self._lock:
+            return [name for name in (names or self.datasets) if self.datasets[name][0] not in self.indexes]
+
+    def build(self, names=None, workers=None, progress=None):
+        """并行建立尚未加载的索引，progress(名称, 完成数, 总数)；返回用时（秒）
+
+        已有缓存文件的数据集直接在本进程加载（只比较目录 mtime），只有没有缓存的才交给子进程。
+        """
+        start = time.perf_counter()
+        missing = self.missing(names)
+        todo = [name for name in missing
+                if not any(os.path.exists(path(self.datasets[name][0]))
+                           for path in (index_cache_path, fallback_cache_path))]
+        if len(todo) > 1:
+            # spawn 避免在已启动 Qt 线程的进程中 fork
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers or min(len(todo), os.cpu_count() or 1),
+                                     mp_context=context) as executor:
+                jobs = {executor.submit(_build_index, *self.datasets[name]): name for name in todo}
+                for done, job in enumerate(as_completed(jobs), 1):
+                    job.result()
+                    if progress is not None:
+                        progress(jobs[job], done, len(todo))
+        for name in missing:
+            # 缓存已由子进程写好，这里加载后的刷新只比较目录 mtime
+            self.index(self.datasets[name][0])
+        return time.perf_counter() - start
+
+    def search(self, pid=None, camera=None, names=None):
+        """在多个数据集中检索，返回 [(名称, 索引, 行号数组)]（只包含有结果的数据集）"""
+        results = []
+        for name in names or self.datasets:
+            index = self.index(self.datasets[name][0])
+            rows = index.query(pid=pid, camera=camera)
+            if len(rows):
+                results.append((name, index, rows))
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='登记数据集、并行建立索引并跨数据集检索')
+    parser.add_argument('roots', nargs='*', help='要登记的数据集根目录')
+    parser.add_argument('--format', choices=sorted(FORMATS), help='数据集格式（默认自动识别）')
+    parser.add_argument('--remove', action='append', default=[], help='取消登记的数据集名称')
+    parser.add_argument('--search', help='跨数据集检索，如 "0001" 或 "0001 c3"')
+    parser.add_argument('--workers', type=int, default=None, help='建立索引的进程数')
+    args = parser.parse_args(argv)
+
+    registry = DatasetRegistry()
+    registry.load()
+    for name in args.remove:
+        registry.remove(name)
+    for root in args.roots:
+        registry.add(root, args.format)
+    if args.roots or args.remove:
+        registry.save()
+
+    def progress(name, done, total):
+        sys.stderr.write(f'\r建立索引: {done}/{total} {name}\033[K')
+        sys.stderr.flush()
+
+    elapsed = registry.build(workers=args.workers, progress=progress)
+    sys.stderr.write('\n')
+    for name in registry.names():
+        root, format_name = registry.datasets[name]
+        index = registry.index(root)
+        print(f'{name} [{format_name}] {root}: {len(index)} 张, {len(index.pids())} 个ID')
+    print(f'索引就绪，用时 {elapsed:.1f}s')
+    if args.search:
+        pid, camera = parse_query(args.search)
+        for name, index, rows in registry.search(pid, camera):
+            cameras = np.unique(index.camera[rows]).tolist()
+            print(f'{name}: {len(rows)} 张, 摄像头 {cameras}')
+
+
+if __name__ == '__main__':
+    main()
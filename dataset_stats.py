@@ -0,0 +1,271 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dataset_index import detect_format, split_of
+from folder_scanner import scan_image_files
+from vfs import file_stamp
+
+
+STATS_VERSION = 1
+SIZE_BINS = (0, 32, 64, 96, 128, 192, 256, 384, 512, 1024)  # 宽/高直方图的分箱边界（像素）
+
+
+def stats_cache_path(root):
+    """统计缓存路径（与数据集目录同级，和索引缓存放在一起）"""
+    root = os.path.abspath(root)
+    parent, name = os.path.split(root.rstrip(os.sep))
+    return os.path.join(parent, f'.{name}.reid_stats.npz')
+
+
+def image_stats(path, pixels=True):
+    """单张图片的 (宽, 高, 各通道像素和[3], 各通道平方和[3])，读取失败时宽高为 0
+
+    尺寸只读文件头；pixels 为 True 时再完整解码一次累加 RGB 像素和。
+    """
+    from PyQt5.QtCore import QBuffer, QByteArray, QIODevice
+    from PyQt5.QtGui import QImage, QImageReader
+    from image_loader import decode_bytes, read_bytes
+
+    sums = np.zeros(3)
+    squares = np.zeros(3)
+    try:
+        data = read_bytes(path)
+    except (OSError, ValueError):
+        return 0, 0, sums, squares
+    buffer = QBuffer()
+    buffer.setData(QByteArray(bytes(data)))
+    buffer.open(QIODevice.ReadOnly)
+    size = QImageReader(buffer).size()
+    if not size.isValid():
+        return 0, 0, sums, squares
+    if pixels:
+        image = decode_bytes(data)
+        if not image.isNull():
+            image = image.convertToFormat(QImage.Format_RGB888)
+            rows = np.frombuffer(image.constBits().asstring(image.sizeInBytes()), dtype=np.uint8)
+            rgb = rows.reshape(image.height(), image.bytesPerLine())[:, :image.width() * 3].reshape(-1, 3)
+            sums = rgb.sum(axis=0, dtype=np.float64)
+            squares = np.einsum('ij,ij->j', rgb.astype(np.float64), rgb.astype(np.float64))
+    return size.width(), size.height(), sums, squares
+
+
+def _stats_batch(args):
+    paths, pixels = args
+    results = [image_stats(path, pixels) for path in paths]
+    return (np.array([r[0] for r in results], dtype=np.int32),
+            np.array([r[1] for r in results], dtype=np.int32),
+            np.array([r[2] for r in results]).reshape(-1, 3),
+            np.array([r[3] for r in results]).reshape(-1, 3))
+
+
+class StatsCache:
+    """按图片缓存的尺寸和像素和，按 路径 + mtime + 大小 增量更新"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.path = stats_cache_path(self.root)
+        self.paths = np.zeros(0, dtype='U1')
+        self.mtime = np.zeros(0, dtype=np.int64)
+        self.size = np.zeros(0, dtype=np.int64)
+        self.width = np.zeros(0, dtype=np.int32)
+        self.height = np.zeros(0, dtype=np.int32)
+        self.sums = np.zeros((0, 3))
+        self.squares = np.zeros((0, 3))
+        self.pixels = np.zeros(0, dtype=bool)   # 是否已累加像素统计
+
+    def __len__(self):
+        return len(self.paths)
+
+    def load(self):
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if int(data['version']) != STATS_VERSION:
+                    return False
+                for name in ('paths', 'mtime', 'size', 'width', 'height', 'sums', 'squares', 'pixels'):
+                    setattr(self, name, data[name])
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+
+    def save(self):
+        """写入缓存文件（先写临时文件再替换）"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, version=np.array(STATS_VERSION), paths=self.paths, mtime=self.mtime, size=self.size,
+                     width=self.width, height=self.height, sums=self.sums, squares=self.squares,
+                     pixels=self.pixels)
+        os.replace(tmp_path, self.path)
+
+    def update(self, paths, pixels=True, workers=None, batch_size=256, progress=None):
+        """扫描数据集，只为新增或变化的图片读取统计，删除已不存在的图片；返回新处理的数量"""
+        rels = [os.path.relpath(path, self.root) for path in paths]
+        old = {str(rel): i for i, rel in enumerate(self.paths)}
+        keep, todo = [], []
+        for path, rel in zip(paths, rels):
+            try:
+                stamp = file_stamp(path)
+            except OSError:
+                continue
+            i = old.get(rel)
+            if (i is not None and (int(self.mtime[i]), int(self.size[i])) == stamp
+                    and (self.pixels[i] or not pixels)):
+                keep.append(i)
+            else:
+                todo.append((path, rel, stamp))
+        if not todo and len(keep) == len(self.paths):
+            return 0
+
+        keep = np.array(keep, dtype=np.int64)
+        count = len(todo)
+        width = np.zeros(count, dtype=np.int32)
+        height = np.zeros(count, dtype=np.int32)
+        sums = np.zeros((count, 3))
+        squares = np.zeros((count, 3))
+        if todo:
+            starts = range(0, count, batch_size)
+            jobs = (([path for path, _, _ in todo[start:start + batch_size]], pixels) for start in starts)
+            # spawn 避免在已启动 Qt 线程的进程中 fork
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                for start, (w, h, s, q) in zip(starts, executor.map(_stats_batch, jobs)):
+                    stop = start + len(w)
+                    width[start:stop], height[start:stop] = w, h
+                    sums[start:stop], squares[start:stop] = s, q
+                    if progress is not None:
+                        progress(stop, count)
+
+        self.paths = np.concatenate([self.paths[keep], np.array([rel for _, rel, _ in todo], dtype=str)])
+        self.mtime = np.concatenate([self.mtime[keep], np.array([s[0] for _, _, s in todo], dtype=np.int64)])
+        self.size = np.concatenate([self.size[keep], np.array([s[1] for _, _, s in todo], dtype=np.int64)])
+        self.width = np.concatenate([self.width[keep], width])
+        self.height = np.concatenate([self.height[keep], height])
+        self.sums = np.concatenate([self.sums[keep], sums])
+        self.squares = np.concatenate([self.squares[keep], squares])
+        self.pixels = np.concatenate([self.pixels[keep], np.full(count, pixels)])
+        self.save()
+        return count
+
+
+def summarize(cache):
+    """由缓存计算各划分的统计（只用 NumPy 聚合，不读图片）"""
+    root = cache.root
+    names = [os.path.basename(rel) for rel in cache.paths]
+    parse = detect_format(root).parser(root)
+    parsed = [parse(name) for name in names]
+    pid = np.array([p[0] if p else -2 for p in parsed], dtype=np.int64)
+    camera = np.array([p[1] if p else -1 for p in parsed], dtype=np.int64)
+    splits = np.array([split_of(root, os.path.join(root, rel)) for rel in cache.paths], dtype=str)
+
+    summary = {'total': len(cache), 'splits': {}, 'overlap': {}}
+    pid_sets = {}
+    for split in sorted(set(splits.tolist())):
+        mask = splits == split
+        valid = mask & (cache.width > 0)
+        split_pids = pid[mask & (pid >= 0)]
+        pid_sets[split] = set(np.unique(split_pids).tolist())
+        per_pid = np.bincount(np.unique(split_pids, return_inverse=True)[1]) if len(split_pids) else np.zeros(0)
+        cameras, camera_counts = np.unique(camera[mask & (camera >= 0)], return_counts=True)
+        with_pixels = valid & cache.pixels
+        pixel_count = float((cache.width[with_pixels].astype(np.float64) * cache.height[with_pixels]).sum())
+        if pixel_count:
+            mean = cache.sums[with_pixels].sum(axis=0) / pixel_count
+            std = np.sqrt(np.maximum(cache.squares[with_pixels].sum(axis=0) / pixel_count - mean ** 2, 0))
+        else:
+            mean = std = None
+        sizes, size_counts = np.unique(np.stack([cache.width[valid], cache.height[valid]], axis=1),
+                                       axis=0, return_counts=True)
+        top = np.argsort(-size_counts, kind='stable')[:5]
+        bins = list(SIZE_BINS) + [np.inf]
+        summary['splits'][split] = {
+            'images': int(mask.sum()),
+            'unreadable': int((mask & (cache.width == 0)).sum()),
+            'pids': len(pid_sets[split]),
+            'images_per_pid': ({'min': int(per_pid.min()), 'median': float(np.median(per_pid)),
+                                'mean': float(per_pid.mean()), 'max': int(per_pid.max())} if len(per_pid) else None),
+            'cameras': {int(c): int(n) for c, n in zip(cameras, camera_counts)},
+            'width_histogram': np.histogram(cache.width[valid], bins)[0].tolist(),
+            'height_histogram': np.histogram(cache.height[valid], bins)[0].tolist(),
+            'common_sizes': [(f'{int(sizes[i][0])}x{int(sizes[i][1])}', int(size_counts[i])) for i in top],
+            'mean': (mean / 255).round(4).tolist() if mean is not None else None,
+            'std': (std / 255).round(4).tolist() if std is not None else None,
+        }
+    names = sorted(pid_sets)
+    for i, a in enumerate(names):
+        for b in names[i + 1:]:
+            shared = len(pid_sets[a] & pid_sets[b])
+            if shared:
+                summary['overlap'][f'{a} & {b}'] = shared
+    return summary
+
+
+def format_summary(summary):
+    """统计面板和命令行使用的文字报告"""
+    labels = [f'<{SIZE_BINS[i + 1]}' for i in range(len(SIZE_BINS) - 1)] + [f'≥{SIZE_BINS[-1]}']
+    lines = [f'共 {summary["total"]} 张图片']
+    for split, stats in summary['splits'].items():
+        lines.append('')
+        lines.append(f'[{split or "."}] {stats["images"]} 张, {stats["pids"]} 个ID'
+                     + (f', {stats["unreadable"]} 张无法读取' if stats['unreadable'] else ''))
+        per_pid = stats['images_per_pid']
+        if per_pid:
+            lines.append(f'  每个ID的图片数: 最少 {per_pid["min"]}, 中位数 {per_pid["median"]:g}, '
+                         f'平均 {per_pid["mean"]:.1f}, 最多 {per_pid["max"]}')
+        if stats['cameras']:
+            lines.append('  摄像头: ' + ', '.join(f'c{c}={n}' for c, n in stats['cameras'].items()))
+        if stats['mean'] is not None:
+            lines.append(f'  RGB 均值: {stats["mean"]}  标准差: {stats["std"]}')
+        lines.append('  常见尺寸: ' + ', '.join(f'{size} ({n})' for size, n in stats['common_sizes']))
+        for name, key in (('宽', 'width_histogram'), ('高', 'height_histogram')):
+            histogram = stats[key]
+            peak = max(histogram) or 1
+            lines.append(f'  {name}度分布:')
+            for label, count in zip(labels, histogram):
+                if count:
+                    lines.append(f'    {label:>6} {"█" * max(1, 30 * count // peak)} {count}')
+    if summary['overlap']:
+        lines.append('')
+        lines.append('划分之间共有的ID: ' + ', '.join(f'{pair}: {n}' for pair, n in summary['overlap'].items()))
+    return '\n'.join(lines)
+
+
+def compute_stats(root, pixels=True, workers=None, progress=None):
+    """增量更新统计缓存并返回汇总"""
+    cache = StatsCache(root)
+    cache.load()
+    paths = [path for batch in scan_image_files(root) for path in batch]
+    cache.update(paths, pixels, workers, progress=progress)
+    return summarize(cache)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='统计数据集各划分的ID、摄像头、图片尺寸和像素均值/标准差（增量缓存）')
+    parser.add_argument('root', help='数据集根目录')
+    parser.add_argument('--no-pixels', action='store_true', help='只读文件头统计尺寸，不解码计算像素均值/标准差')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认为 CPU 核数）')
+    parser.add_argument('--json', help='把汇总写入 JSON 文件')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+
+    def progress(done, total):
+        sys.stderr.write(f'\r读取: {done}/{total}')
+        sys.stderr.flush()
+
+    summary = compute_stats(args.root, not args.no_pixels, args.workers, progress)
+    sys.stderr.write('\n')
+    print(format_summary(summary))
+    print(f'\n用时 {time.perf_counter() - start:.1f}s')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
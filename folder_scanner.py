@@ -0,0 +1,184 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+import vfs
+from dataset_index import IMAGE_EXTENSIONS
+from profiling import PROFILER
+
+
+def scan_image_files(folder, dir_mtimes=None, cancel_event=None, batch_size=1024, first_batch_size=64):
+    """用 os.scandir 深度优先扫描文件夹，按名称排序逐批产出图片路径列表
+
+    dir_mtimes 不为空时记录扫描到的每个目录的 mtime，用于之后判断列表是否仍然有效。
+    第一批较小，使第一张图片能尽快显示。打包数据集内的路径直接从容器索引列出。
+    """
+    listing = vfs.list_images(folder)
+    if listing is not None:
+        paths, (stamp_path, stamp) = listing
+        if dir_mtimes is not None:
+            dir_mtimes[stamp_path] = stamp
+        limit = first_batch_size
+        start = 0
+        while start < len(paths) and not (cancel_event is not None and cancel_event.is_set()):
+            yield paths[start:start + limit]
+            start += limit
+            limit = batch_size
+        return
+
+    batch = []
+    limit = first_batch_size
+
+    def walk(path):
+        try:
+            if dir_mtimes is not None:
+                dir_mtimes[path] = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            return
+        for entry in entries:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield entry.path
+
+    for path in walk(folder):
+        batch.append(path)
+        if len(batch) >= limit:
+            yield batch
+            batch = []
+            limit = batch_size
+    if batch and not (cancel_event is not None and cancel_event.is_set()):
+        yield batch
+
+
+class _ScanSignals(QObject):
+    batch_ready = pyqtSignal(int, list)
+    finished = pyqtSignal(int, dict)
+
+
+class ScanTask(QRunnable):
+    """在线程池中扫描文件夹，分批通过信号把结果送回 GUI 线程"""
+
+    def __init__(self, token, folder):
+        super().__init__()
+        self.token = token
+        self.folder = folder
+        self.cancel_event = threading.Event()
+        self.signals = _ScanSignals()
+
+    def run(self):
+        dir_mtimes = {}
+        with PROFILER.block('scan'):
+            for batch in scan_image_files(self.folder, dir_mtimes, self.cancel_event):
+                self.signals.batch_ready.emit(self.token, batch)
+        if not self.cancel_event.is_set():
+            self.signals.finished.emit(self.token, dir_mtimes)
+
+
+class FolderScanner(QObject):
+    """可取消的流式文件夹扫描器
+
+    每次 scan() 会取消上一次扫描，只转发最新一次扫描的结果；
+    扫描完成的列表按目录 mtime 缓存，未变化的文件夹再次打开时直接复用。
+    """
+
+    batch_ready = pyqtSignal(str, list)   # 文件夹, 本批图片路径
+    finished = pyqtSignal(str)             # 文件夹
+
+    def __init__(self, max_cached_folders=16, parent=None):
+        super().__init__(parent)
+        self.max_cached_folders = max_cached_folders
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._token = 0
+        self._task = None
+        self._collected = []
+        self._cache = OrderedDict()  # 文件夹 -> (目录 mtime 字典, 图片路径元组)
+
+    def is_scanning(self):
+        return self._task is not None
+
+    def cached_listing(self, folder):
+        """返回仍然有效的缓存列表（所有目录 mtime 未变化），否则返回 None"""
+        entry = self._cache.get(folder)
+        if entry is None:
+            return None
+        dir_mtimes, paths = entry
+        for path, mtime in dir_mtimes.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    break
+            except OSError:
+                break
+        else:
+            self._cache.move_to_end(folder)
+            return paths
+        del self._cache[folder]
+        return None
+
+    def cached_dirs(self, folder):
+        """缓存列表中扫描过的目录（用于建立文件监视），没有缓存时返回 None"""
+        entry = self._cache.get(folder)
+        return list(entry[0]) if entry is not None else None
+
+    def listing(self, folder):
+        """缓存的 (目录 mtime 字典, 图片路径元组)，用于把列表保存到磁盘；没有缓存时返回 None"""
+        return self._cache.get(folder)
+
+    def seed(self, folder, dir_mtimes, paths):
+        """放入从磁盘读取的列表，打开文件夹时同样按目录 mtime 校验"""
+        self._cache[folder] = (dict(dir_mtimes), tuple(paths))
+        while len(self._cache) > self.max_cached_folders:
+            self._cache.popitem(last=False)
+
+    def update_listing(self, folder, paths, dirs=()):
+        """按文件监视得到的增量更新缓存列表，并重新记录发生变化的目录的 mtime"""
+        entry = self._cache.get(folder)
+        if entry is None:
+            return
+        dir_mtimes = entry[0]
+        for path in dirs:
+            try:
+                dir_mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                dir_mtimes.pop(path, None)
+        self._cache[folder] = (dir_mtimes, tuple(paths))
+
+    def scan(self, folder):
+        """开始后台扫描文件夹（会取消正在进行的扫描）"""
+        self.cancel()
+        self._token += 1
+        self._collected = []
+        self._task = ScanTask(self._token, folder)
+        self._task.signals.batch_ready.connect(self._on_batch)
+        self._task.signals.finished.connect(self._on_finished)
+        self.pool.start(self._task)
+
+    def cancel(self):
+        """取消正在进行的扫描"""
+        if self._task is not None:
+            self._task.cancel_event.set()
+            self._task = None
+
+    def _on_batch(self, token, batch):
+        if self._task is None or token != self._token:
+            return
+        self._collected.extend(batch)
+        self.batch_ready.emit(self._task.folder, batch)
+
+    def _on_finished(self, token, dir_mtimes):
+        if self._task is None or token != self._token:
+            return
+        folder = self._task.folder
+        self._task = None
+        self._cache[folder] = (dir_mtimes, tuple(self._collected))
+        self._collected = []
+        while len(self._cache) > self.max_cached_folders:
+            self._cache.popitem(last=False)
+        self.finished.emit(folder)
@@ -0,0 +1,268 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+from PyQt5.QtCore import QFileSystemWatcher, QObject, QSocketNotifier, QTimer, pyqtSignal
+
+from dataset_index import IMAGE_EXTENSIONS
+
+
+# inotify 事件掩码（linux/inotify.h）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')   # wd, mask, cookie, len
+
+
+def is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def _load_inotify():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class _InotifyBackend(QObject):
+    """Linux inotify：事件直接给出变化的文件名，处理代价只与变化的文件数有关"""
+
+    def __init__(self, libc, report, parent=None):
+        super().__init__(parent)
+        self.libc = libc
+        self.report = report   # report(路径, 是否存在, 是否目录)，路径为 None 表示事件丢失
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失败')
+        self.watches = {}   # wd -> 目录
+        self.notifier = QSocketNotifier(self.fd, QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self.read_events)
+
+    def add(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+
+    def remove_tree(self, directory):
+        """移除目录树的监视：监视跟随 inode，目录移走后不移除会把移走后的写入报告为原路径下的图片"""
+        prefix = directory + os.sep
+        for wd, path in list(self.watches.items()):
+            if path == directory or path.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def clear(self):
+        for wd in list(self.watches):
+            self.libc.inotify_rm_watch(self.fd, wd)
+        self.watches.clear()
+        self.read_events()   # 丢弃已排队的旧事件
+
+    def close(self):
+        self.notifier.setEnabled(False)
+        os.close(self.fd)
+
+    def read_events(self):
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    self.report(None, False, False)
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                directory = self.watches.get(wd)
+                if directory is None or not name:
+                    continue   # 已移除的监视，或目录自身被删除/移走（由父目录的事件处理）
+                path = os.path.join(directory, name)
+                is_dir = bool(mask & IN_ISDIR)
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.report(path, False, is_dir)
+                elif mask & (IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO):
+                    # 新建（含硬链接）时报告一次，写完关闭时再报告一次：
+                    # 合并窗口内两者合为一条新增，跨窗口时后一条作为修改，使写了一半时读到的图片被重新加载
+                    self.report(path, True, is_dir)
+
+
+class _QtBackend(QObject):
+    """QFileSystemWatcher：只报告哪个目录变化了，与该目录上次的列表比较得出增删的文件"""
+
+    def __init__(self, report, parent=None):
+        super().__init__(parent)
+        self.report = report
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        self.listings = {}   # 目录 -> 文件和子目录名集合
+
+    def add(self, directory):
+        try:
+            with os.scandir(directory) as it:
+                self.listings[directory] = {entry.name: entry.is_dir(follow_symlinks=False) for entry in it}
+        except OSError:
+            return
+        self.watcher.addPath(directory)
+
+    def remove_tree(self, directory):
+        prefix = directory + os.sep
+        paths = [path for path in self.listings if path == directory or path.startswith(prefix)]
+        for path in paths:
+            del self.listings[path]
+        if paths:
+            self.watcher.removePaths(paths)
+
+    def clear(self):
+        paths = self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
+        self.listings.clear()
+
+    def close(self):
+        self.clear()
+
+    def on_directory_changed(self, directory):
+        old = self.listings.get(directory)
+        if old is None:
+            return
+        try:
+            with os.scandir(directory) as it:
+                new = {entry.name: entry.is_dir(follow_symlinks=False) for entry in it}
+        except OSError:
+            new = {}
+        self.listings[directory] = new
+        for name in old.keys() - new.keys():
+            self.report(os.path.join(directory, name), False, old[name])
+        for name in new.keys() - old.keys():
+            self.report(os.path.join(directory, name), True, new[name])
+
+
+class FolderWatcher(QObject):
+    """监视文件夹（含子目录）中图片的新增、删除和改名，合并一段时间内的事件后发出增量
+
+    Linux 上使用 inotify（通过 ctypes 调用，无额外依赖），其他平台使用 QFileSystemWatcher。
+    同一路径在一段时间内的多个事件只保留最后的状态（先建后删的临时文件不会出现在结果中），
+    新建的子目录会加入监视，并把该目录和其中已有的图片作为新增报告；删除或移走的目录
+    立即移除其下的监视。事件队列溢出时发出 overflow，由使用者重新扫描。
+    """
+
+    changed = pyqtSignal(str, list, list)   # 文件夹, 新增或修改的图片路径和新建的目录, 删除的图片或目录路径
+    overflow = pyqtSignal(str)               # 文件夹
+
+    def __init__(self, delay=200, parent=None):
+        super().__init__(parent)
+        libc = _load_inotify()
+        self.backend = None
+        if libc is not None:
+            try:
+                self.backend = _InotifyBackend(libc, self.on_event, self)
+            except OSError:
+                self.backend = None
+        if self.backend is None:
+            self.backend = _QtBackend(self.on_event, self)
+        self.folder = None
+        self.pending = {}   # 路径 -> (是否存在, 是否目录)，保持最后一次事件
+        self.lost = False
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.flush)
+
+    def watch(self, folder, dirs):
+        """开始监视文件夹，dirs 为其下所有目录（通常取自扫描时记录的目录列表）"""
+        self.stop()
+        self.folder = folder
+        for directory in dirs:
+            self.backend.add(directory)
+
+    def stop(self):
+        self.timer.stop()
+        self.backend.clear()
+        self.folder = None
+        self.pending.clear()
+        self.lost = False
+
+    def close(self):
+        self.stop()
+        self.backend.close()
+
+    def on_event(self, path, exists, is_dir):
+        if self.folder is None:
+            return
+        if path is None:
+            self.lost = True
+        else:
+            if is_dir and not exists:
+                # 目录被删除或移走：其下的监视和尚未送出的事件都已失效
+                self.backend.remove_tree(path)
+                prefix = path + os.sep
+                for stale in [other for other in self.pending if other.startswith(prefix)]:
+                    del self.pending[stale]
+            self.pending[path] = (exists, is_dir)
+        if not self.timer.isActive():
+            # 不随后续事件重新计时，持续写入时也按固定间隔送出
+            self.timer.start()
+
+    def flush(self):
+        folder, pending, lost = self.folder, self.pending, self.lost
+        self.pending, self.lost = {}, False
+        if folder is None:
+            return
+        if lost:
+            self.overflow.emit(folder)
+            return
+        added, removed = [], []
+        for path, (exists, is_dir) in pending.items():
+            if not exists:
+                if is_dir or is_image(path):
+                    removed.append(path)
+            elif is_dir:
+                added.append(path)
+                added.extend(self.add_tree(path))
+            elif is_image(path):
+                added.append(path)
+        if added or removed:
+            self.changed.emit(folder, added, removed)
+
+    def add_tree(self, directory):
+        """监视新建（或移入）的目录树，返回其中已有的图片"""
+        images = []
+        stack = [directory]
+        while stack:
+            path = stack.pop()
+            self.backend.add(path)   # 先监视再列出，列出后才写入的文件也会有事件
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif is_image(entry.name):
+                            images.append(entry.path)
+            except OSError:
+                continue
+        return images
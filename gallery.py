@@ -0,0 +1,222 @@
+import os
+
+from PyQt5.QtWidgets import QListView, QAbstractItemView
+from PyQt5.QtGui import QPixmap, QColor, QBrush
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QPoint, QSize, QTimer
+
+from image_loader import ImageLoader
+from thumbnail_store import SLOT_SIZE, ThumbnailStore
+
+
+THUMBNAIL_SIZE = SLOT_SIZE  # 与缩略图库槽位一致（宽, 高）
+
+
+class ThumbnailModel(QAbstractListModel):
+    """缩略图列表模型
+
+    只保存路径列表（与浏览列表共享），缩略图由视图请求可见项时懒加载，
+    存放在按字节预算淘汰的缓存中，因此内存占用与文件夹大小无关。
+    """
+
+    def __init__(self, loader, parent=None):
+        super().__init__(parent)
+        self.loader = loader
+        self.paths = []
+        self._rows = {}  # 路径 -> 行号，用于解码完成后定位需要刷新的项
+        self.marks = {}  # 路径 -> 背景色（如检索排序的正确/错误匹配）
+        self.placeholder = QPixmap(*THUMBNAIL_SIZE)
+        self.placeholder.fill(QColor(60, 60, 60))
+        self.loader.image_ready.connect(self.on_thumbnail_ready)
+
+    def set_paths(self, paths, marks=None):
+        """替换路径列表（不复制，直接引用），marks 为 路径 -> 背景色"""
+        self.beginResetModel()
+        self.paths = paths
+        self.marks = marks or {}
+        self._rows = {path: i for i, path in enumerate(paths)}
+        self.endResetModel()
+
+    def extend(self, paths):
+        """在末尾追加路径（会修改共享的路径列表）"""
+        if not paths:
+            return
+        start = len(self.paths)
+        self.beginInsertRows(QModelIndex(), start, start + len(paths) - 1)
+        self.paths.extend(paths)
+        self._rows.update(zip(paths, range(start, start + len(paths))))
+        self.endInsertRows()
+
+    def insert(self, row, paths):
+        """在 row 处插入路径（会修改共享的路径列表）
+
+        之后的行号不在这里更新：一批插入/删除完成后调用一次 renumber()，
+        避免每次操作都重新编号后面所有的行。
+        """
+        if not paths:
+            return
+        self.beginInsertRows(QModelIndex(), row, row + len(paths) - 1)
+        self.paths[row:row] = paths
+        self.endInsertRows()
+
+    def remove(self, row, count):
+        """删除 [row, row + count) 的路径（会修改共享的路径列表），之后需调用 renumber()"""
+        if count <= 0:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        for path in self.paths[row:row + count]:
+            self._rows.pop(path, None)
+            self.marks.pop(path, None)
+        del self.paths[row:row + count]
+        self.endRemoveRows()
+
+    def renumber(self, start):
+        """重新记录 start 及之后各行的行号"""
+        self._rows.update(zip(self.paths[start:], range(start, len(self.paths))))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        path = self.paths[index.row()]
+        if role == Qt.DecorationRole:
+            pixmap = self.loader.get(path)
+            return pixmap if pixmap is not None else self.placeholder
+        if role == Qt.DisplayRole:
+            return os.path.basename(path)
+        if role == Qt.ToolTipRole:
+            return path
+        if role == Qt.BackgroundRole and path in self.marks:
+            return QBrush(self.marks[path])
+        return None
+
+    def on_thumbnail_ready(self, path, pixmap):
+        row = self._rows.get(path)
+        if row is not None and row < len(self.paths) and self.paths[row] == path:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class GalleryView(QListView):
+    """虚拟化缩略图画廊
+
+    QListView 只为可见区域绘制项，不创建逐项控件；滚动停止后只为可见行
+    （加上前后一屏的余量）提交缩略图解码，划过的行的排队任务会被取消。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.loader = ImageLoader(max_bytes=64 * 1024 * 1024, size=THUMBNAIL_SIZE, parent=self)
+        self.thumbnail_model = ThumbnailModel(self.loader, self)
+        self.thumbnail_store = None
+        self.setModel(self.thumbnail_model)
+
+        self.setViewMode(QListView.IconMode)
+        self.setIconSize(QSize(*THUMBNAIL_SIZE))
+        self.setGridSize(QSize(THUMBNAIL_SIZE[0] + 24, THUMBNAIL_SIZE[1] + 28))
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(2000)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setWrapping(True)
+        self.setTextElideMode(Qt.ElideMiddle)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+
+        # 滚动时合并请求，停下后再为可见区域加载缩略图
+        self.visible_timer = QTimer(self)
+        self.visible_timer.setSingleShot(True)
+        self.visible_timer.setInterval(30)
+        self.visible_timer.timeout.connect(self.load_visible_thumbnails)
+        self.verticalScrollBar().valueChanged.connect(self.visible_timer.start)
+        self.thumbnail_model.modelReset.connect(self.visible_timer.start)
+        self.thumbnail_model.rowsInserted.connect(self.visible_timer.start)
+        self.thumbnail_model.rowsRemoved.connect(self.visible_timer.start)
+        
+        # 解码线程写入缩略图库的新缩略图，定期写回索引
+        self.store_timer = QTimer(self)
+        self.store_timer.setInterval(5000)
+        self.store_timer.timeout.connect(self.save_thumbnails)
+        self.store_timer.start()
+
+    def set_paths(self, paths, marks=None):
+        self.thumbnail_model.set_paths(paths, marks)
+
+    def set_dataset_root(self, root):
+        """数据集根目录变化时打开对应的缩略图库，不存在时新建，解码的缩略图写入库中"""
+        if self.thumbnail_store is not None:
+            if self.thumbnail_store.root == os.path.abspath(root):
+                return
+            self.loader.cancel()
+            self.save_thumbnails()
+            self.thumbnail_store.close()   # 正在运行的解码任务查不到缩略图时直接解码
+        store = ThumbnailStore(root)
+        if not store.open():
+            store = ThumbnailStore(root)   # 丢弃无效索引读到一半的状态
+        self.thumbnail_store = store
+        self.loader.decode = store.decode
+        self.loader.cache.clear()
+    
+    def save_thumbnails(self):
+        """把新写入的缩略图的索引保存到磁盘"""
+        store = self.thumbnail_store
+        if store is not None and store.dirty and store.writable:
+            try:
+                store.save()
+            except OSError:
+                store.writable = False
+
+    def extend(self, paths):
+        self.thumbnail_model.extend(paths)
+
+    def insert(self, row, paths):
+        self.thumbnail_model.insert(row, paths)
+
+    def remove(self, row, count):
+        self.thumbnail_model.remove(row, count)
+
+    def renumber(self, start):
+        self.thumbnail_model.renumber(start)
+
+    def invalidate(self, paths):
+        """文件被修改：丢弃旧缩略图，重新加载可见项"""
+        self.loader.invalidate(paths)
+        self.visible_timer.start()
+
+    def select_row(self, row):
+        """选中并滚动到指定行"""
+        if 0 <= row < self.thumbnail_model.rowCount():
+            index = self.thumbnail_model.index(row)
+            self.setCurrentIndex(index)
+            self.scrollTo(index)
+
+    def visible_rows(self):
+        """当前视口内可见的行范围 [first, last]（按统一的网格尺寸计算）"""
+        count = self.thumbnail_model.rowCount()
+        if count == 0:
+            return 0, -1
+        grid = self.gridSize()
+        rect = self.viewport().rect()
+        columns = max(1, rect.width() // grid.width())
+        first = self.indexAt(QPoint(grid.width() // 2, grid.height() // 2))
+        first_row = first.row() if first.isValid() else 0
+        first_row -= first_row % columns
+        visible_lines = rect.height() // grid.height() + 2
+        return first_row, min(count - 1, first_row + columns * visible_lines - 1)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.visible_timer.start()
+
+    def load_visible_thumbnails(self):
+        """为可见行及前后一屏提交解码，取消其余排队任务"""
+        first, last = self.visible_rows()
+        if last < first:
+            return
+        page = last - first + 1
+        paths = self.thumbnail_model.paths
+        visible = paths[first:last + 1]
+        margin = paths[last + 1:last + 1 + page] + paths[max(0, first - page):first]
+        self.loader.prefetch(visible + margin)
@@ -0,0 +1,193 @@
+from collections import OrderedDict
+
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QSize, Qt, QBuffer, QByteArray, QIODevice, pyqtSignal
+
+import vfs
+from profiling import PROFILER
+
+
+def read_bytes(path):
+    """读取图片文件的全部字节（打包数据集内的路径从内存映射的分片读取）"""
+    return vfs.read_bytes(path)
+
+
+def decode_image(path, size=None):
+    """解码图片为 QImage（可在工作线程中调用），size 不为空时按比例缩小解码
+
+    先读出文件字节再从内存解码，读盘和解码分别计时。
+    """
+    with PROFILER.block('read'):
+        try:
+            data = read_bytes(path)
+        except (OSError, ValueError):
+            return QImage()
+    with PROFILER.block('decode'):
+        return decode_bytes(data, size)
+
+
+def decode_bytes(data, size=None):
+    """从内存中的图片字节解码为 QImage"""
+    buffer = QBuffer()
+    buffer.setData(QByteArray(data))
+    buffer.open(QIODevice.ReadOnly)
+    reader = QImageReader(buffer)
+    reader.setAutoTransform(True)
+    if size is not None:
+        original = reader.size()
+        if original.isValid():
+            reader.setScaledSize(original.scaled(size, Qt.KeepAspectRatio).boundedTo(original))
+    return reader.read()
+
+
+def pixmap_bytes(pixmap):
+    """估算 QPixmap 占用的字节数"""
+    return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class LRUPixmapCache:
+    """按字节预算淘汰的 LRU 图片缓存"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """命中时返回缓存项并标记为最近使用，否则返回 None"""
+        item = self._items.get(key)
+        if item is None:
+            return None
+        self._items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, pixmap):
+        """加入缓存，超出字节预算时淘汰最久未使用的项"""
+        size = pixmap_bytes(pixmap)
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        if size > self.max_bytes:
+            return
+        self._items[key] = (pixmap, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._items.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def discard(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.total_bytes -= item[1]
+
+    def clear(self):
+        self._items.clear()
+        self.total_bytes = 0
+
+
+class _DecodeSignals(QObject):
+    decoded = pyqtSignal(object, QImage)
+
+
+class DecodeTask(QRunnable):
+    """在线程池中解码单张图片，结果通过信号回到 GUI 线程"""
+
+    def __init__(self, path, size=None, decode=decode_image):
+        super().__init__()
+        self.path = path
+        self.size = size
+        self.decode = decode
+        self.cancelled = False
+        self.priority = 0
+        self.signals = _DecodeSignals()
+
+    def run(self):
+        if self.cancelled:
+            return
+        image = self.decode(self.path, self.size)
+        if not self.cancelled:
+            self.signals.decoded.emit(self.path, image)
+
+
+class ImageLoader(QObject):
+    """后台解码图片并缓存为 QPixmap
+
+    request() 以最高优先级解码当前图片，prefetch() 解码前后若干张，
+    不在新窗口内的排队任务会被取消，解码完成后发出 image_ready 信号。
+    decode 可替换为其他解码函数（如缩略图库），签名与 decode_image 相同。
+    """
+
+    image_ready = pyqtSignal(str, QPixmap)   # 路径, 图片（解码失败时为空图）
+
+    CURRENT_PRIORITY = 1000
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_threads=4, size=None, parent=None):
+        super().__init__(parent)
+        self.cache = LRUPixmapCache(max_bytes)
+        self.size = QSize(size[0], size[1]) if size is not None else None
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.decode = decode_image
+        self._pending = {}  # 路径 -> DecodeTask
+
+    def get(self, path):
+        """从缓存中取图片，未命中返回 None"""
+        return self.cache.get(path)
+
+    def request(self, path, priority=CURRENT_PRIORITY):
+        """请求解码图片，已缓存时立即发出 image_ready"""
+        pixmap = self.cache.get(path)
+        if pixmap is not None:
+            self.image_ready.emit(path, pixmap)
+            return
+        self._submit(path, priority)
+
+    def prefetch(self, paths, keep=()):
+        """按顺序（越靠前优先级越高）预取图片，并取消不在 paths 和 keep 中的排队任务"""
+        wanted = set(paths) | set(keep)
+        self.cancel(path for path in list(self._pending) if path not in wanted)
+        for rank, path in enumerate(paths):
+            if path not in self.cache:
+                self._submit(path, len(paths) - rank)
+
+    def cancel(self, paths=None):
+        """取消指定（默认全部）未完成的解码任务，排队中的任务出队后直接返回"""
+        for path in list(self._pending if paths is None else paths):
+            task = self._pending.pop(path, None)
+            if task is not None:
+                task.cancelled = True
+
+    def invalidate(self, paths):
+        """文件被修改或删除：丢弃缓存的图片和未完成的解码"""
+        paths = list(paths)
+        self.cancel(paths)
+        for path in paths:
+            self.cache.discard(path)
+
+    def _submit(self, path, priority):
+        task = self._pending.get(path)
+        if task is not None:
+            if task.priority >= priority:
+                return
+            # 以更高优先级重新提交，旧任务作废
+            task.cancelled = True
+        task = DecodeTask(path, self.size, self.decode)
+        task.priority = priority
+        task.signals.decoded.connect(self._on_decoded)
+        self._pending[path] = task
+        self.pool.start(task, priority)
+
+    def _on_decoded(self, path, image):
+        if path not in self._pending:
+            return
+        del self._pending[path]
+        pixmap = QPixmap.fromImage(image)
+        if not pixmap.isNull():
+            self.cache.put(path, pixmap)
+        self.image_ready.emit(path, pixmap)
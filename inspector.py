@@ -0,0 +1,102 @@
+from collections import OrderedDict
+
+import numpy as np
+from PyQt5.QtGui import QImage
+
+
+HISTOGRAM_BINS = 16
+
+
+class PixelInspector:
+    """已解码图片的 NumPy 视图，用于读取像素值和区域统计
+
+    每张图片只在第一次检查时把 QPixmap 转换为一次 QImage，之后的悬停和框选都直接索引
+    同一个零拷贝数组（不再每次点击都 toImage()）。显示同一图片的多个面板共用一个实例。
+    """
+
+    _instances = OrderedDict()   # QPixmap.cacheKey() -> PixelInspector
+    MAX_INSTANCES = 4
+
+    def __init__(self, pixmap):
+        image = pixmap.toImage()
+        if image.format() not in (QImage.Format_RGB32, QImage.Format_ARGB32):
+            image = image.convertToFormat(QImage.Format_ARGB32)
+        self.image = image   # 数组引用其内存，保持存活
+        bits = image.constBits()
+        bits.setsize(image.sizeInBytes())
+        rows = np.frombuffer(bits, dtype=np.uint8).reshape(image.height(), image.bytesPerLine())
+        bgra = rows[:, :image.width() * 4].reshape(image.height(), image.width(), 4)
+        # 小端序下 32 位像素在内存中为 B, G, R, A，反向切片得到 RGB 视图（不复制）
+        self.rgb = bgra[..., 2::-1]
+        self.has_alpha = image.hasAlphaChannel()
+        self.alpha = bgra[..., 3]
+
+    @classmethod
+    def for_pixmap(cls, pixmap):
+        """取（或建立）图片对应的检查器"""
+        key = pixmap.cacheKey()
+        inspector = cls._instances.get(key)
+        if inspector is None:
+            inspector = cls._instances[key] = cls(pixmap)
+            while len(cls._instances) > cls.MAX_INSTANCES:
+                cls._instances.popitem(last=False)
+        else:
+            cls._instances.move_to_end(key)
+        return inspector
+
+    @property
+    def width(self):
+        return self.rgb.shape[1]
+
+    @property
+    def height(self):
+        return self.rgb.shape[0]
+
+    def pixel(self, x, y):
+        """(R, G, B) 或 (R, G, B, A)，坐标超出图片时返回 None"""
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        value = tuple(int(v) for v in self.rgb[y, x])
+        return value + (int(self.alpha[y, x]),) if self.has_alpha else value
+
+    def region_stats(self, x0, y0, x1, y1):
+        """区域 [x0, x1) x [y0, y1) 内各通道的统计，区域为空时返回 None"""
+        x0, x1 = max(0, x0), min(self.width, x1)
+        y0, y1 = max(0, y0), min(self.height, y1)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        region = self.rgb[y0:y1, x0:x1].reshape(-1, 3)
+        values = region.astype(np.float32)
+        histogram = np.stack([np.bincount(region[:, c] // (256 // HISTOGRAM_BINS), minlength=HISTOGRAM_BINS)
+                              for c in range(3)])
+        return {
+            'rect': (x0, y0, x1 - x0, y1 - y0),
+            'count': len(region),
+            'mean': values.mean(axis=0),
+            'std': values.std(axis=0),
+            'min': region.min(axis=0),
+            'max': region.max(axis=0),
+            'histogram': histogram,
+        }
+
+
+def format_pixel(x, y, value):
+    channels = 'RGBA' if len(value) == 4 else 'RGB'
+    return f"({x}, {y}) {channels}({', '.join(str(v) for v in value)})"
+
+
+def format_region(stats):
+    """区域统计的文字报告，直方图每个通道一行"""
+    x, y, width, height = stats['rect']
+    lines = [f"区域 ({x}, {y}) {width}x{height}, {stats['count']} 像素"]
+    for c, name in enumerate('RGB'):
+        lines.append(f"{name}: 均值 {stats['mean'][c]:.2f}  标准差 {stats['std'][c]:.2f}  "
+                     f"范围 {stats['min'][c]}-{stats['max'][c]}")
+    blocks = ' ▁▂▃▄▅▆▇█'
+    lines.append('')
+    lines.append(f"直方图 ({HISTOGRAM_BINS} 档, 0-255):")
+    for c, name in enumerate('RGB'):
+        counts = stats['histogram'][c]
+        peak = counts.max() or 1
+        lines.append(f"{name} " + ''.join(blocks[int(round(8 * n / peak))] for n in counts))
+    return '\n'.join(lines)
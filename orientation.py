@@ -0,0 +1,141 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+# 朝向编码，与检索栏 orientation_combo 的选项顺序一致，0 表示未标注 / 全部
+ORIENTATIONS = ["全部", "正面", "背面", "左侧", "右侧"]
+UNLABELED = 0
+
+ORIENTATION_FILENAME = 'orientation.txt'
+
+_LABEL_CODES = {
+    '正面': 1, 'front': 1, 'f': 1,
+    '背面': 2, 'back': 2, 'b': 2,
+    '左侧': 3, 'left': 3, 'l': 3,
+    '右侧': 4, 'right': 4, 'r': 4,
+}
+
+
+def parse_orientation(label):
+    """把标注文本（数字 1-4、英文或中文）转为朝向编码，无法识别时返回 None"""
+    label = label.strip().lower()
+    if label.isdigit():
+        code = int(label)
+        return code if 0 <= code < len(ORIENTATIONS) else None
+    return _LABEL_CODES.get(label)
+
+
+def orientation_path(root):
+    """朝向标注文件路径：数据集根目录下的 orientation.txt，每行 "<相对根目录的路径> <朝向>" """
+    return os.path.join(root, ORIENTATION_FILENAME)
+
+
+class LabelKeys:
+    """标注键 -> 索引行号
+
+    键为相对数据集根目录的路径（如 bounding_box_train/0002_c1s1_000451_03.jpg）；
+    为兼容旧文件也接受只有文件名的键，但只在该文件名在数据集中唯一时才采用，
+    不同划分中的同名文件不会互相覆盖。
+    """
+
+    def __init__(self, index):
+        names = [str(name) for name in index.names]
+        self.rows = {os.path.join(index.dirs[dir_id], name): row
+                     for row, (dir_id, name) in enumerate(zip(index.dir_id, names))}
+        counts = {}
+        for name in names:
+            counts[name] = counts.get(name, 0) + 1
+        self.unique_names = {name: row for row, name in enumerate(names) if counts[name] == 1}
+
+    def row(self, key):
+        """键对应的行号，不存在或文件名不唯一时返回 None"""
+        key = os.path.normpath(key)
+        if os.sep in key:
+            return self.rows.get(key)
+        return self.rows.get(key, self.unique_names.get(key))
+
+
+def load_orientations(index, path=None, keys=None):
+    """读取朝向标注文件，返回与索引行对齐的 uint8 数组（未标注为 0），文件不存在时返回 None"""
+    path = path or orientation_path(index.root)
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+
+    keys = keys or LabelKeys(index)
+    labels = np.zeros(len(index), dtype=np.uint8)
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        row = keys.row(parts[0])
+        code = parse_orientation(parts[1])
+        if row is not None and code is not None:
+            labels[row] = code
+    return labels
+
+
+class BitmapIndex:
+    """按朝向、摄像头、pid 预先计算的位图索引
+
+    每个取值对应一个 np.packbits 压缩的位图（每张图片 1 bit），组合检索条件时
+    直接对位图按位与，再把结果展开为行号，作为新的浏览列表。
+    pid 数量多，位图在第一次使用时生成并按 LRU 保留。
+
+    标注模式的 pid 修正以替换后的 pid 列给出，标为坏图的行从所有检索结果中排除。
+    orientations 为 None 表示没有朝向标注。
+    """
+
+    def __init__(self, index, orientations, pids=None, bad=None, max_pid_bitmaps=256):
+        self.index = index
+        self.size = len(index)
+        self.orientations = orientations
+        # 没有实际修正时沿用索引的 pid 列，pid 位图仍从哈希索引生成
+        self.pids = pids if pids is not None and not np.array_equal(pids, index.pid) else index.pid
+        self.valid_bitmap = np.packbits(~bad) if bad is not None and bad.any() else None
+        self.has_corrections = self.pids is not index.pid or self.valid_bitmap is not None
+        self.max_pid_bitmaps = max_pid_bitmaps
+        self.orientation_bitmaps = {code: np.packbits(orientations == code)
+                                    for code in range(1, len(ORIENTATIONS))} if orientations is not None else {}
+        self.camera_bitmaps = {camera: np.packbits(index.camera == camera) for camera in index.cameras()}
+        self._pid_bitmaps = OrderedDict()
+
+    def pid_bitmap(self, pid):
+        bitmap = self._pid_bitmaps.get(pid)
+        if bitmap is None:
+            if self.pids is self.index.pid:
+                mask = np.zeros(self.size, dtype=bool)
+                mask[self.index.query(pid=pid)] = True
+            else:
+                mask = self.pids == pid
+            bitmap = np.packbits(mask)
+            self._pid_bitmaps[pid] = bitmap
+            while len(self._pid_bitmaps) > self.max_pid_bitmaps:
+                self._pid_bitmaps.popitem(last=False)
+        else:
+            self._pid_bitmaps.move_to_end(pid)
+        return bitmap
+
+    def select(self, pid=None, camera=None, orientation=UNLABELED):
+        """组合 pid ∧ 摄像头 ∧ 朝向 条件，返回升序的行号数组（未指定的条件不参与过滤）"""
+        bitmaps = []
+        if pid is not None:
+            bitmaps.append(self.pid_bitmap(pid))
+        if camera is not None:
+            bitmaps.append(self.camera_bitmaps.get(camera))
+        if orientation != UNLABELED:
+            bitmaps.append(self.orientation_bitmaps.get(orientation))
+        if any(bitmap is None for bitmap in bitmaps):
+            return np.zeros(0, dtype=np.int64)
+        if self.valid_bitmap is not None:
+            bitmaps.append(self.valid_bitmap)
+        if not bitmaps:
+            return np.arange(self.size, dtype=np.int64)
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = np.bitwise_and(result, bitmap)
+        return np.flatnonzero(np.unpackbits(result, count=self.size))
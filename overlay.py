@@ -0,0 +1,226 @@
+import io
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+from PyQt5.QtCore import QPointF, Qt
+from PyQt5.QtGui import QColor, QImage, QPainter, QPen, QPixmap
+
+from inspector import PixelInspector
+from vfs import file_stamp, read_bytes
+
+
+# 叠加层：名称 -> (显示名, 旁路目录后缀, 扩展名)
+# 图片 <划分>/<文件名>.jpg 的叠加层文件为 <划分><后缀>/<文件名><扩展名>，
+# 如 bounding_box_train_mask/0002_c1s1_000451_03.png，与图片目录并列，不会混入浏览列表
+MASK, HEATMAP, KEYPOINTS = 'mask', 'heatmap', 'keypoints'
+LAYERS = OrderedDict([
+    (MASK, ('人体解析', '_mask', '.png')),
+    (HEATMAP, ('注意力图', '_heatmap', '.npy')),
+    (KEYPOINTS, ('关键点', '_keypoints', '.json')),
+])
+
+# COCO 17 点骨架
+COCO_SKELETON = [(15, 13), (13, 11), (16, 14), (14, 12), (11, 12), (5, 11), (6, 12), (5, 6), (5, 7),
+                 (6, 8), (7, 9), (8, 10), (1, 2), (0, 1), (0, 2), (1, 3), (2, 4), (3, 5), (4, 6)]
+KEYPOINT_THRESHOLD = 0.2
+
+
+def sidecar_path(path, layer):
+    """图片对应的叠加层文件路径"""
+    _, suffix, extension = LAYERS[layer]
+    folder, name = os.path.split(path)
+    return os.path.join(folder.rstrip(os.sep) + suffix, os.path.splitext(name)[0] + extension)
+
+
+def _voc_palette(count=256):
+    """PASCAL VOC 调色板：按类别编号的位交错生成颜色，0 为背景"""
+    labels = np.arange(count)
+    palette = np.zeros((count, 3), dtype=np.uint8)
+    for shift in range(8):
+        for channel in range(3):
+            palette[:, channel] |= (((labels >> channel) & 1) << (7 - shift)).astype(np.uint8)
+        labels = labels >> 3
+    return palette
+
+
+PALETTE = _voc_palette()
+
+
+def jet(values):
+    """[0, 1] 数组 -> jet 伪彩色 (..., 3) float32"""
+    x = values[..., None] * 4 - np.array([3, 2, 1], dtype=np.float32)
+    return np.clip(1.5 - np.abs(x), 0, 1) * 255
+
+
+def _resize_nearest(array, height, width):
+    rows = np.arange(height) * array.shape[0] // height
+    cols = np.arange(width) * array.shape[1] // width
+    return array[rows[:, None], cols]
+
+
+def _resize_bilinear(array, height, width):
+    y = np.clip((np.arange(height) + 0.5) * array.shape[0] / height - 0.5, 0, array.shape[0] - 1)
+    x = np.clip((np.arange(width) + 0.5) * array.shape[1] / width - 0.5, 0, array.shape[1] - 1)
+    y0, x0 = y.astype(int), x.astype(int)
+    y1, x1 = np.minimum(y0 + 1, array.shape[0] - 1), np.minimum(x0 + 1, array.shape[1] - 1)
+    wy, wx = (y - y0)[:, None], (x - x0)[None, :]
+    top = array[y0[:, None], x0] * (1 - wx) + array[y0[:, None], x1] * wx
+    bottom = array[y1[:, None], x0] * (1 - wx) + array[y1[:, None], x1] * wx
+    return top * (1 - wy) + bottom * wy
+
+
+def _load_mask(data, height, width):
+    """类别编号掩码（调色板 PNG 取索引，其他格式取灰度），背景 0 透明"""
+    image = QImage.fromData(data)
+    if image.isNull():
+        return None
+    if image.format() != QImage.Format_Indexed8:
+        image = image.convertToFormat(QImage.Format_Grayscale8)
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    labels = np.frombuffer(bits, dtype=np.uint8).reshape(image.height(), image.bytesPerLine())[:, :image.width()]
+    labels = _resize_nearest(labels, height, width)
+    return PALETTE[labels].astype(np.float32), (labels > 0).astype(np.float32)
+
+
+def _load_heatmap(data, height, width):
+    """二维（或 1xHxW）响应图，线性缩放到图片大小后归一化，响应越高越不透明"""
+    heatmap = np.squeeze(np.load(io.BytesIO(data), allow_pickle=False)).astype(np.float32)
+    if heatmap.ndim != 2:
+        return None
+    heatmap = _resize_bilinear(heatmap, height, width)
+    low, high = float(heatmap.min()), float(heatmap.max())
+    heatmap = (heatmap - low) / (high - low) if high > low else np.zeros_like(heatmap)
+    return jet(heatmap), heatmap
+
+
+def _parse_keypoints(document):
+    """接受 [[x, y(, score)], ...]、扁平的 [x, y, score, ...] 或 {"keypoints": ..., "skeleton": ...}"""
+    skeleton = None
+    if isinstance(document, dict):
+        skeleton = document.get('skeleton')
+        document = document.get('keypoints', [])
+    points = np.asarray(document, dtype=np.float32)
+    if points.ndim == 1:
+        points = points.reshape(-1, 3)
+    if points.ndim != 2 or points.shape[1] < 2:
+        return None, None
+    if points.shape[1] == 2:
+        points = np.hstack([points, np.ones((len(points), 1), dtype=np.float32)])
+    if skeleton is None and len(points) == 17:
+        skeleton = COCO_SKELETON
+    return points[:, :3], skeleton or []
+
+
+def _load_keypoints(data, height, width):
+    """关键点和骨架用 QPainter 光栅化为透明图层"""
+    points, skeleton = _parse_keypoints(json.loads(data.decode('utf-8')))
+    if points is None:
+        return None
+    image = QImage(width, height, QImage.Format_ARGB32)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    visible = points[:, 2] > KEYPOINT_THRESHOLD
+    painter.setPen(QPen(QColor(0, 255, 255), max(1.0, width / 64)))
+    for a, b in skeleton:
+        if a < len(points) and b < len(points) and visible[a] and visible[b]:
+            painter.drawLine(QPointF(*points[a, :2]), QPointF(*points[b, :2]))
+    radius = max(1.5, width / 40)
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(QColor(255, 64, 64))
+    for x, y, _ in points[visible]:
+        painter.drawEllipse(QPointF(x, y), radius, radius)
+    painter.end()
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    bgra = np.frombuffer(bits, dtype=np.uint8).reshape(height, image.bytesPerLine())[:, :width * 4]
+    bgra = bgra.reshape(height, width, 4)
+    return bgra[..., 2::-1].astype(np.float32), bgra[..., 3].astype(np.float32) / 255
+
+
+LOADERS = {MASK: _load_mask, HEATMAP: _load_heatmap, KEYPOINTS: _load_keypoints}
+
+
+class OverlayCache:
+    """叠加层的读取、着色和合成缓存
+
+    每个叠加层文件只在第一次用到（或文件变化）时读取并着色为 (颜色, 透明度) 数组；
+    合成结果按 (图片, 图层组合, 不透明度) 缓存为 QPixmap。切换图层或调整不透明度时
+    从已着色的图层重新混合，不会再次读取文件或解码图片；原图像素取自 PixelInspector
+    的零拷贝视图。
+    """
+
+    MAX_LAYERS = 64
+    MAX_COMPOSITES = 32
+
+    def __init__(self):
+        self.layers = OrderedDict()       # (图片路径, 图层) -> (文件标记, (颜色, 透明度) 或 None)
+        self.composites = OrderedDict()   # (图片路径, 原图 cacheKey, 图层, 不透明度, 文件标记) -> QPixmap
+
+    def available(self, path):
+        """图片存在叠加层文件的图层列表"""
+        return [layer for layer in LAYERS if self._stamp(path, layer) is not None]
+
+    @staticmethod
+    def _stamp(path, layer):
+        try:
+            return file_stamp(sidecar_path(path, layer))
+        except OSError:
+            return None
+
+    def layer(self, path, layer, height, width):
+        """已着色的图层 (颜色 HxWx3, 透明度 HxW)，没有叠加层文件或无法读取时返回 None"""
+        stamp = self._stamp(path, layer)
+        if stamp is None:
+            return None
+        key = (path, layer)
+        entry = self.layers.get(key)
+        if entry is not None and entry[0] == (stamp, height, width):
+            self.layers.move_to_end(key)
+            return entry[1]
+        try:
+            colored = LOADERS[layer](read_bytes(sidecar_path(path, layer)), height, width)
+        except (OSError, ValueError, TypeError, UnicodeDecodeError):
+            colored = None
+        self.layers[key] = ((stamp, height, width), colored)
+        while len(self.layers) > self.MAX_LAYERS:
+            self.layers.popitem(last=False)
+        return colored
+
+    def composite(self, path, pixmap, layers, opacity):
+        """原图叠加所选图层（按 LAYERS 的顺序自下而上），opacity 为 0-100；没有可用图层时返回原图"""
+        if pixmap.isNull() or not layers or opacity <= 0:
+            return pixmap
+        layers = tuple(layer for layer in LAYERS if layer in layers)
+        stamps = tuple(self._stamp(path, layer) for layer in layers)
+        if not any(stamps):
+            return pixmap
+        key = (path, pixmap.cacheKey(), layers, opacity, stamps)
+        result = self.composites.get(key)
+        if result is not None:
+            self.composites.move_to_end(key)
+            return result
+
+        rgb = PixelInspector.for_pixmap(pixmap).rgb
+        height, width = rgb.shape[:2]
+        out = rgb.astype(np.float32)
+        for layer in layers:
+            colored = self.layer(path, layer, height, width)
+            if colored is None:
+                continue
+            color, alpha = colored
+            alpha = (alpha * (opacity / 100))[..., None]
+            out = out * (1 - alpha) + color * alpha   # 逐层 alpha 混合
+        bgra = np.empty((height, width, 4), dtype=np.uint8)
+        bgra[..., 2::-1] = np.clip(out + 0.5, 0, 255)
+        bgra[..., 3] = 255
+        # QImage 只引用 bgra 的内存，fromImage 也可能共享而不复制，先 copy() 再转换
+        image = QImage(bgra.data, width, height, width * 4, QImage.Format_RGB32).copy()
+        result = QPixmap.fromImage(image)
+        self.composites[key] = result
+        while len(self.composites) > self.MAX_COMPOSITES:
+            self.composites.popitem(last=False)
+        return result
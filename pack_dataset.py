@@ -0,0 +1,114 @@
+import argparse
+import os
+import shutil
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dataset_index import detect_format
+from folder_scanner import scan_image_files
+from vfs import PACK_SUFFIX, PACK_VERSION, member_sort_key
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _read_in_order(executor, paths, window):
+    """按顺序返回各文件的内容，最多 window 个读取同时进行或等待写入，写入慢时内存占用有上限"""
+    pending = deque()
+    for path in paths:
+        pending.append(executor.submit(_read, path))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def pack_dataset(root, out, shard_bytes=256 * 1024 * 1024, workers=16, progress=None):
+    """把数据集目录打包为 out（.reidpack 目录），返回打包的图片数量
+
+    图片按浏览顺序拼接写入分片，每个分片约 shard_bytes 字节；
+    先写到临时目录，完成后再替换，中断时不会留下不完整的打包文件。
+    读取小文件用线程池并发进行，以掩盖网络存储上的单文件延迟；预读的文件数限制为 workers * 4。
+    """
+    root = os.path.abspath(root)
+    paths = [path for batch in scan_image_files(root) for path in batch]
+    rels = sorted((os.path.relpath(path, root) for path in paths), key=member_sort_key)
+    parse = detect_format(root).parser(root)
+
+    tmp_dir = out + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    count = len(rels)
+    shard = np.zeros(count, dtype=np.int32)
+    offset = np.zeros(count, dtype=np.int64)
+    length = np.zeros(count, dtype=np.int64)
+    fields = np.zeros((count, 5), dtype=np.int64)
+    parsed = np.zeros(count, dtype=bool)
+    shard_names = []
+
+    f = None
+    position = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            paths = (os.path.join(root, rel) for rel in rels)
+            for i, data in enumerate(_read_in_order(executor, paths, workers * 4)):
+                if f is None or position + len(data) > shard_bytes and position > 0:
+                    if f is not None:
+                        f.close()
+                    shard_names.append(f'shard_{len(shard_names):03d}.bin')
+                    f = open(os.path.join(tmp_dir, shard_names[-1]), 'wb')
+                    position = 0
+                f.write(data)
+                shard[i], offset[i], length[i] = len(shard_names) - 1, position, len(data)
+                position += len(data)
+                result = parse(os.path.basename(rels[i]))
+                if result is not None:
+                    fields[i] = result
+                    parsed[i] = True
+                if progress is not None and (i + 1) % 1000 == 0:
+                    progress(i + 1, count)
+    finally:
+        if f is not None:
+            f.close()
+
+    with open(os.path.join(tmp_dir, 'index.npz'), 'wb') as index_file:
+        np.savez(index_file, version=np.array(PACK_VERSION), paths=np.array(rels, dtype=str),
+                 shard=shard, offset=offset, length=length, fields=fields, parsed=parsed,
+                 shard_names=np.array(shard_names, dtype=str))
+    if os.path.exists(out):
+        shutil.rmtree(out)
+    os.replace(tmp_dir, out)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把数据集目录打包为少数几个分片文件（.reidpack），浏览时按内存映射读取')
+    parser.add_argument('root', help='数据集根目录')
+    parser.add_argument('-o', '--out', help=f'输出路径（默认为 <根目录>{PACK_SUFFIX}）')
+    parser.add_argument('--shard-mb', type=int, default=256, help='每个分片的大小 (MB)')
+    parser.add_argument('--workers', type=int, default=16, help='读取线程数')
+    args = parser.parse_args(argv)
+
+    out = os.path.abspath(args.out or args.root.rstrip(os.sep) + PACK_SUFFIX)
+    if not out.endswith(PACK_SUFFIX):
+        out += PACK_SUFFIX
+    start = time.perf_counter()
+
+    def progress(done, total):
+        sys.stderr.write(f'\r打包: {done}/{total}')
+        sys.stderr.flush()
+
+    count = pack_dataset(args.root, out, args.shard_mb * 1024 * 1024, args.workers, progress)
+    sys.stderr.write('\n')
+    size = sum(os.path.getsize(os.path.join(out, name)) for name in os.listdir(out))
+    print(f'打包 {count} 张图片，共 {size / 1024 / 1024:.1f} MB，用时 {time.perf_counter() - start:.1f}s: {out}')
+
+
+if __name__ == '__main__':
+    main()
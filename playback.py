@@ -0,0 +1,102 @@
+import numpy as np
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal
+from PyQt5.QtGui import QPixmap
+
+
+def tracklets(index, pid):
+    """行人的轨迹列表：按 (摄像头, 序列) 分组，组内按帧号排序，返回行号数组列表
+
+    Market 的序列和 MARS 的轨迹编号都存放在 sequence 字段中。
+    """
+    rows = index.query(pid=pid)
+    if len(rows) == 0:
+        return []
+    rows = rows[np.lexsort((index.frame[rows], index.sequence[rows], index.camera[rows]))]
+    keys = index.camera[rows].astype(np.int64) * 65536 + index.sequence[rows]
+    return np.split(rows, np.flatnonzero(np.diff(keys)) + 1)
+
+
+class TrackletPlayer(QObject):
+    """按固定帧率在多个面板中播放轨迹
+
+    每个面板一条帧路径列表，只保存路径，不预先解码整条轨迹。定时器每一拍显示各面板的下一帧，
+    并通过 ImageLoader 预取之后 lookahead 拍的帧（越近优先级越高）；
+    到拍时还没解码好的帧记为丢帧，不等待，保证播放节奏。
+    """
+
+    frame_ready = pyqtSignal(int, str, QPixmap)   # 面板, 路径, 图片
+    progress = pyqtSignal(str)                     # 播放状态摘要
+    finished = pyqtSignal()
+
+    def __init__(self, loader, lookahead=16, parent=None):
+        super().__init__(parent)
+        self.loader = loader
+        self.lookahead = lookahead
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.title = ''
+        self.sequences = []   # 每个面板的帧路径列表
+        self.position = 0     # 当前拍
+        self.shown = 0
+        self.dropped = 0
+
+    def is_playing(self):
+        return self.timer.isActive()
+
+    def start(self, sequences, fps=10, title=''):
+        """开始播放，sequences 为每个面板的帧路径列表"""
+        self.stop()
+        self.sequences = [list(sequence) for sequence in sequences]
+        self.title = title
+        self.position = 0
+        self.shown = 0
+        self.dropped = 0
+        self.prefetch()
+        self.set_fps(fps)
+        self.timer.start()
+
+    def set_fps(self, fps):
+        self.timer.setInterval(max(1, round(1000 / max(fps, 1))))
+
+    def stop(self):
+        if self.timer.isActive():
+            self.timer.stop()
+            self.loader.cancel()
+
+    def length(self):
+        return max((len(sequence) for sequence in self.sequences), default=0)
+
+    def frame_path(self, panel, position):
+        sequence = self.sequences[panel]
+        return sequence[position] if position < len(sequence) else None
+
+    def prefetch(self):
+        """预取之后 lookahead 拍的帧，按拍交错排列，越近的越先解码"""
+        paths = []
+        for position in range(self.position, self.position + self.lookahead):
+            for panel in range(len(self.sequences)):
+                path = self.frame_path(panel, position)
+                if path is not None:
+                    paths.append(path)
+        self.loader.prefetch(paths)
+
+    def tick(self):
+        if self.position >= self.length():
+            self.stop()
+            self.finished.emit()
+            return
+        for panel in range(len(self.sequences)):
+            path = self.frame_path(panel, self.position)
+            if path is None:
+                continue
+            pixmap = self.loader.get(path)
+            if pixmap is None:
+                self.dropped += 1
+            else:
+                self.shown += 1
+                self.frame_ready.emit(panel, path, pixmap)
+        self.position += 1
+        self.prefetch()
+        self.progress.emit(f"{self.title} 帧 {self.position}/{self.length()}, 已显示 {self.shown}, "
+                           f"丢帧 {self.dropped}, {1000 / self.timer.interval():.0f} fps")
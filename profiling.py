@@ -0,0 +1,169 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class _NullBlock:
+    """关闭计时时使用的空上下文，不做任何事"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_BLOCK = _NullBlock()
+
+
+class _Block:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler:
+    """热点路径计时
+
+    关闭时每个被计时的调用只多一次属性判断；打开后记录每个阶段最近 window 次的耗时
+    （用于滚动分位数和直方图），并保留最近 max_events 个事件用于导出 Chrome trace。
+    可在多个线程中同时记录。
+    """
+
+    HISTOGRAM_BOUNDS = (0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000)  # 毫秒
+
+    def __init__(self, window=512, max_events=200000):
+        self.enabled = False
+        self.window = window
+        self.stages = {}   # 阶段名 -> deque(耗时毫秒)
+        self.events = deque(maxlen=max_events)
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+
+    def clear(self):
+        with self._lock:
+            self.stages.clear()
+            self.events.clear()
+            self.origin = time.perf_counter()
+
+    def block(self, name):
+        """计时一个代码块：with PROFILER.block('decode'): ..."""
+        return _Block(self, name) if self.enabled else _NULL_BLOCK
+
+    def record(self, name, start, end):
+        samples = self.stages.get(name)
+        if samples is None:
+            with self._lock:
+                samples = self.stages.setdefault(name, deque(maxlen=self.window))
+        samples.append((end - start) * 1000)
+        self.events.append((name, start, end, threading.get_ident()))
+
+    def stats(self):
+        """各阶段最近耗时的统计：阶段名 -> (次数, p50, p95, 最大值)，单位毫秒"""
+        result = {}
+        for name, samples in list(self.stages.items()):
+            values = sorted(samples)
+            if values:
+                pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+                result[name] = (len(values), pick(0.5), pick(0.95), values[-1])
+        return result
+
+    def histogram(self, name):
+        """阶段耗时直方图：[(上界毫秒, 次数)]，最后一项上界为 None"""
+        counts = [0] * (len(self.HISTOGRAM_BOUNDS) + 1)
+        for value in list(self.stages.get(name, ())):
+            for i, bound in enumerate(self.HISTOGRAM_BOUNDS):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+        return list(zip(self.HISTOGRAM_BOUNDS + (None,), counts))
+
+    def export_chrome_trace(self, path):
+        """把记录的事件导出为 Chrome trace-event JSON（chrome://tracing 或 Perfetto 打开）"""
+        pid = os.getpid()
+        events = [{'name': name, 'cat': 'viewer', 'ph': 'X', 'pid': pid, 'tid': tid,
+                   'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6}
+                  for name, start, end, tid in list(self.events)]
+        threads = {tid for _, _, _, tid in list(self.events)}
+        main_tid = threading.main_thread().ident
+        for tid in threads:
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                           'args': {'name': 'GUI' if tid == main_tid else f'worker-{tid}'}})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+
+PROFILER = Profiler()
+PROFILER.set_enabled(os.environ.get('REID_PROFILE', '') not in ('', '0'))
+
+
+def profiled(name):
+    """计时装饰器，关闭计时时直接调用原函数"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record(name, start, time.perf_counter())
+        return wrapper
+    return decorator
+
+
+class StartupReport:
+    """启动过程各阶段的时间点（毫秒，自 origin 起算），同名阶段只记录第一次"""
+
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.times = {}   # 阶段名 -> 毫秒，按记录顺序
+
+    def mark(self, name):
+        if name not in self.times:
+            self.times[name] = (time.perf_counter() - self.origin) * 1000
+
+    def has(self, names):
+        return all(name in self.times for name in names)
+
+    def format(self):
+        return ' → '.join(f'{name} {ms:.0f}ms' for name, ms in self.times.items())
+
+
+def format_stats(stats):
+    """状态栏上显示的简要统计：阶段 p50/p95"""
+    return '  '.join(f'{name} {p50:.1f}/{p95:.1f}ms' for name, (_, p50, p95, _) in sorted(stats.items()))
+
+
+def format_histograms(profiler):
+    """各阶段的文字直方图（用于悬停提示）"""
+    lines = []
+    for name, (count, p50, p95, worst) in sorted(profiler.stats().items()):
+        lines.append(f'{name}: n={count} p50={p50:.2f} p95={p95:.2f} max={worst:.2f} ms')
+        histogram = profiler.histogram(name)
+        peak = max(c for _, c in histogram) or 1
+        for bound, c in histogram:
+            if c:
+                label = f'≤{bound:g}' if bound is not None else f'>{Profiler.HISTOGRAM_BOUNDS[-1]:g}'
+                lines.append(f'  {label:>6} ms {"█" * max(1, 20 * c // peak)} {c}')
+    return '\n'.join(lines)
@@ -0,0 +1,46 @@
+import math
+
+from PyQt5.QtGui import QTransform
+from PyQt5.QtCore import Qt
+
+
+class MipPyramid:
+    """图片的 mip 金字塔，第 k 级宽高为原图的 1/2^k，按需生成
+
+    缩小显示时从最接近（不小于）目标尺寸的级别绘制，避免每次缩放都对原图做全尺寸变换。
+    """
+
+    MIN_LEVEL_SIZE = 8
+
+    def __init__(self, pixmap):
+        self.levels = [pixmap]
+
+    @property
+    def source(self):
+        return self.levels[0]
+
+    def level_for(self, scale):
+        """返回 (级别图片, 级别相对原图的缩放比例)，级别图片不小于目标显示尺寸"""
+        if scale >= 1.0 or self.source.isNull():
+            return self.levels[0], 1.0
+        level = int(math.floor(math.log2(1.0 / scale)))
+        while len(self.levels) <= level:
+            previous = self.levels[-1]
+            if min(previous.width(), previous.height()) // 2 < self.MIN_LEVEL_SIZE:
+                break
+            self.levels.append(previous.scaled(previous.width() // 2, previous.height() // 2,
+                                               Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+        level = min(level, len(self.levels) - 1)
+        pixmap = self.levels[level]
+        return pixmap, pixmap.width() / self.source.width()
+
+
+def view_transform(source_size, widget_rect, scale, rotation):
+    """原图坐标 -> 控件坐标的变换：以控件中心为中心，先缩放再旋转"""
+    transform = QTransform()
+    center = widget_rect.center()
+    transform.translate(center.x() + 0.5, center.y() + 0.5)
+    transform.rotate(rotation)
+    transform.scale(scale, scale)
+    transform.translate(-source_size.width() / 2, -source_size.height() / 2)
+    return transform
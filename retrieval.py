@@ -0,0 +1,187 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from dataset_index import DatasetIndex, parse_market_name
+
+
+JUNK_PID = -1  # Market-1501 中的干扰图（不参与匹配）
+
+
+def names_path_for(npy_path):
+    """特征文件对应的文件名列表：<stem>_names.txt，其次 <stem>.txt"""
+    stem = os.path.splitext(npy_path)[0]
+    for candidate in (stem + '_names.txt', stem + '.txt'):
+        if os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(f"找不到特征文件对应的文件名列表: {stem}_names.txt")
+
+
+class FeatureSet:
+    """通过 memmap 加载的特征矩阵，按文件名与数据集索引对齐
+
+    features 的第 i 行对应 names[i]；pid、camera 来自数据集索引（索引中没有的文件
+    从文件名解析），paths 为对应图片的完整路径（找不到时为 None）。
+    """
+
+    def __init__(self, features, names, index=None):
+        if len(features) != len(names):
+            raise ValueError(f"特征行数 ({len(features)}) 与文件名数量 ({len(names)}) 不一致")
+        self.features = features
+        self.names = [os.path.basename(name) for name in names]
+        self.pid = np.full(len(names), JUNK_PID, dtype=np.int32)
+        self.camera = np.zeros(len(names), dtype=np.int16)
+        self.paths = [None] * len(names)
+        self._norms = None
+        self._rows = {name: i for i, name in enumerate(self.names)}
+        self.align(index)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def load(cls, npy_path, index=None, names_path=None):
+        features = np.load(npy_path, mmap_mode='r')
+        if features.ndim != 2:
+            raise ValueError(f"特征矩阵应为二维: {npy_path}")
+        with open(names_path or names_path_for(npy_path), encoding='utf-8') as f:
+            names = [line.split()[0] for line in f if line.strip()]
+        return cls(features, names, index)
+
+    def align(self, index):
+        """按文件名把每行特征对应到数据集索引中的 pid、摄像头和路径"""
+        index_rows = {}
+        if index is not None:
+            index_rows = {str(name): row for row, name in enumerate(index.names)}
+        for i, name in enumerate(self.names):
+            row = index_rows.get(name)
+            if row is not None:
+                self.pid[i] = index.pid[row]
+                self.camera[i] = index.camera[row]
+                self.paths[i] = index.path(row)
+            else:
+                parsed = parse_market_name(name)
+                if parsed is not None:
+                    self.pid[i], self.camera[i] = parsed[0], parsed[1]
+
+    def row_of(self, path):
+        """图片路径对应的特征行号，没有特征时返回 None"""
+        return self._rows.get(os.path.basename(path))
+
+    def squared_norms(self, chunk_size=8192):
+        """每行特征的平方范数（分块计算，只算一次）"""
+        if self._norms is None:
+            norms = np.empty(len(self), dtype=np.float32)
+            for start in range(0, len(self), chunk_size):
+                block = np.asarray(self.features[start:start + chunk_size], dtype=np.float32)
+                norms[start:start + len(block)] = np.einsum('ij,ij->i', block, block)
+            self._norms = norms
+        return self._norms
+
+
+def distance_block(query, query_norms, gallery_block, gallery_norms):
+    """欧氏距离的平方：|q|^2 + |g|^2 - 2 q·g"""
+    gallery_block = np.asarray(gallery_block, dtype=np.float32)
+    dist = query @ gallery_block.T
+    dist *= -2
+    dist += query_norms[:, None]
+    dist += gallery_norms[None, :]
+    return dist
+
+
+def invalid_mask(query_pid, query_camera, gallery_pid, gallery_camera):
+    """需要排除的 gallery 项：同 pid 同摄像头，以及干扰图"""
+    same = (gallery_pid[None, :] == query_pid[:, None]) & (gallery_camera[None, :] == query_camera[:, None])
+    return same | (gallery_pid == JUNK_PID)[None, :]
+
+
+def rank_gallery(query_set, query_row, gallery_set, k=50, chunk_size=8192):
+    """对单个 query 分块计算距离并保留 top-k，返回 (gallery 行号, 距离, 是否正确匹配)"""
+    query = np.asarray(query_set.features[query_row:query_row + 1], dtype=np.float32)
+    query_norms = np.einsum('ij,ij->i', query, query)
+    query_pid = query_set.pid[query_row:query_row + 1]
+    query_camera = query_set.camera[query_row:query_row + 1]
+    gallery_norms = gallery_set.squared_norms()
+
+    best_rows = np.zeros(0, dtype=np.int64)
+    best_dist = np.zeros(0, dtype=np.float32)
+    for start in range(0, len(gallery_set), chunk_size):
+        stop = min(start + chunk_size, len(gallery_set))
+        dist = distance_block(query, query_norms, gallery_set.features[start:stop], gallery_norms[start:stop])[0]
+        dist[invalid_mask(query_pid, query_camera, gallery_set.pid[start:stop],
+                          gallery_set.camera[start:stop])[0]] = np.inf
+        rows = np.concatenate((best_rows, np.arange(start, stop)))
+        dist = np.concatenate((best_dist, dist))
+        if len(dist) > k:
+            keep = np.argpartition(dist, k)[:k]
+            rows, dist = rows[keep], dist[keep]
+        best_rows, best_dist = rows, dist
+
+    order = np.argsort(best_dist, kind='stable')
+    best_rows, best_dist = best_rows[order], best_dist[order]
+    valid = np.isfinite(best_dist)
+    best_rows, best_dist = best_rows[valid], best_dist[valid]
+    return best_rows, best_dist, gallery_set.pid[best_rows] == query_set.pid[query_row]
+
+
+def evaluate(query_set, gallery_set, max_rank=50, chunk_size=256, progress=None):
+    """分块计算整个 query 集的 CMC 和 mAP，不生成完整的距离矩阵
+
+    返回 (cmc[max_rank], mAP, 有效 query 数)。
+    """
+    gallery_norms = gallery_set.squared_norms()
+    gallery = np.asarray(gallery_set.features, dtype=np.float32)
+    cmc_hits = np.zeros(max_rank, dtype=np.int64)
+    ap_sum = 0.0
+    valid_queries = 0
+
+    for start in range(0, len(query_set), chunk_size):
+        stop = min(start + chunk_size, len(query_set))
+        query = np.asarray(query_set.features[start:stop], dtype=np.float32)
+        query_pid = query_set.pid[start:stop]
+        query_camera = query_set.camera[start:stop]
+        dist = distance_block(query, np.einsum('ij,ij->i', query, query), gallery, gallery_norms)
+
+        invalid = invalid_mask(query_pid, query_camera, gallery_set.pid, gallery_set.camera)
+        positive = (gallery_set.pid[None, :] == query_pid[:, None]) & ~invalid
+        dist[invalid] = np.inf
+
+        # 只需要正确匹配的名次：名次 = 有效项中距离更小的数量，无需对整行排序
+        for i in np.flatnonzero(positive.any(axis=1)):
+            positive_dist = np.sort(dist[i, positive[i]])
+            ranks = np.count_nonzero(dist[i][None, :] < positive_dist[:, None], axis=1)
+            if ranks[0] < max_rank:
+                cmc_hits[ranks[0]:] += 1
+            ap_sum += np.mean(np.arange(1, len(ranks) + 1) / (ranks + 1))
+            valid_queries += 1
+        if progress is not None:
+            progress(stop, len(query_set))
+
+    if valid_queries == 0:
+        return np.zeros(max_rank), 0.0, 0
+    return cmc_hits / valid_queries, ap_sum / valid_queries, valid_queries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='分块计算 query/gallery 特征的 CMC 和 mAP')
+    parser.add_argument('query', help='query 特征 .npy（同目录下需有 <stem>_names.txt）')
+    parser.add_argument('gallery', help='gallery 特征 .npy')
+    parser.add_argument('--root', help='数据集根目录（用于按文件名对齐索引）')
+    parser.add_argument('--max-rank', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    index = DatasetIndex.open(args.root) if args.root else None
+    query_set = FeatureSet.load(args.query, index)
+    gallery_set = FeatureSet.load(args.gallery, index)
+    start = time.perf_counter()
+    cmc, mean_ap, valid = evaluate(query_set, gallery_set, args.max_rank)
+    elapsed = time.perf_counter() - start
+    ranks = ', '.join(f'Rank-{r}: {cmc[r - 1]:.2%}' for r in (1, 5, 10, 20) if r <= args.max_rank)
+    print(f'{valid}/{len(query_set)} 个有效 query x {len(gallery_set)} 张 gallery，用时 {elapsed:.2f}s')
+    print(f'mAP: {mean_ap:.2%}, {ranks}')
+
+
+if __name__ == '__main__':
+    main()
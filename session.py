@@ -0,0 +1,55 @@
+import json
+import os
+
+
+SESSION_VERSION = 1
+
+
+def session_path():
+    """上次会话的状态文件（与数据集登记放在同一目录）"""
+    return os.path.join(os.path.expanduser('~'), '.cache', 'reid_viewer', 'session.json')
+
+
+def listing_path():
+    """上次浏览的文件夹的图片列表，启动时目录未变化则不重新扫描"""
+    return os.path.join(os.path.expanduser('~'), '.cache', 'reid_viewer', 'session_listing.json')
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_session(path=None):
+    """读取上次会话：根路径、文件夹、图片、缩放、旋转和过滤条件；没有或版本不符时返回空字典"""
+    state = _read_json(path or session_path())
+    if not isinstance(state, dict) or state.get('version') != SESSION_VERSION:
+        return {}
+    return state
+
+
+def save_session(state, path=None):
+    _write_json(path or session_path(), dict(state, version=SESSION_VERSION))
+
+
+def load_listing(folder, path=None):
+    """保存的列表 (目录 mtime 字典, 图片路径列表)，不是该文件夹的列表时返回 None"""
+    data = _read_json(path or listing_path())
+    if not isinstance(data, dict) or data.get('folder') != folder:
+        return None
+    return data['dirs'], data['paths']
+
+
+def save_listing(folder, dir_mtimes, paths, path=None):
+    _write_json(path or listing_path(), {'folder': folder, 'dirs': dir_mtimes, 'paths': list(paths)})
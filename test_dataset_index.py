@@ -0,0 +1,60 @@
+import os
+
+from dataset_index import DatasetIndex
+
+
+def touch(path):
+    open(path, 'wb').close()
+
+
+def make_root(tmp_path):
+    root = tmp_path / 'Market'
+    train = root / 'bounding_box_train'
+    train.mkdir(parents=True)
+    touch(train / '0001_c1s1_000001_00.jpg')
+    return str(root)
+
+
+def test_mkdir_then_write(tmp_path):
+    """新建的空目录先被报告，之后写入其中的图片也要进入索引"""
+    root = make_root(tmp_path)
+    index = DatasetIndex.open(root)
+    assert len(index) == 1
+
+    new_dir = os.path.join(root, 'bounding_box_test')
+    os.mkdir(new_dir)
+    index.apply_changes([new_dir], [])
+    image = os.path.join(new_dir, '0002_c2s1_000001_00.jpg')
+    touch(image)
+    assert index.apply_changes([image], [])
+    assert len(index) == 2
+    assert sorted(index.paths(range(len(index)))) == sorted(
+        DatasetIndex.open(root).paths(range(2)))
+
+
+def test_new_dir_after_parent_mtime_recorded(tmp_path):
+    """上级目录的 mtime 已在新建子目录之后被记录时，报告新目录仍会重新列出上级目录"""
+    root = make_root(tmp_path)
+    index = DatasetIndex.open(root)
+
+    new_dir = os.path.join(root, 'query')
+    os.mkdir(new_dir)
+    image = os.path.join(root, '0003_c3s1_000001_00.jpg')
+    touch(image)
+    assert index.apply_changes([image], [])   # 记录了根目录的新 mtime
+
+    query_image = os.path.join(new_dir, '0004_c4s1_000001_00.jpg')
+    touch(query_image)
+    assert index.apply_changes([new_dir, query_image], [])
+    assert len(index) == 3
+    assert 'query' in index.dirs
+
+
+def test_removing_unindexed_file_keeps_index(tmp_path):
+    root = make_root(tmp_path)
+    index = DatasetIndex.open(root)
+    note = os.path.join(root, 'bounding_box_train', 'notes.txt')
+    touch(note)
+    os.remove(note)
+    assert not index.apply_changes([], [note])
+    assert len(index) == 1
@@ -0,0 +1,332 @@
+import argparse
+import mmap
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PyQt5.QtGui import QImage, QImageReader
+from PyQt5.QtCore import QSize, Qt
+
+from folder_scanner import scan_image_files
+
+
+# 每个缩略图占用一个固定大小的槽位（RGB888），缩略图按比例缩放到槽位以内
+SLOT_SIZE = (48, 96)
+STORE_VERSION = 1
+
+
+def thumbnail_store_dir(root):
+    """缩略图库目录（与数据集目录同级，和索引缓存放在一起）"""
+    root = os.path.abspath(root)
+    parent, name = os.path.split(root.rstrip(os.sep))
+    return os.path.join(parent, f'.{name}.reid_thumbs')
+
+
+def render_thumbnail(path, slot_size=SLOT_SIZE):
+    """按缩小尺寸解码图片，返回 (宽, 高, 按槽位行宽填充的 RGB888 字节)，失败时返回 None
+
+    在进程池中运行，不需要 QApplication。
+    """
+    slot_width, slot_height = slot_size
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    original = reader.size()
+    if original.isValid():
+        reader.setScaledSize(original.scaled(QSize(slot_width, slot_height), Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return None
+    return slot_data(image, slot_size)
+
+
+def slot_data(image, slot_size=SLOT_SIZE):
+    """已解码的 QImage -> (宽, 高, 按槽位行宽填充的 RGB888 字节)，超出槽位时先缩小"""
+    slot_width, slot_height = slot_size
+    if image.width() > slot_width or image.height() > slot_height:
+        image = image.scaled(slot_width, slot_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    image = image.convertToFormat(QImage.Format_RGB888)
+
+    stride = slot_width * 3
+    rows = np.frombuffer(image.constBits().asstring(image.sizeInBytes()), dtype=np.uint8)
+    rows = rows.reshape(image.height(), image.bytesPerLine())[:, :image.width() * 3]
+    slot = np.zeros((slot_height, stride), dtype=np.uint8)
+    slot[:image.height(), :image.width() * 3] = rows
+    return image.width(), image.height(), slot.tobytes()
+
+
+def _grow(array, length):
+    """至少容纳 length 项的数组（只增长，不截断）"""
+    if len(array) >= length:
+        return array
+    grown = np.zeros(length, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _render_batch(args):
+    paths, slot_size = args
+    return [render_thumbnail(path, slot_size) for path in paths]
+
+
+class ThumbnailStore:
+    """持久化的缩略图库
+
+    缩略图按固定槽位存放在内存映射的 atlas.bin 中，index.npz 记录每个槽位对应的
+    相对路径、mtime、文件大小和缩略图尺寸。热启动时从映射内存复制出槽位构造 QImage，
+    不需要解码 JPEG；文件变化（mtime 或大小不同）时在原槽位重新生成。
+
+    除命令行预先生成外，画廊解码的缩略图也通过 add() 写入槽位，由 save() 定期写回索引，
+    因此不预先生成时第二次打开也是热启动。映射和写入由锁保护，解码线程与 close() 可以并发。
+    """
+
+    def __init__(self, root, slot_size=SLOT_SIZE):
+        self.root = os.path.abspath(root)
+        self.slot_size = slot_size
+        self.stride = slot_size[0] * 3
+        self.slot_bytes = self.stride * slot_size[1]
+        self.store_dir = thumbnail_store_dir(self.root)
+        self.atlas_path = os.path.join(self.store_dir, 'atlas.bin')
+        self.index_path = os.path.join(self.store_dir, 'index.npz')
+
+        self.paths = []
+        self.mtime = np.zeros(0, dtype=np.int64)
+        self.size = np.zeros(0, dtype=np.int64)
+        self.width = np.zeros(0, dtype=np.uint16)
+        self.height = np.zeros(0, dtype=np.uint16)
+        self._slots = {}   # 相对路径 -> 槽位号
+        self._file = None
+        self._mmap = None
+        self._writer = None     # add() 写入 atlas.bin 的文件，第一次写入时打开
+        self.writable = True    # 无法写入（如只读目录）后不再尝试
+        self.dirty = False      # 有 add() 写入但尚未保存索引
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.paths)
+
+    @classmethod
+    def exists(cls, root):
+        return os.path.exists(os.path.join(thumbnail_store_dir(root), 'index.npz'))
+
+    def open(self):
+        """加载索引并映射缩略图文件，返回是否成功"""
+        try:
+            with np.load(self.index_path, allow_pickle=False) as data:
+                if (int(data['version']) != STORE_VERSION
+                        or tuple(int(v) for v in data['slot_size']) != tuple(self.slot_size)):
+                    return False
+                self.paths = [str(p) for p in data['paths']]
+                self.mtime = data['mtime']
+                self.size = data['size']
+                self.width = data['width']
+                self.height = data['height']
+        except (OSError, KeyError, ValueError):
+            return False
+        self._slots = {path: slot for slot, path in enumerate(self.paths)}
+        return self._map()
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            for f in (self._file, self._writer):
+                if f is not None:
+                    f.close()
+            self._file = self._writer = None
+
+    def _map(self):
+        try:
+            if self._file is None:
+                self._file = open(self.atlas_path, 'rb')
+            length = os.fstat(self._file.fileno()).st_size
+            if length < len(self.paths) * self.slot_bytes:
+                return False
+            if self._mmap is not None:
+                self._mmap.close()   # lookup() 只复制槽位，不会留下对旧映射的引用
+            self._mmap = mmap.mmap(self._file.fileno(), length, access=mmap.ACCESS_READ) if length else None
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def _relpath(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def lookup(self, path):
+        """取缓存的缩略图，不存在或已过期时返回 None
+
+        QImage 直接建立在映射内存上，在锁内复制一次得到独立的 QImage（约 13 KB）：
+        锁外映射可能被关闭或重新映射，复制后跨线程传递不再需要考虑映射内存的生命周期。
+        """
+        rel = self._relpath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            slot = self._slots.get(rel)
+            if slot is None or self.closed or slot >= len(self.paths):
+                return None
+            if st.st_mtime_ns != self.mtime[slot] or st.st_size != self.size[slot]:
+                return None
+            width, height = int(self.width[slot]), int(self.height[slot])
+            if width == 0 or height == 0:
+                return None
+            end = (slot + 1) * self.slot_bytes
+            if (self._mmap is None or len(self._mmap) < end) and not self._map():
+                return None   # add() 追加的槽位在重新映射后才可见
+            with memoryview(self._mmap) as buffer:
+                image = QImage(buffer[slot * self.slot_bytes:end], width, height, self.stride,
+                               QImage.Format_RGB888)
+                thumbnail = image.copy()
+                del image   # 释放对映射内存的引用，之后才能关闭映射
+        return thumbnail
+
+    def add(self, path, stat, image):
+        """把解码得到的缩略图写入槽位（已有槽位时原位覆盖），stat 为解码前的 os.stat 结果"""
+        if image.isNull():
+            return
+        width, height, data = slot_data(image, self.slot_size)
+        rel = self._relpath(path)
+        with self._lock:
+            if self.closed or not self.writable:
+                return
+            try:
+                if self._writer is None:
+                    os.makedirs(self.store_dir, exist_ok=True)
+                    # 索引不存在或无效时 atlas.bin 中的内容不可信，从头写
+                    mode = 'r+b' if self.paths and os.path.exists(self.atlas_path) else 'w+b'
+                    self._writer = open(self.atlas_path, mode)
+                slot = self._slots.get(rel)
+                if slot is None:
+                    slot = len(self.paths)
+                self._writer.seek(slot * self.slot_bytes)
+                self._writer.write(data)
+                self._writer.flush()
+            except OSError:
+                self.writable = False
+                return
+            if slot == len(self.paths):
+                self._slots[rel] = slot
+                self.paths.append(rel)
+                if len(self.paths) > len(self.mtime):
+                    capacity = max(len(self.paths), 2 * len(self.mtime))   # 按倍数增长，追加均摊 O(1)
+                    self.mtime = _grow(self.mtime, capacity)
+                    self.size = _grow(self.size, capacity)
+                    self.width = _grow(self.width, capacity)
+                    self.height = _grow(self.height, capacity)
+            self.mtime[slot], self.size[slot] = stat.st_mtime_ns, stat.st_size
+            self.width[slot], self.height[slot] = width, height
+            self.dirty = True
+
+    def decode(self, path, size=None):
+        """供 ImageLoader 使用的解码函数：优先读缩略图库，未命中时按缩小尺寸解码并写入库中"""
+        image = self.lookup(path)
+        if image is not None:
+            return image
+        from image_loader import decode_image
+        try:
+            st = os.stat(path)   # 在解码前取，解码期间文件被改写时下次会重新生成
+        except OSError:
+            st = None   # 打包数据集内的路径不写入缩略图库
+        image = decode_image(path, size)
+        if st is not None:
+            self.add(path, st, image)
+        return image
+
+    def build(self, paths, workers=None, batch_size=64, progress=None):
+        """为缺失或已过期的图片生成缩略图（进程池），写入槽位并保存索引，返回生成的数量"""
+        todo = []  # (槽位号, 路径, mtime, 大小)
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            rel = self._relpath(path)
+            slot = self._slots.get(rel)
+            if slot is not None and st.st_mtime_ns == self.mtime[slot] and st.st_size == self.size[slot]:
+                continue
+            if slot is None:
+                slot = len(self.paths)
+                self._slots[rel] = slot
+                self.paths.append(rel)
+            todo.append((slot, path, st.st_mtime_ns, st.st_size))
+        if not todo:
+            return 0
+
+        count = len(self.paths)
+        self.mtime = _grow(self.mtime, count)
+        self.size = _grow(self.size, count)
+        self.width = _grow(self.width, count)
+        self.height = _grow(self.height, count)
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+        done = 0
+        # spawn 避免在已启动 Qt 线程的进程中 fork
+        context = multiprocessing.get_context('spawn')
+        with open(self.atlas_path, 'ab') as f:
+            f.truncate(max(os.fstat(f.fileno()).st_size, count * self.slot_bytes))
+        with open(self.atlas_path, 'r+b') as f, \
+                ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            jobs = (([path for _, path, _, _ in batch], self.slot_size) for batch in batches)
+            for batch, results in zip(batches, executor.map(_render_batch, jobs)):
+                for (slot, _, mtime, size), result in zip(batch, results):
+                    width, height, data = result if result is not None else (0, 0, None)
+                    if data is not None:
+                        f.seek(slot * self.slot_bytes)
+                        f.write(data)
+                    self.mtime[slot], self.size[slot] = mtime, size
+                    self.width[slot], self.height[slot] = width, height
+                done += len(batch)
+                if progress is not None:
+                    progress(done, len(todo))
+        self.save()
+        self._map()
+        return len(todo)
+
+    def save(self):
+        """写入索引（先写临时文件再替换）"""
+        with self._lock:
+            count = len(self.paths)
+            arrays = dict(paths=np.array(self.paths, dtype=str), mtime=self.mtime[:count].copy(),
+                          size=self.size[:count].copy(), width=self.width[:count].copy(),
+                          height=self.height[:count].copy())
+            self.dirty = False
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, version=np.array(STORE_VERSION), slot_size=np.array(self.slot_size), **arrays)
+        os.replace(tmp_path, self.index_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='为数据集预先生成缩略图库')
+    parser.add_argument('root', help='数据集根目录')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认为 CPU 核数）')
+    args = parser.parse_args(argv)
+
+    store = ThumbnailStore(args.root)
+    store.open()
+    paths = [path for batch in scan_image_files(args.root) for path in batch]
+    start = time.perf_counter()
+
+    def progress(done, total):
+        sys.stderr.write(f'\r生成缩略图: {done}/{total}')
+        sys.stderr.flush()
+
+    generated = store.build(paths, workers=args.workers, progress=progress)
+    if generated:
+        sys.stderr.write('\n')
+    print(f'{len(paths)} 张图片，新生成 {generated} 张缩略图，用时 {time.perf_counter() - start:.1f}s，'
+          f'保存在 {store.store_dir}')
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import os
+
+import numpy as np
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex
+
+
+SPLIT, PID, CAMERA, IMAGE = range(4)
+
+
+class _Node:
+    __slots__ = ('kind', 'parent', 'row', 'key', 'rows', 'children')
+
+    def __init__(self, kind, parent, row, key, rows):
+        self.kind = kind
+        self.parent = parent
+        self.row = row          # 在父节点中的位置
+        self.key = key          # 目录 / pid / 摄像头 / 索引行号
+        self.rows = rows        # 该节点下所有图片的索引行号（已按 pid, 摄像头, 序列, 帧 排序）
+        self.children = None    # 展开前为 None
+
+
+class IdentityTreeModel(QAbstractItemModel):
+    """按 划分 -> pid -> 摄像头 -> 图片 分组的懒加载树模型
+
+    数据来自 DatasetIndex，不访问文件系统；子节点只在展开时生成，
+    排序使用预先计算的 (pid, 摄像头, 序列, 帧) 键，大的扁平目录也能立即打开。
+    """
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.index_data = index
+        self.root = _Node(None, None, 0, None, None)
+        self.root.children = []
+        order = np.lexsort((index.frame, index.sequence, index.camera, index.pid, index.dir_id))
+        dir_ids = index.dir_id[order]
+        values, starts = np.unique(dir_ids, return_index=True)
+        for i, (dir_id, rows) in enumerate(zip(values, np.split(order, starts[1:]))):
+            self.root.children.append(_Node(SPLIT, self.root, i, int(dir_id), rows))
+
+    # 节点 <-> QModelIndex
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else self.root
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if node.children is None or not 0 <= row < len(node.children) or column != 0:
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        children = self.node(parent).children
+        return len(children) if children is not None else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        return node.kind != IMAGE and (node.children is None or len(node.children) > 0)
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        return node.kind != IMAGE and node.children is None
+
+    def fetchMore(self, parent):
+        """展开时才生成子节点"""
+        node = self.node(parent)
+        if node.children is not None:
+            return
+        children = self._make_children(node)
+        if children:
+            self.beginInsertRows(parent, 0, len(children) - 1)
+            node.children = children
+            self.endInsertRows()
+        else:
+            node.children = children
+
+    def _make_children(self, node):
+        index = self.index_data
+        if node.kind == CAMERA:
+            return [_Node(IMAGE, node, i, int(row), None) for i, row in enumerate(node.rows)]
+        column, kind = (index.pid, PID) if node.kind == SPLIT else (index.camera, CAMERA)
+        keys = column[node.rows]
+        # rows 已排序，相同键连续出现
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        starts = np.concatenate(([0], boundaries)) if len(keys) else boundaries
+        groups = np.split(node.rows, boundaries)
+        return [_Node(kind, node, i, int(keys[start]), rows)
+                for i, (start, rows) in enumerate(zip(starts, groups))]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            if node.kind == SPLIT:
+                return f"{self.index_data.dirs[node.key] or os.path.basename(self.index_data.root)} ({len(node.rows)})"
+            if node.kind == PID:
+                return f"ID {node.key:04d} ({len(node.rows)})"
+            if node.kind == CAMERA:
+                return f"c{node.key} ({len(node.rows)})"
+            return str(self.index_data.names[node.key])
+        if role == Qt.ToolTipRole and node.kind == IMAGE:
+            return self.index_data.path(node.key)
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def node_kind(self, index):
+        return self.node(index).kind
+
+    def node_rows(self, index):
+        """节点下所有图片的索引行号（图片节点为其所在摄像头分组）"""
+        node = self.node(index)
+        return node.parent.rows if node.kind == IMAGE else node.rows
+
+    def filePath(self, index):
+        """图片节点返回图片路径，划分节点返回目录路径，其余返回空字符串"""
+        node = self.node(index)
+        if node.kind == IMAGE:
+            return self.index_data.path(node.key)
+        if node.kind == SPLIT:
+            return os.path.join(self.index_data.root, self.index_data.dirs[node.key])
+        return ''
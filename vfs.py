@@ -0,0 +1,348 @@
+import mmap
+import os
+import struct
+import tarfile
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from dataset_index import IMAGE_EXTENSIONS
+
+
+# 打包数据集: 一个目录，内含 index.npz 和若干 shard_XXX.bin
+PACK_SUFFIX = '.reidpack'
+PACK_VERSION = 1
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz')
+CONTAINER_SUFFIXES = (PACK_SUFFIX,) + ARCHIVE_SUFFIXES
+
+_containers = {}   # 容器路径 -> 已打开的容器
+_lock = threading.Lock()
+
+
+def member_sort_key(rel):
+    """容器成员的浏览顺序：目录按路径分量深度优先，同一目录内的文件连续并按名称排序"""
+    folder, name = os.path.split(rel)
+    return (folder.split(os.sep) if folder else [], name)
+
+
+class ShardPack:
+    """打包数据集的只读访问
+
+    图片字节按顺序拼接存放在少数几个分片文件中，index.npz 记录每张图片的相对路径、
+    分片号、偏移和长度，以及解析好的文件名元数据。打开只需读一个索引文件，
+    读取图片时从内存映射的分片中切出字节，不再逐个打开小文件。
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.stamp_path = os.path.join(self.root, 'index.npz')
+        self.stamp = os.stat(self.stamp_path).st_mtime_ns
+        with np.load(self.stamp_path, allow_pickle=False) as data:
+            if int(data['version']) != PACK_VERSION:
+                raise ValueError(f"不支持的打包格式版本: {self.root}")
+            self.paths = data['paths']
+            self.shard = data['shard']
+            self.offset = data['offset']
+            self.length = data['length']
+            self.fields = data['fields']     # (n, 5): pid, 摄像头, 序列, 帧号, 检测框序号
+            self.parsed = data['parsed']     # 文件名是否可解析
+            self.shard_names = [str(name) for name in data['shard_names']]
+        self._rows = None
+        self._maps = [None] * len(self.shard_names)
+        self._map_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def members(self):
+        """所有图片的相对路径（浏览顺序）"""
+        return [str(path) for path in self.paths]
+
+    def metadata(self):
+        """打包时解析好的文件名元数据：(fields, parsed)"""
+        return self.fields, self.parsed
+
+    def list_images(self, inner=''):
+        """inner 目录（含子目录）下的图片相对路径"""
+        if not inner:
+            return self.members()
+        prefix = inner.rstrip(os.sep) + os.sep
+        return [str(path) for path in self.paths[np.char.startswith(self.paths, prefix)]]
+
+    def _map(self, shard):
+        mapped = self._maps[shard]
+        if mapped is None:
+            with self._map_lock:
+                mapped = self._maps[shard]
+                if mapped is None:
+                    with open(os.path.join(self.root, self.shard_names[shard]), 'rb') as f:
+                        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._maps[shard] = mapped
+        return mapped
+
+    def read(self, inner):
+        """读取成员字节，不存在时抛出 OSError"""
+        if self._rows is None:
+            self._rows = {str(path): row for row, path in enumerate(self.paths)}
+        row = self._rows.get(inner)
+        if row is None:
+            raise FileNotFoundError(os.path.join(self.root, inner))
+        offset = int(self.offset[row])
+        return self._map(int(self.shard[row]))[offset:offset + int(self.length[row])]
+
+    def close(self):
+        for mapped in self._maps:
+            if mapped is not None:
+                mapped.close()
+        self._maps = [None] * len(self.shard_names)
+
+
+class _BytesCache:
+    """按字节预算淘汰的解压结果 LRU 缓存（多线程共用）"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._items or len(data) > self.max_bytes:
+                return
+            self._items[key] = data
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                _, old = self._items.popitem(last=False)
+                self.total_bytes -= len(old)
+
+
+class _Archive:
+    """归档文件的公共部分：整体内存映射，成员按浏览顺序排列"""
+
+    def __init__(self, root, cache_bytes):
+        self.root = os.path.abspath(root)
+        self.stamp_path = self.root
+        self.stamp = os.stat(self.root).st_mtime_ns
+        self.cache = _BytesCache(cache_bytes)
+        self._file = open(self.root, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)   # 空文件时抛出 ValueError
+        except Exception:
+            self._file.close()
+            raise
+        self._members = {}   # 相对路径 -> 成员信息
+        self._order = []
+
+    def _set_members(self, members):
+        self._members = members
+        self._order = sorted(members, key=member_sort_key)
+
+    def __len__(self):
+        return len(self._order)
+
+    def members(self):
+        return list(self._order)
+
+    def list_images(self, inner=''):
+        if not inner:
+            return self.members()
+        prefix = inner.rstrip(os.sep) + os.sep
+        return [rel for rel in self._order if rel.startswith(prefix)]
+
+    def _member(self, inner):
+        member = self._members.get(inner)
+        if member is None:
+            raise FileNotFoundError(os.path.join(self.root, inner))
+        return member
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+class ZipArchive(_Archive):
+    """zip 归档的只读访问
+
+    打开时只解析一次中央目录；未压缩的成员直接从内存映射中切出字节，
+    deflate 压缩的成员用 zlib 解压并放入小的 LRU 缓存，前后翻页时不重复解压。
+    """
+
+    def __init__(self, root, cache_bytes=64 * 1024 * 1024):
+        super().__init__(root, cache_bytes)
+        try:
+            with zipfile.ZipFile(self.root) as archive:
+                members = {}
+                for info in archive.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                        members[os.path.normpath(info.filename)] = (
+                            info.header_offset, info.compress_size, info.file_size,
+                            info.compress_type, info.flag_bits)
+        except Exception:
+            self.close()   # 损坏的 zip：释放映射和文件句柄
+            raise
+        self._set_members(members)
+
+    def read(self, inner):
+        header_offset, compress_size, file_size, compress_type, flag_bits = self._member(inner)
+        if flag_bits & 0x1:
+            raise OSError(f"不支持加密的 zip 成员: {inner}")
+        # 本地文件头 30 字节，其后是文件名和扩展字段，长度以本地文件头中的为准
+        name_length, extra_length = struct.unpack_from('<HH', self._mmap, header_offset + 26)
+        start = header_offset + 30 + name_length + extra_length
+        if compress_type == zipfile.ZIP_STORED:
+            return self._mmap[start:start + file_size]
+        data = self.cache.get(inner)
+        if data is None:
+            if compress_type != zipfile.ZIP_DEFLATED:
+                raise OSError(f"不支持的 zip 压缩方式 {compress_type}: {inner}")
+            data = zlib.decompress(self._mmap[start:start + compress_size], -15)
+            self.cache.put(inner, data)
+        return data
+
+
+class TarArchive(_Archive):
+    """tar 归档的只读访问
+
+    未压缩的 tar 打开时扫描一遍成员头，之后直接从内存映射中切出字节；
+    压缩的 tar（.tar.gz / .tgz）无法随机访问，通过 tarfile 顺序读取并缓存解压后的字节。
+    """
+
+    def __init__(self, root, cache_bytes=64 * 1024 * 1024):
+        super().__init__(root, cache_bytes)
+        self.compressed = not self.root.lower().endswith('.tar')
+        self._tar = None
+        self._tar_lock = threading.Lock()
+        members = {}
+        try:
+            self._tar = tarfile.open(self.root, 'r:*')
+            for info in self._tar.getmembers():
+                if info.isfile() and info.name.lower().endswith(IMAGE_EXTENSIONS):
+                    members[os.path.normpath(info.name)] = info
+        except Exception:
+            self.close()   # 损坏的 tar：释放映射和文件句柄
+            raise
+        self._set_members(members)
+
+    def read(self, inner):
+        info = self._member(inner)
+        if not self.compressed:
+            return self._mmap[info.offset_data:info.offset_data + info.size]
+        data = self.cache.get(inner)
+        if data is None:
+            with self._tar_lock:
+                data = self._tar.extractfile(info).read()
+            self.cache.put(inner, data)
+        return data
+
+    def close(self):
+        if self._tar is not None:
+            self._tar.close()
+        super().close()
+
+
+def split_path(path):
+    """把虚拟路径拆成 (容器路径, 容器内相对路径)，不在容器中时返回 (None, None)
+
+    只做字符串处理，不访问文件系统。
+    """
+    if not any(suffix in path for suffix in CONTAINER_SUFFIXES):
+        return None, None
+    path = os.path.abspath(path)
+    head = path
+    while True:
+        if head.lower().endswith(CONTAINER_SUFFIXES):
+            return head, os.path.relpath(path, head) if path != head else ''
+        parent = os.path.dirname(head)
+        if parent == head:
+            return None, None
+        head = parent
+
+
+def _open_container(root):
+    lower = root.lower()
+    if lower.endswith(PACK_SUFFIX):
+        return ShardPack(root)
+    if lower.endswith('.zip'):
+        return ZipArchive(root)
+    if lower.endswith(ARCHIVE_SUFFIXES):
+        return TarArchive(root)
+    raise ValueError(f"未知的容器类型: {root}")
+
+
+def open_container(root, check=True):
+    """打开容器（已打开的直接复用，check 为 True 时容器文件变化后重新打开）"""
+    with _lock:
+        container = _containers.get(root)
+        if container is not None and check:
+            try:
+                stale = os.stat(container.stamp_path).st_mtime_ns != container.stamp
+            except OSError:
+                stale = True
+            if stale:
+                # 释放旧容器的映射和文件句柄；正在读取旧容器的线程会得到 ValueError，解码时按失败处理
+                del _containers[root]
+                container.close()
+                container = None
+        if container is None:
+            container = _containers[root] = _open_container(root)
+        return container
+
+
+def find(path, check=False):
+    """返回 (容器, 容器内相对路径)，普通路径返回 (None, None)"""
+    root, inner = split_path(path)
+    if root is None:
+        return None, None
+    return open_container(root, check), inner
+
+
+def is_container(path):
+    root, inner = split_path(path)
+    return root is not None and inner == ''
+
+
+def file_stamp(path):
+    """(mtime, 大小)，用于判断缓存是否过期；容器内的图片使用容器的 mtime，大小为 0"""
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        container, _ = find(path)
+        if container is None:
+            raise
+        return container.stamp, 0
+
+
+def read_bytes(path):
+    """读取图片字节，容器（打包数据集、zip、tar）内的路径从容器读取"""
+    container, inner = find(path)
+    if container is None:
+        with open(path, 'rb') as f:
+            return f.read()
+    return container.read(inner)
+
+
+def list_images(folder):
+    """列出容器内虚拟目录下的图片完整路径，并返回容器的 (时间戳文件, mtime)；不在容器中时返回 None"""
+    try:
+        container, inner = find(folder, check=True)
+    except (OSError, ValueError, zipfile.BadZipFile, tarfile.TarError):
+        return None
+    if container is None:
+        return None
+    root = container.root
+    paths = [os.path.join(root, rel) for rel in container.list_images(inner)
+             if rel.lower().endswith(IMAGE_EXTENSIONS)]
+    return paths, (container.stamp_path, container.stamp)